@@ -1,132 +1,599 @@
-from llama_cpp import Llama
 import os
 from dotenv import load_dotenv
 from rich.console import Console
-from rich.live import Live
-from rich.panel import Panel
-from rich.syntax import Syntax
-import sys
-import re
+import threading
+import time
+from types import SimpleNamespace
+from edit_protocol import EDIT_FORMAT_INSTRUCTIONS, FENCED_FILE_INSTRUCTIONS, EDIT_GRAMMARS
+from response_cache import ResponseCache, model_identity
+from conversation import Conversation, shift_context
+from telemetry import Telemetry, request_record
+from early_stop import default_detectors, make_detectors, check, finish_reason_for, INCOMPLETE
 
 console = Console()
 load_dotenv()
 
+DEFAULT_MODEL_PATH = "models/deepseek-coder-6.7b-instruct.Q4_K_M.gguf"
+MAX_TOKENS = 2048
+# Room kept for the system prompt, the instruction and chat template tokens
+PROMPT_OVERHEAD_TOKENS = 256
+STOP_SEQUENCES = ["<|im_end|>", "###", "Instruction:", "User:"]
+# A grammar decides where a constrained reply ends; "###" etc. could cut real code short
+GRAMMAR_STOP_SEQUENCES = ["<|im_end|>"]
+# Share of the context budget a conversation's history may keep between requests
+HISTORY_SHARE = 0.5
+# Where an edit request's instruction follows the code; everything before it can be prefilled
+INSTRUCTION_MARKER = "\n\nInstruction: "
+CHAT_SYSTEM_PROMPT = "You are a helpful AI assistant. Provide clear, concise, and helpful responses to the user's questions and requests."
+
+
+class StreamEvent:
+    """A token delta from AIHandler.stream; the final event carries the request metadata"""
+    def __init__(self, delta, done=False, finish_reason=None, prompt_tokens=0,
+                 completion_tokens=0, time_to_first_token=None, elapsed=0.0, cached=False, prompt_eval_time=None,
+                 stopped_by=None, tokens_saved=0):
+        self.delta = delta
+        self.done = done
+        self.finish_reason = finish_reason
+        self.prompt_tokens = prompt_tokens
+        self.completion_tokens = completion_tokens
+        self.time_to_first_token = time_to_first_token
+        self.elapsed = elapsed
+        self.cached = cached
+        # Seconds llama.cpp spent evaluating the prompt, when the model reports it
+        self.prompt_eval_time = prompt_eval_time
+        # Why decoding ended before the model finished ("cancelled" or an early-stop detector's reason)
+        self.stopped_by = stopped_by
+        # Tokens of the max_tokens budget left unspent by an early stop (an upper bound on the saving)
+        self.tokens_saved = tokens_saved
+    
+    def __repr__(self):
+        if self.done:
+            return f"StreamEvent(done, finish_reason={self.finish_reason!r}, completion_tokens={self.completion_tokens})"
+        return f"StreamEvent({self.delta!r})"
+
+
+class ModelLoadError(Exception):
+    """Raised when the GGUF model cannot be loaded"""
+
+
+class ModelNotFoundError(ModelLoadError):
+    """Raised when the configured model file does not exist"""
+    def __init__(self, model_path):
+        super().__init__(f"Model file not found: {model_path}")
+        self.model_path = model_path
+
+
+def show_model_help(model_path):
+    """Explain how to get a model when the configured one is missing"""
+    console.print(f"[red]❌ Model file not found: {model_path}[/red]")
+    console.print("[yellow]Please download a GGUF model and place it in the models/ directory[/yellow]")
+    console.print("[cyan]Example commands to download a model:[/cyan]")
+    console.print("mkdir -p models")
+    console.print("wget -P models/ https://huggingface.co/TheBloke/deepseek-coder-6.7B-instruct-GGUF/resolve/main/deepseek-coder-6.7b-instruct.Q4_K_M.gguf")
+    console.print("\n[green]Or use a different model from: https://huggingface.co/TheBloke[/green]")
+
+
+def build_messages(prompt, is_code_context, current_code, edit_format, context=None, constrained=False):
+    """Build the message list and temperature for a chat or code edit request.
+    
+    context (e.g. retrieved project snippets) is placed before a chat question.
+    constrained full-file edits ask for the fenced block the grammar enforces.
+    """
+    if is_code_context and current_code:
+        # Code editing mode
+        if edit_format == "diff":
+            system = (
+                "You are an expert Python programmer. Modify the given code according to the user's instruction. "
+                + EDIT_FORMAT_INSTRUCTIONS
+            )
+            request = f"Current code:\n```python\n{current_code}\n```\n\nInstruction: {prompt}\n\nReturn ONLY the SEARCH/REPLACE blocks:"
+        elif constrained:
+            system = "You are an expert Python programmer. Modify the given code according to the user's instruction. " + FENCED_FILE_INSTRUCTIONS
+            request = f"Current code:\n```python\n{current_code}\n```\n\nInstruction: {prompt}\n\nReturn ONLY the fenced block with the complete updated code:"
+        else:
+            system = "You are an expert Python programmer. Modify the given code according to the user's instruction. Return ONLY the complete updated Python code with no explanations, no markdown, and no additional text. Just the pure executable Python code."
+            request = f"Current code:\n```python\n{current_code}\n```\n\nInstruction: {prompt}\n\nReturn ONLY the complete updated Python code:"
+        messages = [
+            {"role": "system", "content": system},
+            {"role": "user", "content": request},
+        ]
+        temperature = 0.1
+    else:
+        # General chat mode
+        messages = [
+            {
+                "role": "system",
+                "content": CHAT_SYSTEM_PROMPT,
+            },
+            {
+                "role": "user",
+                "content": f"{context}\n\nQuestion: {prompt}" if context else prompt,
+            },
+        ]
+        temperature = 0.7
+    return messages, temperature
+
+
 class AIHandler:
-    def __init__(self):
-        model_path = os.getenv("MODEL_PATH", "models/deepseek-coder-6.7b-instruct.Q4_K_M.gguf")
+    # Set when MEMORY_BUDGET_MB sized the loaded model (memory_budget.plan_for_model)
+    memory_plan = None
+
+    def __init__(self, llm=None, cache=None, model_path=None):
+        # "diff" asks for SEARCH/REPLACE hunks, "full" for the whole updated file
+        self.edit_format = os.getenv("EDIT_FORMAT", "diff")
+        # Constrain edit replies with a GBNF grammar so they end at the closing fence/marker
+        self.edit_grammar = os.getenv("EDIT_GRAMMAR", "1").lower() not in ("0", "false", "no")
+        self._grammars = {}
+        self.draft_model = None
+        self.last_stats = None
+        self.cache = cache
+        self.telemetry = Telemetry.from_env()
+        # llama.cpp contexts are not thread-safe; requests and background prefills take turns
+        self._llm_lock = threading.Lock()
+        
+        if llm is not None:
+            # Injected model (e.g. stub_model.StubLlama in tests)
+            self.model_path = getattr(llm, "model_path", "stub")
+            self.model_id = self.model_path
+            self.llm = llm
+            return
+        
+        # llama_cpp is imported here rather than at module level so the CLI starts instantly
+        from llama_cpp import Llama
+        from speculative import PromptLookupDraft
+        from tuning import runtime_params
+        from memory_budget import budget_from_env, plan_for_model, llama_params
+        
+        model_path = model_path or os.getenv("MODEL_PATH", DEFAULT_MODEL_PATH)
+        self.model_path = model_path
+        self.model_id = model_identity(model_path)
+        if cache is None:
+            self.cache = ResponseCache.from_env()
         
         # Check if model file exists
         if not os.path.exists(model_path):
-            console.print(f"[red]❌ Model file not found: {model_path}[/red]")
-            console.print("[yellow]Please download a GGUF model and place it in the models/ directory[/yellow]")
-            console.print("[cyan]Example commands to download a model:[/cyan]")
-            console.print("mkdir -p models")
-            console.print("wget -P models/ https://huggingface.co/TheBloke/deepseek-coder-6.7B-instruct-GGUF/resolve/main/deepseek-coder-6.7b-instruct.Q4_K_M.gguf")
-            console.print("\n[green]Or use a different model from: https://huggingface.co/TheBloke[/green]")
-            sys.exit(1)
+            raise ModelNotFoundError(model_path)
+        
+        # Opt-in prompt-lookup speculative decoding (drafts are copied from the prompt)
+        if os.getenv("SPECULATIVE_DECODING", "0").lower() in ("1", "true", "yes"):
+            self.draft_model = PromptLookupDraft(
+                max_ngram_size=int(os.getenv("DRAFT_NGRAM", 3)),
+                num_pred_tokens=int(os.getenv("DRAFT_TOKENS", 10)),
+            )
         
+        # Threads, batch size, GPU layers and mlock/mmap: env vars, else the `tune` profile for this host
+        self.runtime_params = {"n_ctx": int(os.getenv("N_CTX", 4096)), **runtime_params(model_path)}
+        # Low-memory mode: context size (N_CTX is the most it may be), KV-cache precision and mmap/mlock fit the budget
+        budget = budget_from_env()
+        if budget:
+            self.memory_plan = plan_for_model(model_path, budget, self.runtime_params["n_ctx"])
+            self.runtime_params.update(llama_params(self.memory_plan))
         try:
             self.llm = Llama(
                 model_path=model_path,
-                n_ctx=int(os.getenv("N_CTX", 4096)),
-                n_threads=int(os.getenv("N_THREADS", 4)),
-                n_gpu_layers=int(os.getenv("N_GPU_LAYERS", 30)),
-                chat_format=os.getenv("CHAT_FORMAT", "chatml")
+                chat_format=os.getenv("CHAT_FORMAT", "chatml"),
+                draft_model=self.draft_model,
+                # llama.cpp logging would garble the prompt while loading in the background
+                verbose=False,
+                **self.runtime_params
             )
             # console.print(f"[green]✅ Model loaded successfully: {os.path.basename(model_path)}[/green]")
         except Exception as e:
-            console.print(f"[red]❌ Error loading model: {str(e)}[/red]")
-            sys.exit(1)
+            raise ModelLoadError(f"Error loading model: {str(e)}") from e
     
-    def chat(self, prompt, is_code_context=False, current_code=None):
-        """Chat with the AI in general purpose mode"""
+    def count_tokens(self, text):
+        """Count tokens with the model's own tokenizer"""
+        return len(self.llm.tokenize(text.encode("utf-8"), add_bos=False))
+    
+    def count_many(self, texts):
+        """Token counts of several texts; a remote handler counts them in one request"""
+        return [self.count_tokens(text) for text in texts]
+    
+    def reply_tokens(self):
+        """Context kept free for a reply: MAX_TOKENS, or half of a small context"""
+        return min(MAX_TOKENS, self.llm.n_ctx() // 2)
+    
+    def context_budget(self):
+        """Prompt tokens available once room is kept for the reply"""
+        return self.llm.n_ctx() - self.reply_tokens() - PROMPT_OVERHEAD_TOKENS
+    
+    def new_conversation(self):
+        """An empty multi-turn history sized for this model's context"""
+        return Conversation(self.count_tokens, int(self.context_budget() * HISTORY_SHARE))
+    
+    def edit_budget(self):
+        """Most code tokens one edit prompt can hold, leaving room for a full-file reply"""
+        return max(min(self.context_budget(), self.reply_tokens() - PROMPT_OVERHEAD_TOKENS), PROMPT_OVERHEAD_TOKENS)
+    
+    def stream(self, prompt, is_code_context=False, current_code=None, edit_format=None, use_cache=True, history=None, context=None,
+               detectors=None, cancel=None, remember=True):
+        """Stream a response as StreamEvents: one per token delta, then a final summary event.
         
-        if is_code_context and current_code:
-            # Code editing mode
-            messages = [
-                {
-                    "role": "system",
-                    "content": "You are an expert Python programmer. Modify the given code according to the user's instruction. Return ONLY the complete updated Python code with no explanations, no markdown, and no additional text. Just the pure executable Python code.",
-                },
-                {
-                    "role": "user",
-                    "content": f"Current code:\n```python\n{current_code}\n```\n\nInstruction: {prompt}\n\nReturn ONLY the complete updated Python code:",
-                },
-            ]
-            temperature = 0.1
-        else:
-            # General chat mode
-            messages = [
-                {
-                    "role": "system",
-                    "content": "You are a helpful AI assistant. Provide clear, concise, and helpful responses to the user's questions and requests.",
-                },
-                {
-                    "role": "user",
-                    "content": prompt,
-                },
-            ]
-            temperature = 0.7
-
-        try:
-            output = self.llm.create_chat_completion(
-                messages=messages,
-                max_tokens=2048,
-                temperature=temperature,
-                stop=["<|im_end|>", "###", "Instruction:", "User:"]
-            )
-            return output["choices"][0]["message"]["content"]
-        except Exception as e:
-            return f"Error generating response: {str(e)}"
+        With a Conversation as history, earlier turns are included in the
+        prompt and, unless remember is False (e.g. for alternative candidates of
+        one edit), the exchange is appended to it once the response completes.
+        Chat context is sent with this request only; the history keeps the bare prompt.
+        detectors names early_stop.STOP_DETECTORS (default: by request kind), and
+        setting the cancel Event (or Ctrl-C) ends decoding with the partial reply.
+        """
+        edit_format = edit_format or self.edit_format
+        is_edit = bool(is_code_context and current_code)
+        grammar = edit_format if self.edit_grammar and is_edit else None
+        if detectors is None:
+            detectors = default_detectors(is_edit, edit_format)
+        options = {
+            "use_cache": use_cache,
+            "grammar": grammar,
+            "detectors": detectors,
+            "cancel": cancel,
+            "task": "edit" if is_edit else "chat",
+        }
+        messages, temperature, remembered, reply = self._request_messages(
+            prompt, is_code_context, current_code, edit_format, history, context, grammar
+        )
+        events = self.stream_messages(messages, temperature, **options)
+        if history is None or not remember:
+            return events
+        return history.record(events, remembered, reply)
     
-    def chat_stream(self, prompt, is_code_context=False, current_code=None, callback=None):
-        """Stream chat response with real-time updates"""
+    def _request_messages(self, prompt, is_code_context, current_code, edit_format, history=None, context=None, grammar=None):
+        """(messages, temperature, remembered prompt, remembered reply) for one request"""
+        messages, temperature = build_messages(prompt, is_code_context, current_code, edit_format, context, constrained=grammar is not None)
+        if history is None:
+            return messages, temperature, prompt, None
         
+        system, request = messages
+        reply = None
+        remembered = prompt
         if is_code_context and current_code:
-            # Code editing mode
-            messages = [
-                {
-                    "role": "system",
-                    "content": "You are an expert Python programmer. Modify the given code according to the user's instruction. Return ONLY the complete updated Python code with no explanations, no markdown, and no additional text. Just the pure executable Python code.",
-                },
-                {
-                    "role": "user",
-                    "content": f"Current code:\n```python\n{current_code}\n```\n\nInstruction: {prompt}\n\nReturn ONLY the complete updated Python code:",
-                },
-            ]
-            temperature = 0.1
-        else:
-            # General chat mode
-            messages = [
-                {
-                    "role": "system",
-                    "content": "You are a helpful AI assistant. Provide clear, concise, and helpful responses to the user's questions and requests.",
-                },
-                {
-                    "role": "user",
-                    "content": prompt,
-                },
-            ]
-            temperature = 0.7
-
+            # Edit instructions travel with the request so the system prompt, and with it
+            # the KV cache prefix, is the same for chat and edit turns
+            request = {"role": "user", "content": f"{system['content']}\n\n{request['content']}"}
+            system = {"role": "system", "content": CHAT_SYSTEM_PROMPT}
+            remembered = f"Edit the loaded code: {prompt}"
+            if edit_format != "diff":
+                reply = "(Replied with the complete updated code.)"
+        room = self.context_budget() - self.count_tokens(system["content"]) - self.count_tokens(request["content"])
+        return history.messages(system, request, room), temperature, remembered, reply
+    
+    def prefill(self, current_code, history=None, edit_format=None):
+        """Evaluate the start of an edit prompt for current_code before the instruction is known.
+        
+        The system prompt, history and fenced code go through the model now;
+        llama.cpp reuses the longest matching prefix of its KV cache, so the
+        edit itself only evaluates the instruction. Returns the prompt tokens
+        in the context, or None when this handler cannot prefill.
+        """
+        edit_format = edit_format or self.edit_format
+        grammar = edit_format if self.edit_grammar else None
+        messages, _, _, _ = self._request_messages("", True, current_code, edit_format, history, grammar=grammar)
+        request = messages[-1]
+        content = request["content"]
+        messages[-1] = {**request, "content": content[:content.rindex(INSTRUCTION_MARKER)]}
+        return self.prefill_messages(messages, task="edit")
+    
+    def prefill_messages(self, messages, task=None):
+        # One sampled token: the prompt is evaluated and nothing worth keeping is generated
+        with self._llm_lock:
+            self.llm.create_chat_completion(messages=messages, max_tokens=1, temperature=0.0)
+            return self.llm.n_tokens
+    
+    def stream_messages(self, messages, temperature, max_tokens=MAX_TOKENS, use_cache=True, grammar=None, detectors=None, cancel=None,
+                        task=None):
+        """Stream a response to a prepared message list (used directly by the serve daemon).
+        
+        grammar names an entry of EDIT_GRAMMARS that constrains sampling. task
+        ("chat", "edit", ...) only matters to a ModelRouter; one model serves every task here.
+        """
+        generate = (messages, temperature, max_tokens, grammar, detectors, cancel)
+        if self.cache is None or not use_cache:
+            return self._observe(self._stream_messages(*generate), grammar)
+        
+        params = {
+            "temperature": temperature,
+            "max_tokens": max_tokens,
+            "stop": self._stop_sequences(grammar),
+            "grammar": grammar,
+            "detectors": list(detectors or ()),
+        }
+        key = self.cache.make_key(self.model_id, messages, params)
+        hit = self.cache.get(key)
+        if hit is not None:
+            return self._observe(self._replay(*hit), grammar)
+        return self._observe(self._stream_and_store(key, *generate), grammar)
+    
+    def _observe(self, events, grammar=None):
+        """Pass events through, recording the request's metrics in telemetry when it completes"""
+        for event in events:
+            if event.done:
+                fields = request_record(event, grammar)
+                fields["model"] = os.path.basename(self.model_path)
+                self.telemetry.record(fields)
+            yield event
+    
+    def _stop_sequences(self, grammar):
+        return GRAMMAR_STOP_SEQUENCES if grammar else STOP_SEQUENCES
+    
+    def _grammar(self, name):
+        """Compiled LlamaGrammar for an EDIT_GRAMMARS entry, built once per handler"""
+        if name is None:
+            return None
+        if name not in self._grammars:
+            try:
+                from llama_cpp import LlamaGrammar
+            except ImportError:
+                # Only reachable with an injected model (tests); it is not constrained
+                self._grammars[name] = None
+            else:
+                self._grammars[name] = LlamaGrammar.from_string(EDIT_GRAMMARS[name], verbose=False)
+        return self._grammars[name]
+    
+    def _replay(self, deltas, meta):
+        """Replay a cached response through the same event stream as a live one"""
+        start = time.perf_counter()
+        for delta in deltas:
+            yield StreamEvent(delta)
+        elapsed = time.perf_counter() - start
+        self.last_stats = {"tokens": len(deltas), "seconds": elapsed, "tokens_per_sec": 0.0, "cached": True}
+        yield StreamEvent(
+            "",
+            done=True,
+            finish_reason=meta.get("finish_reason"),
+            prompt_tokens=meta.get("prompt_tokens", 0),
+            completion_tokens=len(deltas),
+            time_to_first_token=0.0,
+            elapsed=elapsed,
+            cached=True,
+            stopped_by=meta.get("stopped_by")
+        )
+    
+    def _stream_and_store(self, key, *generate):
+        deltas = []
+        for event in self._stream_messages(*generate):
+            if event.done:
+                # A cancelled or looping reply is incomplete; one stopped at its code block is what the parser would keep
+                if event.finish_reason not in INCOMPLETE:
+                    meta = {"finish_reason": event.finish_reason, "prompt_tokens": event.prompt_tokens, "stopped_by": event.stopped_by}
+                    self.cache.put(key, deltas, meta)
+            else:
+                deltas.append(event.delta)
+            yield event
+    
+    def _stream_messages(self, messages, temperature, max_tokens=MAX_TOKENS, grammar=None, detectors=None, cancel=None):
+        if self.draft_model:
+            self.draft_model.reset_stats()
+        start = time.perf_counter()
+        first_token_at = None
+        tokens = 0
+        finish_reason = None
+        stopped_by = None
+        watchers = make_detectors(detectors)
+        native = self._native_context()
+        if native is not None:
+            native[0].llama_reset_timings(native[1])
+        # A prompt that would fill the window is shifted (oldest messages out) rather than rejected by llama.cpp
+        n_ctx = self.llm.n_ctx()
+        messages = shift_context(messages, self.count_tokens, n_ctx - min(max_tokens, n_ctx // 2))
+        
+        self._llm_lock.acquire()
         try:
-            full_response = ""
             stream = self.llm.create_chat_completion(
                 messages=messages,
-                max_tokens=2048,
+                max_tokens=max_tokens,
                 temperature=temperature,
-                stop=["<|im_end|>", "###", "Instruction:", "User:"],
+                stop=self._stop_sequences(grammar),
+                grammar=self._grammar(grammar),
                 stream=True
             )
-            
+        except BaseException:
+            self._llm_lock.release()
+            raise
+        try:
             for output in stream:
-                if "content" in output["choices"][0]["delta"]:
-                    token = output["choices"][0]["delta"]["content"]
-                    full_response += token
+                choice = output["choices"][0]
+                if choice.get("finish_reason"):
+                    finish_reason = choice["finish_reason"]
+                delta = choice["delta"].get("content")
+                if delta:
+                    if first_token_at is None:
+                        first_token_at = time.perf_counter() - start
+                    tokens += 1
+                    yield StreamEvent(delta)
+                    stopped_by = check(watchers, delta)
+                    if stopped_by:
+                        finish_reason = finish_reason_for(stopped_by)
+                        break
+                if cancel is not None and cancel.is_set():
+                    stopped_by = finish_reason = "cancelled"
+                    break
+        except KeyboardInterrupt:
+            # Ctrl-C while llama.cpp is decoding: end the request but keep what was generated
+            stopped_by = finish_reason = "cancelled"
+        finally:
+            # Closing the llama.cpp generator stops decoding straight away
+            stream.close()
+            self._llm_lock.release()
+        
+        elapsed = time.perf_counter() - start
+        self._record_stats(tokens, elapsed)
+        prompt_eval_time = None
+        if native is not None:
+            timings = native[0].llama_get_timings(native[1])
+            if timings.n_p_eval:
+                prompt_eval_time = timings.t_p_eval_ms / 1000
+        yield StreamEvent(
+            "",
+            done=True,
+            finish_reason=finish_reason,
+            # The context holds the prompt plus everything generated for it
+            prompt_tokens=max(self.llm.n_tokens - tokens, 0),
+            completion_tokens=tokens,
+            time_to_first_token=first_token_at,
+            elapsed=elapsed,
+            prompt_eval_time=prompt_eval_time,
+            stopped_by=stopped_by,
+            tokens_saved=max_tokens - tokens if stopped_by else 0
+        )
+    
+    def context_key(self):
+        """Identifies the model and context shape a saved model state can be restored into"""
+        params = getattr(self, "runtime_params", {})
+        shape = [self.llm.n_ctx(), params.get("type_k"), params.get("type_v")]
+        return f"{self.model_id}|{':'.join(str(value) for value in shape)}"
+    
+    def save_context(self):
+        """(input_ids, state data) of the evaluated context, or None when nothing has been evaluated.
+        
+        Llama.save_state() would also copy n_tokens x n_vocab logits; the raw
+        state data holds the KV cache and only the latest logits, and
+        generation always re-evaluates the last prompt token anyway.
+        """
+        with self._llm_lock:
+            native = self._native_context()
+            if native is None:
+                state = self.llm.save_state()
+                input_ids, blob = list(state.input_ids[:state.n_tokens]), bytes(state.llama_state)
+            else:
+                import ctypes
+                llama_cpp, ctx = native
+                buffer = (ctypes.c_uint8 * llama_cpp.llama_get_state_size(ctx))()
+                size = llama_cpp.llama_copy_state_data(ctx, buffer)
+                input_ids, blob = self.llm.input_ids[:self.llm.n_tokens].tolist(), ctypes.string_at(buffer, size)
+        return (input_ids, blob) if input_ids else None
+    
+    def load_context(self, input_ids, blob):
+        """Restore a context saved by save_context(); prompts starting with input_ids then skip evaluating them"""
+        with self._llm_lock:
+            native = self._native_context()
+            if native is None:
+                self.llm.load_state(SimpleNamespace(
+                    input_ids=list(input_ids), scores=None, n_tokens=len(input_ids), llama_state=bytes(blob), llama_state_size=len(blob)
+                ))
+                return
+            import ctypes
+            llama_cpp, ctx = native
+            buffer = (ctypes.c_uint8 * len(blob)).from_buffer_copy(blob)
+            if llama_cpp.llama_set_state_data(ctx, buffer) != len(blob):
+                raise ModelLoadError("Saved model state does not match this model")
+            self.llm.input_ids[:len(input_ids)] = input_ids
+            self.llm.n_tokens = len(input_ids)
+    
+    def _native_context(self):
+        """(llama_cpp module, context pointer) for reading llama.cpp's timings, or None for injected models"""
+        ctx = getattr(getattr(self.llm, "_ctx", None), "ctx", None)
+        if ctx is None:
+            return None
+        import llama_cpp
+        return llama_cpp, ctx
+    
+    async def astream(self, prompt, is_code_context=False, current_code=None, edit_format=None, history=None):
+        """Async iterator over stream(); generation runs on a worker thread"""
+        import asyncio
+        
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue()
+        # Set when the consumer stops iterating, so decoding stops too
+        cancel = threading.Event()
+        
+        def produce():
+            try:
+                for event in self.stream(prompt, is_code_context, current_code, edit_format, history=history, cancel=cancel):
+                    loop.call_soon_threadsafe(queue.put_nowait, event)
+            except Exception as e:
+                loop.call_soon_threadsafe(queue.put_nowait, e)
+            finally:
+                loop.call_soon_threadsafe(queue.put_nowait, None)
+        
+        threading.Thread(target=produce, daemon=True).start()
+        try:
+            while True:
+                item = await queue.get()
+                if item is None:
+                    return
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            cancel.set()
+    
+    def chat(self, prompt, is_code_context=False, current_code=None, edit_format=None, history=None):
+        """Chat with the AI in general purpose mode"""
+        try:
+            return "".join(event.delta for event in self.stream(prompt, is_code_context, current_code, edit_format, history=history))
+        except Exception as e:
+            return f"Error generating response: {str(e)}"
+    
+    def chat_stream(self, prompt, is_code_context=False, current_code=None, callback=None, edit_format=None, history=None):
+        """Stream chat response with real-time updates; callback receives the text so far"""
+        try:
+            full_response = ""
+            for event in self.stream(prompt, is_code_context, current_code, edit_format, history=history):
+                if event.delta:
+                    full_response += event.delta
                     if callback:
                         callback(full_response)
-            
             return full_response
-            
         except Exception as e:
-            return f"Error generating response: {str(e)}"
\ No newline at end of file
+            return f"Error generating response: {str(e)}"
+    
+    def _record_stats(self, tokens, elapsed):
+        """Keep throughput (and speculative acceptance) figures for the last request"""
+        self.last_stats = {
+            "tokens": tokens,
+            "seconds": elapsed,
+            "tokens_per_sec": tokens / elapsed if elapsed > 0 else 0.0,
+        }
+        if self.draft_model:
+            self.draft_model.settle()
+            self.last_stats.update(self.draft_model.stats())
+
+
+class ModelLoader:
+    """Loads the AIHandler on a background thread so the REPL is usable immediately"""
+    def __init__(self, factory=AIHandler):
+        self.factory = factory
+        self.handler = None
+        self.error = None
+        self.started_at = None
+        self._done = threading.Event()
+    
+    def start(self):
+        self.started_at = time.monotonic()
+        threading.Thread(target=self._load, daemon=True).start()
+        return self
+    
+    def _load(self):
+        try:
+            self.handler = self.factory()
+        except Exception as e:
+            self.error = e
+        finally:
+            self._done.set()
+    
+    @property
+    def ready(self):
+        return self._done.is_set()
+    
+    @property
+    def elapsed(self):
+        return time.monotonic() - self.started_at if self.started_at else 0.0
+    
+    def wait(self, timeout=None):
+        """Wait for loading to finish; returns the handler or raises the load error"""
+        self._done.wait(timeout)
+        if self.error is not None:
+            raise self.error
+        return self.handler
+    
+    def status(self):
+        """One-line loading status for the prompt toolbar"""
+        if not self.ready:
+            return f"⏳ Loading model... {self.elapsed:.0f}s"
+        if self.error is not None:
+            return "❌ Model unavailable"
+        if getattr(self.handler, "server_url", None):
+            return f"✅ Model ready (juno serve at {self.handler.server_url})"
+        if hasattr(self.handler, "describe"):
+            return f"✅ Models ready ({self.handler.describe()})"
+        return "✅ Model ready"
@@ -0,0 +1,211 @@
+import argparse
+import difflib
+import glob
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from rich.console import Console
+from model_router import create_handler
+from response_cache import ResponseCache
+from early_stop import INCOMPLETE
+from edit_pipeline import EditPipeline
+from validation import Validator
+
+console = Console()
+
+# Per-process handler, created once by the pool initializer
+_worker_handler = None
+# Per-process validators (their thread pools do not survive a fork): syntax plus
+# EDIT_CHECKS for whole files, syntax only for chunks of a large file
+_validators = None
+
+
+def _collect(events):
+    """Drain a StreamEvent iterator into (text, completion_tokens); text is None if the reply is incomplete"""
+    parts, tokens, finished = [], 0, True
+    for event in events:
+        if event.done:
+            tokens = event.completion_tokens
+            finished = event.finish_reason not in INCOMPLETE
+        else:
+            parts.append(event.delta)
+    return "".join(parts) if finished else None, tokens
+
+
+def apply_edit(handler, instruction, code, path=None):
+    """Edit code without any UI through the REPL's edit pipeline.
+
+    Returns (code, tokens, failed checks); code is None if no edit could be generated.
+    """
+    global _validators
+    if _validators is None:
+        _validators = (Validator.from_env(), Validator())
+    tokens = 0
+
+    def stream(prompt, edit_format, current, history, remember, use_cache):
+        nonlocal tokens
+        response, used = _collect(handler.stream(
+            prompt, is_code_context=True, current_code=current, edit_format=edit_format,
+            use_cache=use_cache, history=history, remember=remember,
+        ))
+        tokens += used
+        return response
+
+    updated, failures = EditPipeline(handler, stream, *_validators).edit(instruction, code, path)
+    return updated, tokens, failures
+
+
+def _init_worker(factory):
+    global _worker_handler, _validators
+    # Workers only read the response cache; the parent writes what they would have stored
+    os.environ["RESPONSE_CACHE_READONLY"] = "1"
+    _worker_handler = factory()
+    _validators = None
+
+
+def run_job(path, instruction, write, handler=None):
+    """Edit one file and return its result record"""
+    handler = handler or _worker_handler
+    start = time.perf_counter()
+    record = {"path": path}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            original = f.read()
+        updated, tokens, failures = apply_edit(handler, instruction, original, path)
+        record["tokens"] = tokens
+        if failures:
+            record["status"] = "failed"
+            record["error"] = "Edit fails its checks: " + ", ".join(failures)
+            record["checks"] = failures
+        elif updated is None:
+            record["status"] = "failed"
+            record["error"] = "Could not extract valid code from response"
+        elif updated == original:
+            record["status"] = "unchanged"
+        else:
+            record["status"] = "changed"
+            record["diff"] = "".join(difflib.unified_diff(
+                original.splitlines(keepends=True), updated.splitlines(keepends=True),
+                fromfile=f"a/{path}", tofile=f"b/{path}"
+            ))
+            if write:
+                with open(path, "w", encoding="utf-8") as f:
+                    f.write(updated)
+    except Exception as e:
+        record["status"] = "failed"
+        record["error"] = str(e)
+    record["seconds"] = round(time.perf_counter() - start, 3)
+    cache = getattr(handler, "cache", None)
+    writes = cache.take_deferred() if cache is not None else []
+    if writes:
+        record["cache_writes"] = writes
+    return record
+
+
+def _load_done(output):
+    """Paths a previous run's results file records as edited or left unchanged; failed ones are retried"""
+    done = set()
+    if not os.path.exists(output):
+        return done
+    with open(output, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+                if record["status"] in ("changed", "unchanged"):
+                    done.add(record["path"])
+            except (ValueError, KeyError):
+                continue  # Partial line from an interrupted run
+    return done
+
+
+def run_batch(pattern, instruction, output="juno-batch.jsonl", workers=None, write=False,
+              resume=True, handler_factory=create_handler):
+    """Apply instruction to every file matching pattern; returns the throughput summary.
+
+    workers=0 runs jobs in this process. Otherwise each pool worker loads its
+    own AIHandler; llama.cpp mmaps the GGUF, so the weights are shared through
+    the page cache rather than copied per process. Workers open the response
+    cache read-only and return what they would have stored with each result;
+    this process writes it.
+    """
+    paths = sorted(path for path in glob.glob(pattern, recursive=True) if os.path.isfile(path))
+    done = _load_done(output) if resume else set()
+    pending = [path for path in paths if path not in done]
+    console.print(f"[cyan]📋 {len(paths)} file(s) matched, {len(paths) - len(pending)} already done, {len(pending)} to edit[/cyan]")
+
+    if workers is None:
+        workers = max(1, min(len(pending), (os.cpu_count() or 2) // 4))
+    if workers:
+        # Split the cores between workers unless the user pinned N_THREADS
+        os.environ.setdefault("N_THREADS", str(max(1, (os.cpu_count() or 1) // workers)))
+
+    # Written by this process for every worker, so they never contend for the SQLite write lock
+    cache = ResponseCache.from_env() if workers else None
+    counts = {"changed": 0, "unchanged": 0, "failed": 0}
+    tokens = 0
+    start = time.perf_counter()
+    with open(output, "a" if resume else "w", encoding="utf-8") as results:
+        def record(result):
+            nonlocal tokens
+            writes = result.pop("cache_writes", None)
+            if writes and cache is not None:
+                cache.apply(writes)
+            results.write(json.dumps(result) + "\n")
+            results.flush()
+            counts[result["status"]] += 1
+            tokens += result.get("tokens", 0)
+            icon = {"changed": "✅", "unchanged": "➖", "failed": "❌"}[result["status"]]
+            console.print(f"{icon} {result['path']} [dim]({result.get('tokens', 0)} tokens, {result['seconds']:.1f}s)[/dim]")
+
+        if not workers:
+            handler = handler_factory()
+            for path in pending:
+                record(run_job(path, instruction, write, handler))
+        else:
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(handler_factory,)) as pool:
+                # Keep only a couple of jobs queued per worker so an interrupt loses little work
+                queue = iter(pending)
+                running = set()
+                while True:
+                    while len(running) < workers * 2:
+                        path = next(queue, None)
+                        if path is None:
+                            break
+                        running.add(pool.submit(run_job, path, instruction, write))
+                    if not running:
+                        break
+                    finished, running = wait(running, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        record(future.result())
+
+    elapsed = time.perf_counter() - start
+    processed = sum(counts.values())
+    summary = {
+        **counts,
+        "files": processed,
+        "seconds": round(elapsed, 3),
+        "files_per_min": processed / elapsed * 60 if elapsed > 0 else 0.0,
+        "tokens_per_sec": tokens / elapsed if elapsed > 0 else 0.0,
+    }
+    console.print(
+        f"[bold green]Done: {counts['changed']} changed, {counts['unchanged']} unchanged, {counts['failed']} failed "
+        f"in {elapsed:.1f}s ({summary['files_per_min']:.1f} files/min, {summary['tokens_per_sec']:.1f} tokens/sec)[/bold green]"
+    )
+    return summary
+
+
+def batch_main(argv):
+    """Entry point for `python src/main.py batch ...`"""
+    parser = argparse.ArgumentParser(prog="juno batch", description="Apply one edit instruction to many files without the REPL")
+    parser.add_argument("--glob", required=True, dest="pattern", help="Files to edit, e.g. 'src/**/*.py'")
+    parser.add_argument("--instruction", required=True, help="Edit instruction applied to every file")
+    parser.add_argument("--output", default="juno-batch.jsonl", help="Per-file results (JSONL); also the resume log")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (0 = run in this process)")
+    parser.add_argument("--write", action="store_true", help="Write edited files back (default: only record diffs)")
+    parser.add_argument("--restart", action="store_true", help="Ignore previous results instead of resuming")
+    args = parser.parse_args(argv)
+
+    summary = run_batch(args.pattern, args.instruction, output=args.output, workers=args.workers,
+                        write=args.write, resume=not args.restart)
+    return 1 if summary["failed"] else 0
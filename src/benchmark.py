@@ -0,0 +1,294 @@
+import argparse
+import io
+import json
+import os
+import platform
+import shutil
+import statistics
+import tempfile
+import time
+from rich.console import Console
+
+console = Console()
+
+# A metric more than this much worse than the baseline fails the run
+DEFAULT_THRESHOLD = 0.25
+DEFAULT_TREE_SIZES = (10_000, 100_000)
+# Timings report the best of several runs; the minimum is the least noisy estimate
+DEFAULT_RUNS = 5
+# Differences smaller than this are timer and scheduler noise, whatever their relative size
+NOISE_FLOOR = {"s": 0.002, "ms": 2.0, "us/token": 10.0}
+
+
+def _metric(value, unit, better="lower", **extra):
+    return {"value": value, "unit": unit, "better": better, **extra}
+
+
+def synthetic_code(lines):
+    """Deterministic Python source of roughly the given number of lines"""
+    out = ["import os", "import sys", ""]
+    index = 0
+    while len(out) < lines:
+        out.extend([
+            f"def function_{index}(value, scale={index % 7}):",
+            f'    """Compute result number {index}"""',
+            f"    total = value * scale + {index}",
+            "    if total > 100:",
+            "        return total // 2",
+            "    return total",
+            "",
+        ])
+        index += 1
+    return "\n".join(out[:lines]) + "\n"
+
+
+def stub_handler():
+    """AIHandler over a StubLlama that answers with a fixed function"""
+    from ai_handler import AIHandler
+    from stub_model import StubLlama
+    return AIHandler(llm=StubLlama(reply="```python\n" + synthetic_code(60) + "```"), cache=None)
+
+
+def _reset(handler):
+    """Drop the KV cache so every run evaluates its prompt from scratch"""
+    llm = getattr(handler, "llm", None)
+    if llm is not None and hasattr(llm, "reset"):
+        llm.reset()
+
+
+def bench_generation(handler, runs=DEFAULT_RUNS):
+    """Time to first token and decode rate for a chat request"""
+    first_tokens, rates = [], []
+    for _ in range(runs):
+        _reset(handler)
+        for event in handler.stream("Write a Python function that reverses a string.", use_cache=False):
+            if event.done:
+                first_tokens.append(event.time_to_first_token or 0.0)
+                rates.append(event.completion_tokens / event.elapsed if event.elapsed else 0.0)
+    return {
+        "generation.ttft": _metric(min(first_tokens), "s"),
+        "generation.tokens_per_sec": _metric(max(rates), "tokens/s", better="higher"),
+    }
+
+
+def bench_prompt_eval(handler, runs=DEFAULT_RUNS, shares=(0.25, 0.5, 1.0)):
+    """Time to first token for edits of files filling a share of the edit budget"""
+    budget = handler.edit_budget()
+    metrics = {}
+    for share in shares:
+        target = int(budget * share)
+        lines = max(target // 8, 3)
+        code = synthetic_code(lines)
+        while lines > 3 and handler.count_tokens(code) > target:
+            lines = int(lines * 0.9)
+            code = synthetic_code(lines)
+        times = []
+        for _ in range(runs):
+            _reset(handler)
+            events = handler.stream("Rename value to amount", is_code_context=True, current_code=code, use_cache=False)
+            start = time.perf_counter()
+            for event in events:
+                if not event.done:
+                    times.append(time.perf_counter() - start)
+                    break
+            events.close()
+        metrics[f"prompt_eval.ttft_{int(share * 100)}pct_budget"] = _metric(
+            min(times) if times else 0.0, "s", tokens=handler.count_tokens(code)
+        )
+    return metrics
+
+
+def bench_render(tokens=2000, frame_every=25, runs=DEFAULT_RUNS):
+    """CPU spent per streamed token by the streaming panels, printing settled lines every frame_every tokens"""
+    from stub_model import _TOKEN_RE
+    from stream_render import StreamingCodePanel, StreamingTextPanel, print_settled
+
+    target = Console(file=io.StringIO(), width=100, height=40, force_terminal=True, color_system="truecolor")
+    pieces = _TOKEN_RE.findall("```python\n" + synthetic_code(tokens // 4))[:tokens]
+
+    def per_token(panel):
+        start = time.perf_counter()
+        for index, piece in enumerate(pieces):
+            panel.feed(piece)
+            if index % frame_every == 0:
+                print_settled(target, panel)
+        print_settled(target, panel, final=True)
+        return (time.perf_counter() - start) / len(pieces) * 1e6
+
+    return {
+        "render.code_panel_per_token": _metric(
+            min(per_token(StreamingCodePanel("bench", "yellow")) for _ in range(runs)), "us/token"
+        ),
+        "render.text_panel_per_token": _metric(
+            min(per_token(StreamingTextPanel("bench", "blue")) for _ in range(runs)), "us/token"
+        ),
+    }
+
+
+def make_tree(root, files, per_dir=100):
+    """Create a synthetic project tree of empty files, per_dir files to a directory"""
+    for index in range(files):
+        directory = os.path.join(root, f"pkg{index // (per_dir * per_dir)}", f"sub{(index // per_dir) % per_dir}")
+        if index % per_dir == 0:
+            os.makedirs(directory, exist_ok=True)
+        open(os.path.join(directory, f"module_{index}.py"), "w").close()
+
+
+def bench_completer(files, queries=("mod", "module_4", "pkg0/sub1", "mdl99", "zzz"), runs=DEFAULT_RUNS):
+    """Index build time and `load @` completion latency on a synthetic tree (best of runs)"""
+    from prompt_toolkit.document import Document
+    from file_index import FileIndex
+    from file_manager import FileCompleter
+
+    root = tempfile.mkdtemp(prefix="juno-bench-")
+    try:
+        make_tree(root, files)
+        builds = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            index = FileIndex(root=root).start()
+            index.wait()
+            builds.append(time.perf_counter() - start)
+        build = min(builds)
+
+        completer = FileCompleter(index)
+        latencies = []
+        for query in queries:
+            text = f"load @{query}"
+            samples = []
+            for _ in range(runs):
+                start = time.perf_counter()
+                list(completer.get_completions(Document(text, len(text)), None))
+                samples.append(time.perf_counter() - start)
+            latencies.append(min(samples))
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+    label = f"{files // 1000}k" if files >= 1000 else str(files)
+    return {
+        f"file_index.build_{label}_files": _metric(build, "s"),
+        f"completer.{label}_files_p50": _metric(statistics.median(latencies) * 1000, "ms"),
+        f"completer.{label}_files_max": _metric(max(latencies) * 1000, "ms"),
+    }
+
+
+def bench_extract(lines=2000, runs=DEFAULT_RUNS):
+    """Throughput of the code extractors on a prose-wrapped reply"""
+    from edit_protocol import parse_fenced_code
+    from utils import extract_pure_code
+
+    code = synthetic_code(lines)
+    wrapped = f"Here is the updated code:\n\n```python\n{code}```\n\nI renamed the variables as requested."
+    fenced = f"```python\n{code}```"
+    megabytes = len(wrapped) / 1e6
+
+    def throughput(function, text):
+        times = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            function(text)
+            times.append(time.perf_counter() - start)
+        return megabytes / min(times)
+
+    return {
+        "extract.pure_code_mb_per_sec": _metric(throughput(extract_pure_code, wrapped), "MB/s", better="higher"),
+        "extract.fenced_code_mb_per_sec": _metric(throughput(parse_fenced_code, fenced), "MB/s", better="higher"),
+    }
+
+
+def run_benchmarks(handler=None, model="stub", tree_sizes=DEFAULT_TREE_SIZES, runs=DEFAULT_RUNS, render_tokens=2000):
+    """Run every benchmark and return the JSON-ready results"""
+    handler = handler or stub_handler()
+    metrics = {}
+    steps = [
+        ("generation", lambda: bench_generation(handler, runs)),
+        ("prompt eval", lambda: bench_prompt_eval(handler, runs)),
+        ("render", lambda: bench_render(render_tokens, runs=runs)),
+        ("extract", lambda: bench_extract(runs=runs)),
+    ] + [(f"completer ({size} files)", lambda size=size: bench_completer(size, runs=runs)) for size in tree_sizes]
+    for label, step in steps:
+        with console.status(f"[cyan]⏱ Benchmarking {label}...[/cyan]"):
+            metrics.update(step())
+    return {
+        "model": model,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "host": {"platform": platform.platform(), "python": platform.python_version(), "cpus": os.cpu_count()},
+        "metrics": metrics,
+    }
+
+
+def compare(results, baseline, threshold=DEFAULT_THRESHOLD):
+    """Metrics worse than the baseline by more than threshold, as (name, old, new, change)"""
+    regressions = []
+    for name, metric in results["metrics"].items():
+        old = baseline.get("metrics", {}).get(name)
+        if not old or not old["value"]:
+            continue
+        if abs(metric["value"] - old["value"]) < NOISE_FLOOR.get(metric["unit"], 0.0):
+            continue
+        if metric["better"] == "lower":
+            change = (metric["value"] - old["value"]) / old["value"]
+        else:
+            change = (old["value"] - metric["value"]) / old["value"]
+        if change > threshold:
+            regressions.append((name, old["value"], metric["value"], change))
+    return regressions
+
+
+def show_results(results, regressions=()):
+    from rich.table import Table
+
+    worse = {name: change for name, _, _, change in regressions}
+    table = Table(title=f"⏱ Benchmarks ({results['model']})", show_header=True, header_style="bold magenta")
+    table.add_column("Metric", style="cyan")
+    table.add_column("Value", justify="right")
+    table.add_column("Unit", style="dim")
+    for name, metric in results["metrics"].items():
+        value = f"{metric['value']:.4g}"
+        if name in worse:
+            value = f"[red]{value} (+{worse[name]:.0%} worse)[/red]"
+        table.add_row(name, value, metric["unit"])
+    console.print(table)
+
+
+def bench_main(argv):
+    """Entry point for `python src/main.py bench ...`"""
+    parser = argparse.ArgumentParser(prog="juno bench", description="Benchmark JUNO against a stub or real model")
+    parser.add_argument("--model", action="store_true", help="Use the real model from MODEL_PATH instead of the stub")
+    parser.add_argument("--output", default="juno-bench.json", help="Where to write the JSON results")
+    parser.add_argument("--baseline", help="Earlier results to compare against")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="Allowed slowdown before failing (0.25 = 25%%)")
+    parser.add_argument("--quick", action="store_true", help="Skip the 100k-file tree and use fewer runs")
+    parser.add_argument("--save-baseline", help="Also write the results here, as the baseline for later runs")
+    args = parser.parse_args(argv)
+
+    tree_sizes = DEFAULT_TREE_SIZES[:1] if args.quick else DEFAULT_TREE_SIZES
+    runs = 2 if args.quick else DEFAULT_RUNS
+    handler, model = None, "stub"
+    if args.model:
+        from ai_handler import AIHandler, ModelLoadError, ModelNotFoundError, show_model_help
+        try:
+            with console.status("[cyan]⏳ Loading model...[/cyan]"):
+                handler = AIHandler()
+        except ModelNotFoundError as e:
+            show_model_help(e.model_path)
+            return 1
+        except (ModelLoadError, ImportError) as e:
+            console.print(f"[red]❌ {str(e)}[/red]")
+            return 1
+        model = os.path.basename(handler.model_path)
+
+    results = run_benchmarks(handler, model=model, tree_sizes=tree_sizes, runs=runs)
+    for path in filter(None, (args.output, args.save_baseline)):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.threshold)
+    show_results(results, regressions)
+    console.print(f"[green]Results written to {args.output}[/green]")
+    if regressions:
+        console.print(f"[red]❌ {len(regressions)} metric(s) regressed by more than {args.threshold:.0%}[/red]")
+        return 1
+    return 0
@@ -0,0 +1,163 @@
+import ast
+import re
+import textwrap
+
+# Words that say nothing about which part of the file an instruction targets
+_STOPWORDS = {
+    "the", "and", "for", "with", "that", "this", "from", "into", "add", "use", "make",
+    "function", "functions", "method", "methods", "class", "classes", "code", "file",
+    "change", "update", "convert", "rename", "remove", "replace", "should", "please",
+}
+_WORD_RE = re.compile(r"[A-Za-z_][A-Za-z0-9_]*")
+
+
+class Chunk:
+    """A contiguous run of lines: a top-level def/class, or the module code between them"""
+    def __init__(self, kind, name, start, end, text):
+        self.kind = kind
+        self.name = name
+        self.start = start
+        self.end = end
+        self.text = text
+
+    def __repr__(self):
+        return f"Chunk({self.kind}, {self.name!r}, lines {self.start + 1}-{self.end})"
+
+
+def _split_lines(source):
+    """Split on newlines only, like ast's line numbers (str.splitlines also splits on \\f etc.)"""
+    parts = source.split("\n")
+    return [part + "\n" for part in parts[:-1]] + ([parts[-1]] if parts[-1] else [])
+
+
+def _node_start(node):
+    """First line of a node including its decorators (0-based)"""
+    lines = [node.lineno] + [decorator.lineno for decorator in getattr(node, "decorator_list", [])]
+    return min(lines) - 1
+
+
+def _split_nodes(nodes, lines, start, end):
+    """Cut lines[start:end] into chunks at the given AST nodes, leaving no gaps"""
+    chunks = []
+    position = start
+    for node in nodes:
+        node_start, node_end = max(_node_start(node), position), node.end_lineno
+        if node_start > position:
+            chunks.append(Chunk("module", None, position, node_start, "".join(lines[position:node_start])))
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            kind, name = ("class" if isinstance(node, ast.ClassDef) else "function"), node.name
+        else:
+            kind, name = "module", None
+        chunks.append(Chunk(kind, name, node_start, node_end, "".join(lines[node_start:node_end])))
+        position = node_end
+    if position < end:
+        chunks.append(Chunk("module", None, position, end, "".join(lines[position:end])))
+
+    # Merge runs of plain module statements so imports/constants travel together
+    merged = []
+    for chunk in chunks:
+        if merged and chunk.kind == "module" and merged[-1].kind == "module":
+            previous = merged.pop()
+            chunk = Chunk("module", None, previous.start, chunk.end, previous.text + chunk.text)
+        merged.append(chunk)
+    return merged
+
+
+def split_chunks(source):
+    """Split source into top-level chunks; joining their text gives back source exactly"""
+    tree = ast.parse(source)
+    lines = _split_lines(source)
+    return _split_nodes(tree.body, lines, 0, len(lines)), tree
+
+
+def split_class(chunk, tree, source):
+    """Split a class chunk into its header and members, for classes over the token budget"""
+    lines = _split_lines(source)
+    for node in tree.body:
+        if isinstance(node, ast.ClassDef) and node.name == chunk.name and _node_start(node) == chunk.start:
+            members = _split_nodes(node.body, lines, chunk.start, chunk.end)
+            for member in members:
+                if member.name:
+                    member.name = f"{chunk.name}.{member.name}"
+            return members
+    return [chunk]
+
+
+def _words(text):
+    return {word.lower() for word in _WORD_RE.findall(text) if len(word) > 2}
+
+
+def select_chunks(chunks, instruction):
+    """Pick the chunks an instruction is about.
+
+    Chunks named in the instruction win outright; otherwise chunks are
+    ranked by identifier overlap. Returns all code chunks when nothing in
+    the instruction points anywhere (e.g. "add type hints everywhere").
+    """
+    mentioned = set(_WORD_RE.findall(instruction))
+    named = [chunk for chunk in chunks if chunk.name and (chunk.name in mentioned or chunk.name.split(".")[-1] in mentioned)]
+    if named:
+        return named
+
+    wanted = _words(instruction) - _STOPWORDS
+    scored = []
+    for chunk in chunks:
+        overlap = len(wanted & _words(chunk.text))
+        if overlap:
+            scored.append((overlap, chunk))
+    if scored:
+        best = max(score for score, _ in scored)
+        return [chunk for score, chunk in scored if score == best]
+    return [chunk for chunk in chunks if chunk.kind != "module"] or list(chunks)
+
+
+def plan_chunks(source, instruction, count_tokens, budget):
+    """Return the chunks to edit, each fitting budget tokens, or None if the file can't be chunked"""
+    try:
+        chunks, tree = split_chunks(source)
+    except SyntaxError:
+        return None
+
+    selected = select_chunks(chunks, instruction)
+    planned = []
+    for chunk in selected:
+        if count_tokens(chunk.text) <= budget:
+            planned.append(chunk)
+            continue
+        if chunk.kind != "class":
+            return None
+        members = split_class(chunk, tree, source)
+        relevant = select_chunks(members, instruction)
+        if any(count_tokens(member.text) > budget for member in relevant):
+            return None
+        planned.extend(relevant)
+    return sorted(planned, key=lambda chunk: chunk.start)
+
+
+def splice(source, edits):
+    """Replace chunk line ranges with new text; everything else is kept byte-for-byte"""
+    lines = _split_lines(source)
+    result = []
+    position = 0
+    for chunk, new_text in sorted(edits, key=lambda edit: edit[0].start):
+        result.append("".join(lines[position:chunk.start]))
+        # Keep the chunk's line ending so the next chunk still starts on its own line
+        if chunk.text.endswith("\n") and not new_text.endswith("\n"):
+            new_text += "\n"
+        result.append(new_text)
+        position = chunk.end
+    result.append("".join(lines[position:]))
+    return "".join(result)
+
+
+def dedent_chunk(text):
+    """Strip a class member's common indentation before it is sent to the model"""
+    dedented = textwrap.dedent(text)
+    first = next((line for line in text.splitlines() if line.strip()), "")
+    first_dedented = next((line for line in dedented.splitlines() if line.strip()), "")
+    return dedented, first[:len(first) - len(first_dedented)]
+
+
+def reindent_chunk(text, indent):
+    """Restore the indentation removed by dedent_chunk"""
+    return textwrap.indent(text, indent) if indent else text
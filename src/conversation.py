@@ -0,0 +1,195 @@
+# Chat template tokens around each message (<|im_start|>role\n ... <|im_end|>\n)
+TURN_OVERHEAD_TOKENS = 6
+# After an eviction the turns are cut down to this share of the budget...
+LOW_WATER = 0.5
+# ...and the summary of evicted turns may use at most this share, leaving headroom until the next eviction
+SUMMARY_SHARE = 0.2
+# Characters of each evicted message kept in the summary
+SUMMARY_CHARS = 160
+
+
+class Turn:
+    """One stored message with its token count, measured once when it is added"""
+    def __init__(self, role, content, tokens):
+        self.role = role
+        self.content = content
+        self.tokens = tokens
+
+    def message(self):
+        return {"role": self.role, "content": self.content}
+
+
+def _excerpt(text):
+    """First line of a message, shortened for the summary"""
+    line = next((line.strip() for line in text.splitlines() if line.strip()), "")
+    return line if len(line) <= SUMMARY_CHARS else line[:SUMMARY_CHARS - 3] + "..."
+
+
+class Conversation:
+    """Multi-turn history shared by chat and edit requests, kept within a token budget.
+
+    Turns are only ever appended, so consecutive prompts share their whole
+    history as a prefix and llama.cpp re-evaluates only the newest turn (its
+    KV cache keeps the longest matching prefix). When the history outgrows
+    its budget, the oldest turns are evicted in one block down to LOW_WATER
+    and folded into a short extractive summary, instead of sliding one turn
+    per request, which would change the prefix every time.
+    """
+    def __init__(self, count_tokens, budget):
+        self.count_tokens = count_tokens
+        self.budget = budget
+        self.turns = []
+        self.summary = None
+        self.evicted = 0
+        self._tokens = 0
+
+    @property
+    def tokens(self):
+        return self._tokens + (self.summary.tokens if self.summary else 0)
+
+    def _append(self, role, content):
+        turn = Turn(role, content, self.count_tokens(content) + TURN_OVERHEAD_TOKENS)
+        self.turns.append(turn)
+        self._tokens += turn.tokens
+
+    def add(self, role, content):
+        self._append(role, content)
+        if self.tokens > self.budget:
+            self._compact()
+
+    def add_exchange(self, prompt, reply):
+        """Store a user message and its answer, compacting only once both are in"""
+        self._append("user", prompt)
+        self.add("assistant", reply)
+
+    def undo(self):
+        """Drop the last exchange (e.g. a diff reply that could not be applied)"""
+        while self.turns:
+            turn = self.turns.pop()
+            self._tokens -= turn.tokens
+            if turn.role == "user":
+                break
+
+    def clear(self):
+        self.turns = []
+        self.summary = None
+        self.evicted = 0
+        self._tokens = 0
+
+    def state(self):
+        """The history as plain data, for session snapshots"""
+        turns = self.turns + ([self.summary] if self.summary else [])
+        return {
+            "turns": [[turn.role, turn.content, turn.tokens] for turn in turns],
+            "summary": self.summary is not None,
+            "evicted": self.evicted,
+        }
+
+    def restore(self, state):
+        """Replace the history with one saved by state(); token counts are kept, not recounted"""
+        turns = [Turn(role, content, tokens) for role, content, tokens in state["turns"]]
+        self.summary = turns.pop() if state["summary"] else None
+        self.turns = turns
+        self.evicted = state["evicted"]
+        self._tokens = sum(turn.tokens for turn in turns)
+        if self.tokens > self.budget:
+            # Saved with a larger context
+            self._compact()
+
+    def _compact(self):
+        """Evict the oldest turns into the summary until the history is back under LOW_WATER"""
+        target = self.budget * LOW_WATER
+        lines = self.summary.content.split("\n")[1:] if self.summary else []
+        while self.turns and (self._tokens > target or self.turns[0].role != "user"):
+            turn = self.turns.pop(0)
+            self._tokens -= turn.tokens
+            self.evicted += 1
+            lines.append(f"- {turn.role.capitalize()}: {_excerpt(turn.content)}")
+
+        # The summary keeps the most recent evicted lines that fit its share
+        while lines:
+            content = "Summary of the earlier conversation:\n" + "\n".join(lines)
+            tokens = self.count_tokens(content) + TURN_OVERHEAD_TOKENS
+            if tokens <= self.budget * SUMMARY_SHARE or len(lines) == 1:
+                break
+            lines.pop(0)
+        self.summary = Turn("system", content, tokens) if lines else None
+
+    def messages(self, system, request, room=None):
+        """The prompt for a new request: system prompt, summary, history, request.
+
+        room is the token space left for history next to this request; if the
+        history does not fit, the oldest turns are left out of this prompt only.
+        """
+        turns = self.turns
+        if room is not None and self.tokens > room:
+            available = room - (self.summary.tokens if self.summary else 0)
+            kept, used = len(turns), 0
+            while kept and used + turns[kept - 1].tokens <= available:
+                kept -= 1
+                used += turns[kept].tokens
+            turns = turns[kept:]
+            while turns and turns[0].role != "user":
+                turns = turns[1:]
+        prompt = [system]
+        if self.summary:
+            prompt.append(self.summary.message())
+        prompt.extend(turn.message() for turn in turns)
+        prompt.append(request)
+        return prompt
+
+    def record(self, events, prompt, reply=None):
+        """Pass a StreamEvent iterator through, storing the exchange once it completes.
+
+        reply replaces the streamed text in the history (e.g. a whole-file
+        edit is remembered as a note rather than the full file).
+        """
+        parts = []
+        for event in events:
+            if event.done:
+                if event.finish_reason == "cancelled":
+                    # Remember a cancelled reply as far as it got, if it got anywhere
+                    if parts:
+                        self.add_exchange(prompt, "".join(parts))
+                else:
+                    self.add_exchange(prompt, reply if reply is not None else "".join(parts))
+            else:
+                parts.append(event.delta)
+            yield event
+
+
+def _cut_middle(text, count_tokens, room):
+    """text shortened to about room tokens by cutting out its middle"""
+    tokens = count_tokens(text)
+    keep = int(len(text) * room / max(tokens, 1))
+    while keep > 0:
+        cut = len(text) - keep
+        shortened = f"{text[:keep // 2]}\n[... {cut} characters cut to fit the context window ...]\n{text[len(text) - keep // 2:]}"
+        if count_tokens(shortened) <= room:
+            return shortened
+        keep = int(keep * 0.8)
+    return ""
+
+
+def shift_context(messages, count_tokens, limit):
+    """Fit a prompt into limit tokens instead of failing when the context window is full.
+
+    Like llama.cpp's context shift, the start of the prompt (the system
+    message) stays and the oldest messages after it are dropped, a whole
+    exchange at a time. The latest request always stays; if it does not fit
+    on its own, its middle is cut out.
+    """
+    sizes = [count_tokens(message["content"]) + TURN_OVERHEAD_TOKENS for message in messages]
+    total = sum(sizes)
+    if total <= limit or not messages:
+        return messages
+    keep = 1 if messages[0]["role"] == "system" and len(messages) > 1 else 0
+    head, middle, request = messages[:keep], list(messages[keep:-1]), messages[-1]
+    middle_sizes = sizes[keep:-1]
+    while middle and (total > limit or middle[0]["role"] != "user"):
+        middle.pop(0)
+        total -= middle_sizes.pop(0)
+    if total > limit:
+        room = limit - (total - sizes[-1]) - TURN_OVERHEAD_TOKENS
+        request = {**request, "content": _cut_middle(request["content"], count_tokens, max(room, 0))}
+    return head + middle + [request]
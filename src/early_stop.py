@@ -0,0 +1,131 @@
+import re
+
+# Consecutive copies of a line (or block of lines) that count as the model looping
+REPEATS = 4
+# Longest block of lines checked for repetition
+MAX_PERIOD = 8
+# A repeated block must carry at least this many characters; "}" or "pass" repeat legitimately
+MIN_BLOCK_CHARS = 12
+
+_FENCE_RE = re.compile(r"^\s*```")
+
+
+class StopDetector:
+    """Watches a streamed reply and names a reason once decoding can stop early.
+
+    feed() receives each delta and returns None to keep going or a short
+    reason for the stop (shown to the user and recorded in telemetry).
+    Detectors only look at complete lines plus the unfinished last one.
+    finish_reason is what the reply reports once the detector stops it.
+    """
+    reason = None
+    finish_reason = "stop"
+
+    def __init__(self):
+        self.partial = ""
+
+    def feed(self, delta):
+        pieces = (self.partial + delta).split("\n")
+        self.partial = pieces.pop()
+        for line in pieces:
+            if self.line(line):
+                return self.reason
+        if self.tail(self.partial):
+            return self.reason
+        return None
+
+    def line(self, line):
+        """Called with each complete line; True to stop"""
+        return False
+
+    def tail(self, partial):
+        """Called with the unfinished last line; True to stop"""
+        return False
+
+
+class FenceClosed(StopDetector):
+    """Stops when the first fenced code block closes; anything after it is discarded by the parser anyway"""
+    reason = "code block closed"
+
+    def __init__(self):
+        super().__init__()
+        self.in_code = False
+
+    def line(self, line):
+        if _FENCE_RE.match(line):
+            if self.in_code:
+                return True
+            self.in_code = True
+        return False
+
+    def tail(self, partial):
+        # The closing fence needs no newline after it
+        return self.in_code and partial.strip() == "```"
+
+
+class RepeatedLines(StopDetector):
+    """Stops when the last lines are one block of lines repeated REPEATS times in a row"""
+    reason = "output repeating"
+    # The reply was cut off mid-answer, so it must not be applied or cached as a finished one
+    finish_reason = "repetition"
+
+    def __init__(self):
+        super().__init__()
+        self.lines = []
+
+    def line(self, line):
+        self.lines.append(line.rstrip())
+        del self.lines[:-MAX_PERIOD * REPEATS]
+        for period in range(1, MAX_PERIOD + 1):
+            span = period * REPEATS
+            if len(self.lines) < span:
+                break
+            block = self.lines[-period:]
+            if sum(len(text.strip()) for text in block) < MIN_BLOCK_CHARS:
+                continue
+            if all(self.lines[-span + offset] == block[offset % period] for offset in range(span)):
+                return True
+        return False
+
+
+# Detectors by name; requests (and the serve API) refer to them by these names
+STOP_DETECTORS = {
+    "fence": FenceClosed,
+    "repetition": RepeatedLines,
+}
+
+
+# Finish reasons of replies that ended before the model finished its answer
+INCOMPLETE = ("cancelled", RepeatedLines.finish_reason)
+
+
+def default_detectors(is_edit, edit_format):
+    """Whole-file edits end with their code block; chat replies stop if they start looping.
+
+    Edits never run the repetition check: generated code repeats lines
+    legitimately, and a looping edit fails its parse or checks anyway.
+    """
+    if is_edit:
+        return ["fence"] if edit_format != "diff" else []
+    return ["repetition"]
+
+
+def make_detectors(names):
+    return [STOP_DETECTORS[name]() for name in names or ()]
+
+
+def check(detectors, delta):
+    """The reason the first detector gives for stopping after delta, or None"""
+    for detector in detectors:
+        reason = detector.feed(delta)
+        if reason:
+            return reason
+    return None
+
+
+def finish_reason_for(stopped_by):
+    """The finish_reason of a reply a detector stopped with reason stopped_by"""
+    for detector in STOP_DETECTORS.values():
+        if detector.reason == stopped_by:
+            return detector.finish_reason
+    return "stop"
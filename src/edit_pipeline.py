@@ -0,0 +1,117 @@
+from chunked_edit import plan_chunks, splice, dedent_chunk, reindent_chunk
+from edit_protocol import parse_hunks, apply_hunks, parse_fenced_code, HunkApplyError
+from utils import extract_pure_code
+from validation import validated_edit, EDIT_CANDIDATES, EDIT_RETRIES
+
+# Added to the instruction for each chunk of a file edited chunk by chunk
+EXCERPT_NOTE = "(The code is an excerpt of a larger file. Apply only the part of the instruction that concerns this excerpt.)"
+
+
+class EditPipeline:
+    """Turns an edit instruction into checked code; the one edit path of the REPL and batch mode.
+
+    stream(instruction, edit_format, code, history, remember, use_cache)
+    returns the raw reply, or None when it failed or is incomplete;
+    report(level, message) receives progress ("info", "warning", "error"
+    or "success") and cancelled() is checked before each request. Diff
+    replies fall back to a full-file request, every edit is checked and
+    repaired (validation.validated_edit), and files over the edit budget
+    are edited chunk by chunk.
+    """
+    def __init__(self, handler, stream, validator, excerpt_validator, report=None, cancelled=None):
+        self.handler = handler
+        self.stream = stream
+        self.validator = validator
+        self.excerpt_validator = excerpt_validator
+        self.report = report or (lambda level, message: None)
+        self.cancelled = cancelled or (lambda: False)
+
+    def edit(self, instruction, code, path=None, history=None):
+        """(updated code, failed checks); code is None when no edit could be generated or it was cancelled"""
+        budget = self.handler.edit_budget()
+        if self.handler.count_tokens(code) > budget:
+            updated, failures = self.chunked_edit(instruction, code, budget, path, history)
+        else:
+            updated, failures = self.edit_code(instruction, code, path, history)
+        if updated is not None and code.endswith("\n") and not updated.endswith("\n"):
+            # extract_pure_code strips the final newline of full-file replies
+            updated += "\n"
+        return updated, failures
+
+    def edit_code(self, instruction, code, path=None, history=None, excerpt=False):
+        """Run one edit over code and check the result; returns (updated code, failed checks)"""
+        def generate(prompt, current, attempt):
+            if self.cancelled():
+                return None
+            if attempt:
+                self.report("info", f"🎲 Writing candidate {attempt + 1} of {EDIT_CANDIDATES}...")
+            # Other candidates see the history without adding to it; repair prompts stay out of it
+            return self.generate(
+                prompt, current,
+                history=history if attempt is not None else None,
+                remember=attempt == 0,
+                use_cache=not attempt,
+            )
+
+        updated, failures = validated_edit(
+            generate, instruction, code, self.excerpt_validator if excerpt else self.validator,
+            path=None if excerpt else path,
+            candidates=EDIT_CANDIDATES,
+            retries=EDIT_RETRIES,
+            report=lambda message: self.report("info", f"🧪 {message}"),
+        )
+        if self.cancelled():
+            return None, {}
+        return updated, failures
+
+    def generate(self, instruction, code, history=None, remember=True, use_cache=True):
+        """Request one edit and turn the reply into updated code, or None if it failed"""
+        edit_format = self.handler.edit_format
+        response = self.stream(instruction, edit_format, code, history, remember, use_cache)
+        if response is None:
+            return None
+
+        if edit_format == "diff":
+            try:
+                hunks = parse_hunks(response)
+                updated = apply_hunks(code, hunks)
+                self.report("success", f"Applied {len(hunks)} change(s)")
+                return updated
+            except HunkApplyError as e:
+                # Hunks could not be anchored, ask for the whole file instead
+                self.report("warning", f"⚠ {str(e)}. Falling back to full-file mode...")
+                if history is not None and remember:
+                    history.undo()
+                response = self.stream(instruction, "full", code, history, remember, use_cache)
+                if response is None:
+                    return None
+
+        # A grammar-constrained reply is exactly one fenced block; otherwise fall back to heuristics
+        pure_code = parse_fenced_code(response) or extract_pure_code(response)
+        if not pure_code:
+            self.report("error", "❌ Could not extract valid code from response")
+            return None
+        return pure_code
+
+    def chunked_edit(self, instruction, content, budget, path=None, history=None):
+        """Edit a file too large for one prompt by editing only the relevant functions/classes"""
+        plan = plan_chunks(content, instruction, self.handler.count_tokens, budget)
+        if plan is None:
+            self.report("warning", "⚠ File is larger than the context window and could not be split into functions/classes; trying a whole-file edit.")
+            return self.edit_code(instruction, content, path, history)
+
+        names = ", ".join(chunk.name or f"lines {chunk.start + 1}-{chunk.end}" for chunk in plan)
+        self.report("info", f"✂️ Large file: editing {len(plan)} chunk(s): {names}")
+
+        edits = []
+        for chunk in plan:
+            self.report("info", f"⏳ Editing {chunk.name or 'module code'} (lines {chunk.start + 1}-{chunk.end})...")
+            excerpt, indent = dedent_chunk(chunk.text)
+            new_text, failures = self.edit_code(f"{instruction}\n\n{EXCERPT_NOTE}", excerpt, excerpt=True)
+            if new_text is None or failures:
+                return None, failures
+            edits.append((chunk, reindent_chunk(new_text, indent)))
+        if history is not None:
+            # One history entry for the whole edit rather than one per chunk
+            history.add_exchange(f"Edit the loaded code: {instruction}", f"(Edited {names}.)")
+        return splice(content, edits), {}
@@ -0,0 +1,218 @@
+import difflib
+import re
+
+SEARCH_MARKER = "<<<<<<< SEARCH"
+DIVIDER = "======="
+REPLACE_MARKER = ">>>>>>> REPLACE"
+
+# Minimum similarity for a SEARCH block to be anchored fuzzily
+DEFAULT_FUZZ = 0.85
+
+EDIT_FORMAT_INSTRUCTIONS = (
+    "Reply ONLY with one or more SEARCH/REPLACE blocks in this exact format:\n"
+    f"{SEARCH_MARKER}\n"
+    "<lines copied exactly from the current code>\n"
+    f"{DIVIDER}\n"
+    "<the new lines that replace them>\n"
+    f"{REPLACE_MARKER}\n"
+    "Copy the SEARCH lines exactly, including indentation, and include just enough "
+    "lines to locate each change. Do not repeat unchanged code and do not add explanations."
+)
+
+FENCED_FILE_INSTRUCTIONS = (
+    "Reply ONLY with the complete updated Python code in a single ```python fenced block, "
+    "with nothing before or after the block."
+)
+
+
+def _body_line_rules(name, markers, depth):
+    """GBNF rules for a line that does not start with depth marker characters in a row"""
+    rules = []
+    for level in range(depth):
+        rule = f"{name}{level or ''}"
+        options = ['"\\n"', f"[^{markers}\\n] rest"]
+        if level + 1 < depth:
+            options.append(f"[{markers}] {name}{level + 1}")
+        rules.append(f"{rule} ::= " + " | ".join(options))
+    return rules
+
+
+# GBNF grammars for constrained edit replies. Body lines may contain anything
+# except a line that could close the block, so sampling can only end at the
+# closing fence / REPLACE marker and the reply parses without heuristics.
+EDIT_GRAMMARS = {
+    "full": "\n".join([
+        'root ::= "```python\\n" line* "```"',
+        *_body_line_rules("line", "`", 3),
+        'rest ::= [^\\n]* "\\n"',
+    ]),
+    "diff": "\n".join([
+        "root ::= block+",
+        f'block ::= "{SEARCH_MARKER}\\n" line* "{DIVIDER}\\n" line* "{REPLACE_MARKER}\\n"',
+        *_body_line_rules("line", "<=>", 7),
+        'rest ::= [^\\n]* "\\n"',
+    ]),
+}
+
+_FENCED_RE = re.compile(r"\A\s*```[\w+-]*\n(.*?)^```\s*\Z", re.DOTALL | re.MULTILINE)
+
+_SEARCH_REPLACE_RE = re.compile(
+    r"^<{5,9} SEARCH[^\n]*\n(.*?)^={5,9}[ \t]*\n(.*?)^>{5,9} REPLACE[^\n]*$",
+    re.DOTALL | re.MULTILINE,
+)
+
+
+class HunkApplyError(Exception):
+    """Raised when an edit hunk cannot be anchored in the current code"""
+
+
+class Hunk:
+    """A single search/replace change"""
+    def __init__(self, search, replace):
+        self.search = search
+        self.replace = replace
+
+    def __repr__(self):
+        return f"Hunk(search={self.search!r}, replace={self.replace!r})"
+
+
+def _block_lines(text):
+    """Split a hunk body into lines, dropping the trailing newline of the block"""
+    if text.endswith("\n"):
+        text = text[:-1]
+    return text.split("\n") if text else []
+
+
+def parse_hunks(text):
+    """Parse SEARCH/REPLACE blocks, or unified-diff hunks, from a model response"""
+    hunks = [
+        Hunk(_block_lines(search), _block_lines(replace))
+        for search, replace in _SEARCH_REPLACE_RE.findall(text)
+    ]
+    if hunks:
+        return hunks
+    return _parse_unified_diff(text)
+
+
+def parse_fenced_code(text):
+    """Body of a reply that is exactly one fenced code block (as the full-file grammar produces), else None"""
+    match = _FENCED_RE.match(text)
+    if match is None:
+        return None
+    # Models often leave a blank line before the closing fence
+    body = match.group(1).rstrip("\n")
+    return body + "\n" if body else ""
+
+
+def _parse_unified_diff(text):
+    """Convert unified-diff hunks into search/replace hunks"""
+    hunks = []
+    search, replace = None, None
+
+    for line in text.split("\n"):
+        if line.startswith("@@"):
+            if search is not None and (search or replace):
+                hunks.append(Hunk(search, replace))
+            search, replace = [], []
+        elif search is None or line.startswith(("---", "+++", "```")):
+            continue
+        elif line.startswith("-"):
+            search.append(line[1:])
+        elif line.startswith("+"):
+            replace.append(line[1:])
+        else:
+            # Context line; models often drop the leading space on blank lines
+            context = line[1:] if line.startswith(" ") else line
+            search.append(context)
+            replace.append(context)
+
+    if search is not None and (search or replace):
+        # Trailing blank context is usually just the end of the response
+        while search and replace and not search[-1].strip() and not replace[-1].strip():
+            search.pop()
+            replace.pop()
+        hunks.append(Hunk(search, replace))
+    return hunks
+
+
+def _leading_ws(line):
+    return line[:len(line) - len(line.lstrip())]
+
+
+def _first_nonblank(lines):
+    for line in lines:
+        if line.strip():
+            return line
+    return ""
+
+
+def _find_block(lines, block, fuzz):
+    """Locate block inside lines; returns (start, length, exact) or None"""
+    size = len(block)
+    if size > len(lines):
+        return None
+
+    # 1. Exact match, anchored on the first line
+    for i, line in enumerate(lines[:len(lines) - size + 1]):
+        if line == block[0] and lines[i:i + size] == block:
+            return i, size, True
+
+    # 2. Match ignoring indentation and trailing whitespace
+    stripped = [line.strip() for line in lines]
+    target = [line.strip() for line in block]
+    for i in range(len(lines) - size + 1):
+        if stripped[i] == target[0] and stripped[i:i + size] == target:
+            return i, size, False
+
+    # 3. Best fuzzy window of the same length
+    wanted = "\n".join(target)
+    matcher = difflib.SequenceMatcher(None, autojunk=False)
+    matcher.set_seq2(wanted)
+    best, best_ratio = None, fuzz
+    for i in range(len(lines) - size + 1):
+        matcher.set_seq1("\n".join(stripped[i:i + size]))
+        if matcher.real_quick_ratio() < best_ratio or matcher.quick_ratio() < best_ratio:
+            continue
+        ratio = matcher.ratio()
+        if ratio >= best_ratio:
+            best, best_ratio = i, ratio
+    if best is not None:
+        return best, size, False
+    return None
+
+
+def _reindent(replace, search, matched):
+    """Shift replacement lines by the indentation the model dropped from the search block"""
+    file_indent = _leading_ws(_first_nonblank(matched))
+    search_indent = _leading_ws(_first_nonblank(search))
+    if len(file_indent) <= len(search_indent) or not file_indent.endswith(search_indent):
+        return replace
+    pad = file_indent[:len(file_indent) - len(search_indent)]
+    return [pad + line if line.strip() else line for line in replace]
+
+
+def apply_hunks(content, hunks, fuzz=DEFAULT_FUZZ):
+    """Apply hunks to content in order, raising HunkApplyError if one cannot be placed"""
+    if not hunks:
+        raise HunkApplyError("No edit hunks found in response")
+
+    lines = content.split("\n")
+    for number, hunk in enumerate(hunks, 1):
+        if not hunk.search:
+            # Empty SEARCH means "append", which is what models do for new files
+            if lines and lines[-1] == "":
+                lines[-1:] = hunk.replace + [""]
+            else:
+                lines.extend(hunk.replace)
+            continue
+
+        found = _find_block(lines, hunk.search, fuzz)
+        if found is None:
+            preview = _first_nonblank(hunk.search).strip()
+            raise HunkApplyError(f"Hunk {number} did not match the current code (near '{preview}')")
+
+        start, size, exact = found
+        replace = hunk.replace if exact else _reindent(hunk.replace, hunk.search, lines[start:start + size])
+        lines[start:start + size] = replace
+
+    return "\n".join(lines)
@@ -0,0 +1,399 @@
+import bisect
+import os
+import re
+import threading
+import time
+
+# Directories that are never worth indexing, whatever .gitignore says
+ALWAYS_IGNORED = {".git", ".hg", ".svn", ".bzr", "__pycache__", "node_modules"}
+
+
+def _translate_glob(pattern):
+    """Translate a gitignore glob into a regex (without anchors)"""
+    regex = ""
+    i = 0
+    while i < len(pattern):
+        if pattern.startswith("**/", i):
+            regex += "(?:.*/)?"
+            i += 3
+            continue
+        if pattern.startswith("/**", i) and i + 3 == len(pattern):
+            regex += "/.*"
+            i += 3
+            continue
+        char = pattern[i]
+        if char == "*":
+            regex += ".*" if pattern.startswith("**", i) else "[^/]*"
+            i += 2 if pattern.startswith("**", i) else 1
+            continue
+        if char == "?":
+            regex += "[^/]"
+        elif char == "[":
+            end = pattern.find("]", i + 1)
+            if end == -1:
+                regex += re.escape(char)
+            else:
+                body = pattern[i + 1:end]
+                if body.startswith("!"):
+                    body = "^" + body[1:]
+                regex += f"[{body}]"
+                i = end
+        elif char == "\\" and i + 1 < len(pattern):
+            i += 1
+            regex += re.escape(pattern[i])
+        else:
+            regex += re.escape(char)
+        i += 1
+    return regex
+
+
+class IgnoreRule:
+    """One line of a .gitignore file"""
+    def __init__(self, pattern):
+        self.negate = pattern.startswith("!")
+        if self.negate:
+            pattern = pattern[1:]
+        self.dir_only = pattern.endswith("/")
+        pattern = pattern.rstrip("/")
+        # A slash anywhere but the end anchors the pattern to the .gitignore directory
+        self.anchored = "/" in pattern
+        self.regex = re.compile("^" + _translate_glob(pattern.lstrip("/")) + "$")
+
+    def matches(self, rel_path, name, is_dir):
+        if self.dir_only and not is_dir:
+            return False
+        return bool(self.regex.match(rel_path if self.anchored else name))
+
+
+def parse_gitignore(text):
+    """Parse the contents of a .gitignore file into rules"""
+    rules = []
+    for line in text.splitlines():
+        line = line.rstrip()
+        if not line or line.startswith("#"):
+            continue
+        rules.append(IgnoreRule(line))
+    return rules
+
+
+def fuzzy_score(query, path):
+    """Score path against query fzf-style, or return None if query is not a subsequence.
+
+    Matches in the file name, at word boundaries and in consecutive runs
+    score higher; long gaps and long paths score lower.
+    """
+    lower = path.lower()
+    name_start = lower.rstrip("/").rfind("/") + 1
+    score = 0
+    pos = 0
+    prev = -2
+    for char in query.lower():
+        found = lower.find(char, pos)
+        if found == -1:
+            return None
+        score += 16
+        if found == prev + 1:
+            score += 8
+        if found == 0 or lower[found - 1] in "/_-. ":
+            score += 10
+        elif path[found].isupper() and path[found - 1].islower():
+            score += 8
+        if found >= name_start:
+            score += 4
+        score -= min(found - pos, 8) if prev >= 0 else 0
+        prev = found
+        pos = found + 1
+    return score - len(path) // 8
+
+
+class FileIndex:
+    """In-memory index of the project tree shared by completion and `load @`.
+
+    The tree is walked once in a background thread, pruning VCS and
+    .gitignore'd directories. Directory mtimes are kept so later refreshes
+    only rescan directories whose entries changed. Lookups go through
+    sorted arrays (bisect for prefixes) and a newline-joined blob that a
+    single regex scans for fuzzy candidates.
+    """
+    def __init__(self, root=None, refresh_interval=2.0):
+        self.root = os.path.abspath(root or os.getcwd())
+        self.refresh_interval = refresh_interval
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+        self._refreshing = False
+        self._last_refresh = 0.0
+        self._dirs = {}
+        self._rules = {}
+        self._paths = []
+        self._names = []
+        self._shallow = []
+        self._blob = ""
+
+    # Building
+
+    def start(self):
+        """Build the index in a background thread"""
+        threading.Thread(target=self._build, daemon=True).start()
+        return self
+
+    def wait(self, timeout=None):
+        """Block until the first build has finished"""
+        return self._ready.wait(timeout)
+
+    @property
+    def ready(self):
+        return self._ready.is_set()
+
+    def _build(self):
+        dirs, rules = {}, {}
+        self._walk("", dirs, rules)
+        with self._lock:
+            self._dirs, self._rules = dirs, rules
+            self._rebuild_views()
+            self._last_refresh = time.monotonic()
+        self._ready.set()
+
+    def _abs(self, rel_path):
+        return os.path.join(self.root, rel_path) if rel_path else self.root
+
+    def _is_ignored(self, rel_path, name, is_dir, rules):
+        """Apply .gitignore rules from the root down to the path's directory; last match wins"""
+        if is_dir and name in ALWAYS_IGNORED:
+            return True
+        ignored = False
+        parts = rel_path.split("/")[:-1]
+        for depth in range(len(parts) + 1):
+            base = "/".join(parts[:depth])
+            for rule in rules.get(base, ((), 0))[0]:
+                local = rel_path[len(base) + 1:] if base else rel_path
+                if rule.matches(local, name, is_dir):
+                    ignored = not rule.negate
+        return ignored
+
+    def _scan_dir(self, rel_dir, rules):
+        """List one directory, returning (mtime, files, subdirs) or None if it vanished"""
+        path = self._abs(rel_dir)
+        try:
+            mtime = os.stat(path).st_mtime_ns
+            entries = list(os.scandir(path))
+        except OSError:
+            return None
+
+        gitignore = os.path.join(path, ".gitignore")
+        if any(entry.name == ".gitignore" for entry in entries):
+            try:
+                with open(gitignore, "r", encoding="utf-8", errors="ignore") as f:
+                    rules[rel_dir] = (parse_gitignore(f.read()), os.stat(gitignore).st_mtime_ns)
+            except OSError:
+                pass
+
+        files, subdirs = [], []
+        for entry in entries:
+            rel_path = f"{rel_dir}/{entry.name}" if rel_dir else entry.name
+            try:
+                is_dir = entry.is_dir(follow_symlinks=False)
+            except OSError:
+                continue
+            if self._is_ignored(rel_path, entry.name, is_dir, rules):
+                continue
+            (subdirs if is_dir else files).append(entry.name)
+        return mtime, files, subdirs
+
+    def _walk(self, rel_dir, dirs, rules):
+        stack = [rel_dir]
+        while stack:
+            current = stack.pop()
+            scanned = self._scan_dir(current, rules)
+            if scanned is None:
+                continue
+            dirs[current] = scanned
+            stack.extend(f"{current}/{name}" if current else name for name in scanned[2])
+
+    def _rebuild_views(self):
+        """Recompute the sorted lookup structures from the directory table"""
+        paths = []
+        for rel_dir, (_, files, subdirs) in self._dirs.items():
+            prefix = f"{rel_dir}/" if rel_dir else ""
+            paths.extend(prefix + name for name in files)
+            paths.extend(prefix + name + "/" for name in subdirs)
+        paths.sort()
+        self._paths = paths
+        self._names = sorted((os.path.basename(path.rstrip("/")), path) for path in paths)
+        self._shallow = sorted(paths, key=lambda p: (p.rstrip("/").count("/"), p))
+        self._blob = "\n".join(paths)
+
+    # Freshness
+
+    def mark_stale(self):
+        """Force the next lookup to check for changes, e.g. after creating a file"""
+        self._last_refresh = 0.0
+
+    def _maybe_refresh(self):
+        if not self.ready or self._refreshing:
+            return
+        if time.monotonic() - self._last_refresh < self.refresh_interval:
+            return
+        self._refreshing = True
+        threading.Thread(target=self.refresh, daemon=True).start()
+
+    def refresh(self):
+        """Rescan directories whose mtime changed since they were indexed"""
+        try:
+            with self._lock:
+                dirs = dict(self._dirs)
+                rules = dict(self._rules)
+
+            # A modified .gitignore can change anything below it; rebuild from scratch
+            for base, (_, mtime) in rules.items():
+                try:
+                    changed = os.stat(os.path.join(self._abs(base), ".gitignore")).st_mtime_ns != mtime
+                except OSError:
+                    changed = True
+                if changed:
+                    self._build()
+                    return
+
+            changed = False
+            for rel_dir, (mtime, _, old_subdirs) in list(dirs.items()):
+                if rel_dir not in dirs:
+                    continue
+                try:
+                    if os.stat(self._abs(rel_dir)).st_mtime_ns == mtime:
+                        continue
+                except OSError:
+                    pass
+                changed = True
+                scanned = self._scan_dir(rel_dir, rules)
+                prefix = f"{rel_dir}/" if rel_dir else ""
+                new_subdirs = scanned[2] if scanned else []
+                for name in set(old_subdirs) - set(new_subdirs):
+                    gone = prefix + name
+                    for key in [key for key in dirs if key == gone or key.startswith(gone + "/")]:
+                        del dirs[key]
+                if scanned is None:
+                    dirs.pop(rel_dir, None)
+                    continue
+                dirs[rel_dir] = scanned
+                for name in set(new_subdirs) - set(old_subdirs):
+                    self._walk(prefix + name, dirs, rules)
+
+            with self._lock:
+                if changed:
+                    self._dirs, self._rules = dirs, rules
+                    self._rebuild_views()
+                self._last_refresh = time.monotonic()
+        finally:
+            self._refreshing = False
+
+    # Lookups
+
+    def files(self):
+        """Every indexed file as a root-relative, '/'-separated path"""
+        with self._lock:
+            paths = self._paths
+        return [path for path in paths if not path.endswith("/")]
+
+    def _display(self, path):
+        return path.replace("/", os.sep) if os.sep != "/" else path
+
+    def files_with_prefix(self, prefix):
+        """Files whose name (or relative path) starts with prefix, shallowest first"""
+        self._maybe_refresh()
+        with self._lock:
+            names, paths = self._names, self._paths
+        matches = set()
+        start = bisect.bisect_left(names, (prefix,))
+        for name, path in names[start:]:
+            if not name.startswith(prefix):
+                break
+            matches.add(path)
+        key = prefix.replace(os.sep, "/")
+        start = bisect.bisect_left(paths, key)
+        for path in paths[start:]:
+            if not path.startswith(key):
+                break
+            matches.add(path)
+        ranked = sorted((path for path in matches if not path.endswith("/")), key=lambda p: (p.count("/"), p))
+        return [self._display(path) for path in ranked]
+
+    def search(self, query, limit=100, include_dirs=True):
+        """Rank paths for query: prefix, then substring, then fuzzy matches by score"""
+        self._maybe_refresh()
+        with self._lock:
+            names, paths, shallow, blob = self._names, self._paths, self._shallow, self._blob
+
+        def keep(path):
+            return include_dirs or not path.endswith("/")
+
+        if not query:
+            ranked = []
+            for path in shallow:
+                if keep(path):
+                    ranked.append(self._display(path))
+                    if len(ranked) >= limit:
+                        break
+            return ranked
+
+        results = []
+        seen = set()
+        start = bisect.bisect_left(names, (query,))
+        prefix_hits = []
+        for name, path in names[start:]:
+            if not name.startswith(query):
+                break
+            if keep(path):
+                prefix_hits.append(path)
+        key = query.replace(os.sep, "/")
+        start = bisect.bisect_left(paths, key)
+        for path in paths[start:]:
+            if not path.startswith(key):
+                break
+            if keep(path):
+                prefix_hits.append(path)
+        for path in sorted(prefix_hits, key=lambda p: (p.rstrip("/").count("/"), p)):
+            if path not in seen:
+                seen.add(path)
+                results.append(path)
+        if len(results) >= limit:
+            return [self._display(path) for path in results[:limit]]
+
+        # Substring pass: plain find() over the blob, shallowest hits first
+        substring_hits = []
+        pos = blob.find(key)
+        while pos != -1 and len(substring_hits) < limit * 4:
+            line_start = blob.rfind("\n", 0, pos) + 1
+            line_end = blob.find("\n", pos)
+            if line_end == -1:
+                line_end = len(blob)
+            path = blob[line_start:line_end]
+            if path not in seen and keep(path):
+                substring_hits.append(path)
+            pos = blob.find(key, line_end + 1)
+        for path in sorted(substring_hits, key=lambda p: (p.rstrip("/").count("/"), p)):
+            seen.add(path)
+            results.append(path)
+        if len(results) >= limit:
+            return [self._display(path) for path in results[:limit]]
+
+        # Fuzzy pass: a lazy regex walks the blob at C speed, one candidate line at a time
+        pattern = re.compile("[^\n]*?".join(re.escape(char) for char in key), re.IGNORECASE)
+        scored = []
+        pos = 0
+        while len(scored) < limit * 20:
+            match = pattern.search(blob, pos)
+            if match is None:
+                break
+            line_start = blob.rfind("\n", 0, match.start()) + 1
+            line_end = blob.find("\n", match.end())
+            if line_end == -1:
+                line_end = len(blob)
+            pos = line_end + 1
+            path = blob[line_start:line_end]
+            if path in seen or not keep(path):
+                continue
+            score = fuzzy_score(key, path)
+            if score is not None:
+                scored.append((-score, path))
+        scored.sort()
+        results.extend(path for _, path in scored[:limit - len(results)])
+        return [self._display(path) for path in results]
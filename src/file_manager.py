@@ -2,50 +2,30 @@ import os
 from prompt_toolkit.completion import Completer, Completion
 from rich.console import Console
 from rich.prompt import Confirm
+from file_index import FileIndex
+from retrieval import RetrievalIndex
+from file_view import FileView, HighlightCache
+from versions import VersionHistory
 
 console = Console()
 
 class FileCompleter(Completer):
     """Custom completer that suggests files with @ prefix and handles nested directories"""
+    def __init__(self, file_index=None):
+        self.file_index = file_index or FileIndex().start()
+    
     def get_completions(self, document, complete_event):
         text = document.text_before_cursor
         
         # Check if we're in a load command with @
         if text.startswith('load @'):
             prefix = text[6:]  # Get text after 'load @'
-            current_dir = os.getcwd()
             
-            # Find all files and directories recursively
-            all_files = []
-            all_dirs = []
+            # Served from the shared index; nothing to offer until the first build is done
+            if not self.file_index.ready:
+                return
             
-            # Walk through all directories recursively
-            for root, dirs, files in os.walk(current_dir):
-                # Get relative path from current directory
-                rel_root = os.path.relpath(root, current_dir)
-                
-                # Add files that match the prefix
-                for file in files:
-                    if file.startswith(prefix):
-                        if rel_root == '.':
-                            file_path = file
-                        else:
-                            file_path = os.path.join(rel_root, file)
-                        all_files.append(file_path)
-                
-                # Add directories that match the prefix (for navigation)
-                for dir_name in dirs:
-                    if dir_name.startswith(prefix):
-                        if rel_root == '.':
-                            dir_path = dir_name + os.sep
-                        else:
-                            dir_path = os.path.join(rel_root, dir_name) + os.sep
-                        all_dirs.append(dir_path)
-            
-            # Combine and sort files and directories
-            all_items = sorted(all_dirs + all_files)
-            
-            for item in all_items:
+            for item in self.file_index.search(prefix):
                 yield Completion(item, start_position=-len(prefix))
         
         # Also provide regular path completion without @
@@ -75,26 +55,194 @@ class FileCompleter(Completer):
 class FileManager:
     def __init__(self):
         self.current_file = None
-        self.file_content = None
-        self.completer = FileCompleter()
+        self._file_content = None
+        # (path, content, mtime, size) of the last text known to match the file on disk
+        self._on_disk = None
+        self._view = None
+        # Unsaved text of files other than the current one, by absolute path (e.g. an edit
+        # job that finished after another file was loaded); restored when the file is loaded
+        self.buffers = {}
+        # Edit history of each edited file, by absolute path, for undo/redo
+        self.versions = {}
+        self.highlight_cache = HighlightCache()
+        self.file_index = FileIndex().start()
+        self.completer = FileCompleter(self.file_index)
+        # Lexical index of file contents used to ground chat answers (RETRIEVAL=0 disables it)
+        self.retrieval = None
+        if os.getenv("RETRIEVAL", "1").lower() not in ("0", "false", "no"):
+            self.retrieval = RetrievalIndex(self.file_index).start()
     
     def get_completer(self):
         return self.completer
     
+    @property
+    def file_content(self):
+        return self._file_content
+    
+    @file_content.setter
+    def file_content(self, content):
+        if content is not self._file_content:
+            self._file_content = content
+            self._close_view()
+    
+    def _close_view(self):
+        if self._view is not None:
+            self._view.close()
+            self._view = None
+    
+    def _remember_disk_state(self, path, content):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            self._on_disk = None
+            return
+        self._on_disk = (os.path.abspath(path), content, stat.st_mtime_ns, stat.st_size)
+    
+    def _is_current(self, path):
+        return bool(path and self.current_file) and os.path.abspath(path) == os.path.abspath(self.current_file)
+    
+    @property
+    def saved(self):
+        """Whether the current content is what was last loaded from or saved to disk"""
+        return bool(self._on_disk and self._is_current(self._on_disk[0]) and self._on_disk[1] == self._file_content)
+    
+    def content_of(self, path):
+        """The latest text of path: the current content, its unsaved buffer, or the file on disk"""
+        if self._is_current(path):
+            return self._file_content
+        buffered = self.buffers.get(os.path.abspath(path))
+        if buffered is not None:
+            return buffered
+        with open(path, "r", encoding="utf-8") as f:
+            return f.read()
+    
+    def attach(self, path, content, label=None):
+        """Give path new content: the current content if it is loaded (returns True), otherwise its buffer.
+        
+        With a label (e.g. the edit instruction) the change is also recorded in the file's history.
+        """
+        if label is not None:
+            self.record_version(path, self.content_of(path), content, label)
+        if self._is_current(path):
+            self.file_content = content
+            return True
+        self.buffers[os.path.abspath(path)] = content
+        return False
+    
+    def record_version(self, path, before, after, label):
+        """Add after to the history of path; before is what the change was made to"""
+        key = os.path.abspath(path)
+        history = self.versions.get(key)
+        if history is None:
+            history = self.versions[key] = VersionHistory(before)
+        elif before != history.text:
+            # Changed since the last recorded version (e.g. reloaded after an outside change)
+            history.commit(before, "changed outside edits")
+        return history.commit(after, label)
+    
+    def history(self):
+        """Edit history of the current file, or None if it has not been edited"""
+        return self.versions.get(os.path.abspath(self.current_file)) if self.current_file else None
+    
+    def undo(self):
+        return self._step(back=True)
+    
+    def redo(self):
+        return self._step(back=False)
+    
+    def _step(self, back):
+        history = self.history()
+        if history is not None and history.text != self._file_content:
+            # Not where the history left off (e.g. reloaded after an outside change); undo goes back to it first
+            history.commit(self._file_content, "changed outside edits")
+        text = None if history is None else (history.undo() if back else history.redo())
+        if text is None:
+            console.print(f"[yellow]⚠ Nothing to {'undo' if back else 'redo'}.[/yellow]")
+            return False
+        label = history.version(history.current + 1 if back else history.current).label
+        self.file_content = text
+        action = "↩️ Undid" if back else "↪️ Redid"
+        console.print(f"[green]{action} '{label}' (now at version {history.current}; 'save' writes it).[/green]")
+        return True
+    
+    def stash(self, next_path):
+        """Keep the current file's unsaved changes in its buffer before next_path replaces it"""
+        if self._is_current(next_path):
+            return
+        if self.current_file and self._file_content is not None and not self.saved:
+            self.buffers[os.path.abspath(self.current_file)] = self._file_content
+    
+    def session_state(self):
+        """The loaded file and every unsaved buffer, for session snapshots"""
+        return {
+            "current_file": self.current_file,
+            # Unchanged text is read back from disk on resume
+            "content": None if self.saved else self._file_content,
+            "buffers": dict(self.buffers),
+        }
+    
+    def restore_session(self, state):
+        """Reload the file and unsaved buffers of a snapshot; returns the restored file, or None"""
+        self.buffers.update(state.get("buffers") or {})
+        path = state.get("current_file")
+        if not path:
+            return None
+        if state.get("content") is None:
+            new_file, new_content = self.load_file(path)
+            if new_file:
+                self.current_file, self.file_content = new_file, new_content
+            return new_file
+        self.stash(path)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                self._remember_disk_state(path, f.read())
+        except OSError:
+            self._on_disk = None  # Never saved (or deleted since); 'save' writes it
+        self.buffers.pop(os.path.abspath(path), None)
+        self.current_file = path
+        self.file_content = state["content"]
+        console.print(f"[green]✅ File '{path}' restored with its unsaved changes.[/green]")
+        return path
+    
+    def view(self):
+        """Line-indexed view of the current content, for paging through it.
+        
+        While the content is what was loaded or saved (and the file has not
+        changed since), the file itself is memory-mapped; after an edit the
+        in-memory text is indexed instead.
+        """
+        if self._file_content is None:
+            return None
+        if self._view is None:
+            self._view = self._file_view() or FileView.from_text(self._file_content)
+        return self._view
+    
+    def _file_view(self):
+        """A memory-mapped view of the current file if the content is still what is on disk, else None"""
+        if not (self._on_disk and self.current_file and self._on_disk[1] is self._file_content):
+            return None
+        path, _, mtime, size = self._on_disk
+        try:
+            stat = os.stat(path)
+            if path == os.path.abspath(self.current_file) and (stat.st_mtime_ns, stat.st_size) == (mtime, size):
+                return FileView.from_file(path)
+        except OSError:
+            pass
+        return None
+    
     def load_file(self, load_arg):
         """Process load command with @ prefix support and auto-create if file doesn't exist"""
         if load_arg.startswith('@'):
             # Remove @ prefix and use as filter
             prefix = load_arg[1:]
-            current_dir = os.getcwd()
             
-            # Find files starting with prefix (recursively)
-            matching_files = []
-            for root, dirs, files in os.walk(current_dir):
-                for file in files:
-                    if file.startswith(prefix):
-                        rel_path = os.path.relpath(os.path.join(root, file), current_dir)
-                        matching_files.append(rel_path)
+            # Find files starting with prefix (recursively), falling back to fuzzy matches
+            if not self.file_index.ready:
+                console.print("[cyan]⏳ Indexing project files...[/cyan]")
+                self.file_index.wait()
+            matching_files = self.file_index.files_with_prefix(prefix)
+            if not matching_files and prefix:
+                matching_files = self.file_index.search(prefix, limit=20, include_dirs=False)
             
             if not matching_files:
                 console.print(f"[yellow]⚠ No files found starting with '{prefix}'[/yellow]")
@@ -140,6 +288,8 @@ class FileManager:
                         f.write("# New file created by AI Code Assistant\n\n")
                     
                     console.print(f"[green]✅ Created new file: '{path}'[/green]")
+                    self.file_index.mark_stale()
+                    self.stash(path)
                     return path, "# New file created by AI Code Assistant\n\n"
                 except Exception as e:
                     console.print(f"[red]❌ Error creating file: {str(e)}[/red]")
@@ -164,7 +314,14 @@ class FileManager:
         try:
             with open(path, "r", encoding="utf-8") as f:
                 content = f.read()
+            # Unsaved changes (e.g. from a finished edit job) stay with their file
+            self.stash(path)
+            self._remember_disk_state(path, content)
             console.print(f"[green]✅ File '{path}' loaded.[/green]")
+            buffered = None if self._is_current(path) else self.buffers.pop(os.path.abspath(path), None)
+            if buffered is not None and buffered != content:
+                console.print("[cyan]📝 Restored unsaved changes (e.g. from an edit job); 'save' writes them.[/cyan]")
+                content = buffered
             console.print(f"[cyan]📄 File size: {len(content)} characters[/cyan]")
             return path, content
         except Exception as e:
@@ -186,6 +343,15 @@ class FileManager:
             
             with open(self.current_file, "w", encoding="utf-8") as f:
                 f.write(content)
+            self._remember_disk_state(self.current_file, content)
+            self.buffers.pop(os.path.abspath(self.current_file), None)
+            if content is not self._file_content:
+                self.file_content = content
+            else:
+                # The same text now also lives on disk; the next view can map the file
+                self._close_view()
+            if self.retrieval:
+                self.retrieval.mark_stale()
             console.print(f"[bold green]💾 Changes saved to '{self.current_file}'.[/bold green]")
             return True
         except Exception as e:
@@ -198,6 +364,7 @@ class FileManager:
             console.print(f"[yellow]🗑️ Cleared file: {self.current_file}[/yellow]")
             self.current_file = None
             self.file_content = None
+            self._on_disk = None
         else:
             console.print("[yellow]⚠ No file loaded.[/yellow]")
     
@@ -214,6 +381,7 @@ class FileManager:
                 f.write(initial_content)
             
             console.print(f"[green]✅ Created new file: '{file_path}'[/green]")
+            self.file_index.mark_stale()
             return file_path, initial_content
         except Exception as e:
             console.print(f"[red]❌ Error creating file: {str(e)}[/red]")
@@ -0,0 +1,165 @@
+import array
+import hashlib
+import mmap
+import re
+from collections import OrderedDict
+from rich.text import Text
+
+# Highlighted windows kept in memory, least recently used first out
+HIGHLIGHT_CACHE_ENTRIES = 64
+# How far above a window to look for a top-level line where the lexer state is clean
+CONTEXT_LINES = 200
+
+_RANGE_RE = re.compile(r"^\d+\s*(-\s*\d*)?$")
+
+
+class LineIndex:
+    """Offsets of line starts in a buffer, so any line range can be sliced without splitting the text.
+
+    The buffer is either a str or a bytes-like object (an mmap of the file);
+    both support find() and slicing, and the offsets are in their own units.
+    A trailing newline does not start an extra, empty line.
+    """
+    def __init__(self, buffer):
+        self.buffer = buffer
+        self.length = len(buffer)
+        newline = "\n" if isinstance(buffer, str) else b"\n"
+        offsets = array.array("Q", [0] if self.length else [])
+        position = buffer.find(newline)
+        while position != -1 and position + 1 < self.length:
+            offsets.append(position + 1)
+            position = buffer.find(newline, position + 1)
+        self.offsets = offsets
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def slice(self, start, end):
+        """Lines start..end (0-based, end exclusive) as one chunk of the buffer, without the final newline"""
+        start, end = max(start, 0), min(end, len(self))
+        if start >= end:
+            return self.buffer[:0]
+        if end < len(self):
+            return self.buffer[self.offsets[start]:self.offsets[end] - 1]
+        chunk = self.buffer[self.offsets[start]:]
+        newline = "\n" if isinstance(chunk, str) else b"\n"
+        return chunk[:-1] if chunk.endswith(newline) else chunk
+
+
+class FileView:
+    """Random access to the lines of a file (memory-mapped) or of in-memory text"""
+    def __init__(self, buffer, handle=None):
+        self._handle = handle
+        self.index = LineIndex(buffer)
+
+    @classmethod
+    def from_file(cls, path):
+        handle = open(path, "rb")
+        try:
+            mapped = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # Empty files cannot be mapped
+            handle.close()
+            return cls("")
+        return cls(mapped, handle)
+
+    @classmethod
+    def from_text(cls, text):
+        return cls(text)
+
+    @property
+    def line_count(self):
+        return len(self.index)
+
+    def lines(self, start, end):
+        chunk = self.index.slice(start, end)
+        return chunk if isinstance(chunk, str) else chunk.decode("utf-8", errors="replace")
+
+    def close(self):
+        if self._handle is not None:
+            self.index.buffer.close()
+            self._handle.close()
+            self._handle = None
+
+
+class HighlightCache:
+    """Highlighted lines keyed by a hash of the highlighted text, lexer and theme.
+
+    Windows are highlighted from a clean lexer state (see render_window), so
+    a window's result depends only on its own text: after a small edit,
+    only the windows that contain it are highlighted again.
+    """
+    def __init__(self, max_entries=HIGHLIGHT_CACHE_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def highlight(self, code, lexer, theme="monokai"):
+        """One Text per line of code"""
+        key = hashlib.sha1(f"{lexer}\0{theme}\0{code}".encode("utf-8")).digest()
+        lines = self._entries.get(key)
+        if lines is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return lines
+        self.misses += 1
+        from rich.syntax import Syntax
+        highlighted = Syntax("", lexer, theme=theme).highlight(code).split("\n", allow_blank=True)
+        lines = highlighted[:code.count("\n") + 1]
+        self._entries[key] = lines
+        if len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return lines
+
+
+def _context_start(view, start):
+    """The nearest line at or above start that begins at column 0, where highlighting can begin"""
+    first = max(start - CONTEXT_LINES, 0)
+    lines = view.lines(first, start + 1).split("\n")
+    for offset in range(len(lines) - 1, -1, -1):
+        line = lines[offset]
+        if line and not line[0].isspace():
+            return first + offset
+    return start
+
+
+def render_window(view, start, end, lexer, cache, theme="monokai"):
+    """Line-numbered, highlighted Text for lines start..end (0-based, end exclusive)"""
+    end = min(end, view.line_count)
+    if start >= end:
+        return Text("")
+    context = _context_start(view, start)
+    highlighted = cache.highlight(view.lines(context, end), lexer, theme)
+    width = len(str(end))
+    numbered = []
+    for offset, line in enumerate(highlighted[start - context:end - context]):
+        text = Text(f"{start + offset + 1:>{width}} ", style="dim")
+        text.append_text(line)
+        numbered.append(text)
+    return Text("\n").join(numbered)
+
+
+def is_range(arg):
+    """Whether arg is a `show` argument ("N", "N-" or "N-M") rather than the rest of a sentence"""
+    return bool(_RANGE_RE.match(arg.strip()))
+
+
+def parse_range(arg, line_count, page):
+    """(start, end) 0-based for `show` arguments: "" (first page), "N" (a page from N) or "N-M" """
+    arg = arg.strip()
+    if not arg:
+        return 0, min(page, line_count)
+    first, _, last = arg.partition("-")
+    start = max(int(first) - 1, 0)
+    end = int(last) if last.strip() else start + page
+    if end <= start:
+        raise ValueError(f"Invalid line range: {arg}")
+    return start, min(end, line_count)
+
+
+def lexer_for(path):
+    from rich.syntax import Syntax
+    name = Syntax.guess_lexer(path) if path else "python"
+    # Unknown extensions fall back to the lexer the viewer always used
+    return name if name != "default" else "python"
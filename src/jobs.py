@@ -0,0 +1,149 @@
+import itertools
+import queue
+import threading
+import time
+
+# Finished jobs kept for `jobs`
+HISTORY_SIZE = 20
+
+
+class Job:
+    """One queued inference request (an edit or a chat question)"""
+    def __init__(self, job_id, kind, description, run, path=None):
+        self.id = job_id
+        self.kind = kind
+        self.description = description
+        self.path = path
+        self.run = run
+        self.status = "queued"
+        self.cancelled = threading.Event()
+        self.tokens = 0
+        self.result = None
+        self.error = None
+        self.queued_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+
+    @property
+    def done(self):
+        return self.status in ("done", "failed", "cancelled")
+
+    @property
+    def elapsed(self):
+        if self.started_at is None:
+            return 0.0
+        return (self.finished_at or time.time()) - self.started_at
+
+    def label(self):
+        target = f" {self.path}" if self.path else ""
+        return f"#{self.id} {self.kind}{target}"
+
+
+class JobQueue:
+    """FIFO of inference jobs, run one at a time on a dedicated worker thread.
+
+    The model can only serve one request at a time, so jobs run in the order
+    they were submitted while the REPL keeps taking commands. run(job) does
+    the work and may watch job.cancelled; on_finish(job) is called on the
+    worker thread once a job has run (whether it succeeded, failed or was
+    cancelled while running).
+    """
+    def __init__(self, on_finish=None):
+        self.on_finish = on_finish or (lambda job: None)
+        self.current = None
+        self.history = []
+        self._pending = []
+        self._queue = queue.Queue()
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._work, name="juno-inference", daemon=True)
+        self._thread.start()
+
+    def submit(self, kind, description, run, path=None):
+        job = Job(next(self._ids), kind, description, run, path)
+        with self._lock:
+            self._pending.append(job)
+        self._queue.put(job)
+        return job
+
+    def cancel(self, job_id=None):
+        """Cancel a queued or running job (default: the running one); returns the job, or None"""
+        with self._lock:
+            if job_id is None:
+                job = self.current
+            else:
+                job = next((job for job in [self.current] + self._pending if job and job.id == job_id), None)
+            if job is None or job.done:
+                return None
+            job.cancelled.set()
+            if job in self._pending:
+                # Never started; the worker skips it
+                self._pending.remove(job)
+                self._finish(job, "cancelled")
+        return job
+
+    def cancel_all(self):
+        with self._lock:
+            jobs = ([self.current] if self.current else []) + self._pending
+        return [job for job in jobs if self.cancel(job.id)]
+
+    def jobs(self):
+        """Recent finished jobs, the running one and the queued ones, oldest first"""
+        with self._lock:
+            return self.history + ([self.current] if self.current else []) + list(self._pending)
+
+    @property
+    def busy(self):
+        return self.current is not None or bool(self._pending)
+
+    def status(self):
+        """One-line summary for the toolbar, or None when idle"""
+        with self._lock:
+            current, waiting = self.current, len(self._pending)
+        if current is None and not waiting:
+            return None
+        parts = []
+        if current is not None:
+            parts.append(f"⚙ {current.label()}: {current.tokens} tokens, {current.elapsed:.0f}s")
+        if waiting:
+            parts.append(f"{waiting} queued")
+        return " · ".join(parts)
+
+    def wait(self, timeout=None):
+        """Block until every submitted job has finished; False on timeout"""
+        deadline = None if timeout is None else time.time() + timeout
+        while self.busy:
+            if deadline is not None and time.time() > deadline:
+                return False
+            time.sleep(0.01)
+        return True
+
+    def _finish(self, job, status):
+        job.status = status
+        job.finished_at = time.time()
+        self.history.append(job)
+        del self.history[:-HISTORY_SIZE]
+
+    def _work(self):
+        while True:
+            job = self._queue.get()
+            with self._lock:
+                if job not in self._pending:
+                    continue
+                self._pending.remove(job)
+                self.current = job
+                job.status = "running"
+                job.started_at = time.time()
+            try:
+                job.result = job.run(job)
+                status = "cancelled" if job.cancelled.is_set() else "done"
+            except Exception as e:
+                job.error = e
+                status = "failed"
+            job.status = status
+            try:
+                self.on_finish(job)
+            finally:
+                with self._lock:
+                    self._finish(job, status)
+                    self.current = None
@@ -1,39 +1,166 @@
 from rich.console import Console
 from rich.panel import Panel
-from rich.syntax import Syntax
-from rich.live import Live
 from prompt_toolkit import PromptSession
-from ai_handler import AIHandler
+from ai_handler import ModelLoader, ModelNotFoundError, show_model_help
 from file_manager import FileManager
-from utils import show_banner, show_help, extract_pure_code
-import re
+from utils import show_banner, show_help
+from stream_render import StreamingCodePanel, StreamingTextPanel, REFRESH_PER_SECOND, print_settled
+from early_stop import INCOMPLETE
+from edit_pipeline import EditPipeline
+from retrieval import format_context
+from file_view import render_window, parse_range, is_range, lexer_for
+from validation import Validator
+from jobs import JobQueue
+from prefill import Prefiller
+from session import session_dir, save_session, load_session, save_kv, load_kv, SESSION_AUTOSAVE
+from memory_budget import resident_bytes, format_bytes
+import os
+import sys
+import threading
 import time
 
 console = Console()
 
+# Most prompt tokens spent on retrieved project snippets per chat question
+RETRIEVAL_TOKENS = int(os.getenv("RETRIEVAL_TOKENS", 1024))
+# Console style of each progress level reported by the edit pipeline
+REPORT_STYLES = {"info": "cyan", "warning": "yellow", "error": "red", "success": "green"}
+
+
+# The arguments each command named like an ordinary word takes
+COMMAND_ARGUMENTS = {
+    "cache": lambda arg: arg in ("on", "off", "clear"),
+    "memory": lambda arg: arg == "clear",
+    "diff": str.isdigit,
+    "cancel": lambda arg: arg == "all" or arg.lstrip("#").isdigit(),
+    "show": is_range,
+}
+
+
+def is_command(user_input, name):
+    """Whether user_input is `name` on its own, or `name ARG` with an argument COMMAND_ARGUMENTS[name] takes.
+
+    Anything else that merely starts with the command's name ("show me an
+    example") is a chat question.
+    """
+    if user_input == name:
+        return True
+    return user_input.startswith(name + " ") and COMMAND_ARGUMENTS[name](user_input[len(name) + 1:].strip())
+
+
+def load_handler():
+    """Attach to a running `juno serve` if there is one, otherwise load the model here"""
+    # Imported on the loader thread so http.client stays off the startup path
+    from server import attach_or_load
+    return attach_or_load()
+
+
 class AICodeAssistant:
-    def __init__(self):
-        self.ai_handler = AIHandler()
+    def __init__(self, model_loader=None):
+        # The model loads in the background; file commands work right away
+        self.model_loader = model_loader or ModelLoader(factory=load_handler).start()
         self.file_manager = FileManager()
-        self.session = PromptSession(completer=self.file_manager.get_completer())
+        # Edits and chat run one at a time on the inference thread while the prompt stays usable
+        self.jobs = JobQueue(on_finish=self.on_job_finished)
+        # The REPL's event loop while it runs; finished jobs are handed to it
+        self.loop = None
+        # The next edit's prompt (system prompt and loaded file) is evaluated while the instruction is typed
+        self.prefiller = Prefiller(self.run_prefill)
+        self.session_dir = session_dir()
+        self.use_cache = True
+        self._conversation = None
+        # Syntax plus the EDIT_CHECKS commands for whole files; excerpts of a large file only get the syntax check
+        self.validator = Validator.from_env()
+        self.excerpt_validator = Validator()
+        self.session = PromptSession(
+            completer=self.file_manager.get_completer(),
+            bottom_toolbar=self.toolbar,
+            refresh_interval=0.5
+        )
+    
+    @property
+    def ai_handler(self):
+        return self.model_loader.handler
+    
+    @property
+    def conversation(self):
+        """History shared by chat and edit turns, created once the model's tokenizer is available"""
+        if self._conversation is None:
+            self._conversation = self.ai_handler.new_conversation()
+        return self._conversation
+    
+    def toolbar(self):
+        """Model status and memory, plus the running job and queue length (or the prefilled file)"""
+        parts = [self.model_loader.status(), self.memory_status(), self.jobs.status() or self.prefiller.status()]
+        return " │ ".join(part for part in parts if part)
+    
+    def memory_status(self):
+        """Resident memory of the process, against MEMORY_BUDGET_MB when the low-memory mode is on"""
+        resident = resident_bytes()
+        text = f"RSS {format_bytes(resident)}" if resident else "RSS n/a"
+        plan = getattr(self.ai_handler, "memory_plan", None) if self.model_loader.ready else None
+        return f"{text} / {format_bytes(plan['budget'])}" if plan else text
+    
+    def require_model(self):
+        """Wait for the background model load, returning False if it failed"""
+        if not self.model_loader.ready:
+            with console.status("[cyan]⏳ Loading model...[/cyan]"):
+                try:
+                    self.model_loader.wait()
+                except Exception:
+                    pass  # Reported below
+        if self.model_loader.error is None:
+            return True
+        
+        error = self.model_loader.error
+        if isinstance(error, ModelNotFoundError):
+            show_model_help(error.model_path)
+        else:
+            console.print(f"[red]❌ {str(error)}[/red]")
+        return False
         
     def run(self):
+        import asyncio
+        
         show_banner()
         show_help()
+        saved = load_session(self.session_dir)
+        if saved:
+            when = time.strftime("%Y-%m-%d %H:%M", time.localtime(saved["saved_at"]))
+            console.print(f"[cyan]💾 Session from {when} saved for this project; 'resume' restores it.[/cyan]")
+        try:
+            asyncio.run(self.run_async())
+        finally:
+            # Jobs that finish from here on are reported on their own thread
+            self.loop = None
+            if SESSION_AUTOSAVE:
+                self.autosave()
+    
+    async def run_async(self):
+        """Read commands while jobs run; output from jobs is printed above the prompt"""
+        import asyncio
+        from prompt_toolkit.patch_stdout import patch_stdout
         
-        while True:
-            try:
-                user_input = self.session.prompt("You: ").strip()
-                if not user_input:
-                    continue
+        self.loop = asyncio.get_running_loop()
+        with patch_stdout(raw=True):
+            while True:
+                try:
+                    user_input = (await self.session.prompt_async("You: ")).strip()
+                    if not user_input:
+                        continue
                     
-                self.process_command(user_input)
-                
-            except KeyboardInterrupt:
-                console.print("\n[red]Exiting...[/red]")
-                break
-            except Exception as e:
-                console.print(f"[red]Error: {str(e)}[/red]")
+                    self.process_command(user_input)
+                    
+                except KeyboardInterrupt:
+                    # Ctrl-C stops the running job first, and exits only when nothing is running
+                    job = self.jobs.cancel()
+                    if job is not None:
+                        console.print(f"[yellow]⏹ Cancelling {job.label()}...[/yellow]")
+                        continue
+                    console.print("\n[red]Exiting...[/red]")
+                    break
+                except Exception as e:
+                    console.print(f"[red]Error: {str(e)}[/red]")
     
     def process_command(self, user_input):
         # Exit
@@ -48,6 +175,45 @@ class AICodeAssistant:
         # Clear current file
         elif user_input.lower() == "clear":
             self.file_manager.clear_file()
+            self.prefiller.invalidate()
+        
+        # Response cache controls
+        elif is_command(user_input, "cache"):
+            self.cache_command(user_input[6:].strip())
+        
+        # Conversation history
+        elif is_command(user_input, "memory"):
+            self.memory_command(user_input[7:].strip())
+        
+        # Session latency statistics
+        elif user_input == "stats":
+            self.stats_command()
+        
+        # Edit history of the loaded file
+        elif user_input in ("undo", "redo"):
+            if self.file_manager.file_content is None:
+                console.print("[yellow]⚠ No file loaded.[/yellow]")
+            elif self.file_manager.undo() if user_input == "undo" else self.file_manager.redo():
+                self.refresh_prefill()
+        elif user_input == "history":
+            self.history_command()
+        elif is_command(user_input, "diff"):
+            self.diff_command(user_input[5:].strip())
+        
+        # Session snapshots
+        elif user_input == "snapshot":
+            # The buffers are read here, on the REPL thread; the job writes them with the model state
+            state = self.session_state()
+            job = self.jobs.submit("snapshot", "save the session", lambda job: self.save_snapshot(state))
+            self.report_queued(job, "💾 Saving the session")
+        elif user_input == "resume":
+            self.resume_command()
+        
+        # Inference job queue
+        elif user_input == "jobs":
+            self.jobs_command()
+        elif is_command(user_input, "cancel"):
+            self.cancel_command(user_input[7:].strip())
         
         # Load a file
         elif user_input.startswith("load "):
@@ -56,14 +222,11 @@ class AICodeAssistant:
             if new_file:
                 self.file_manager.current_file = new_file
                 self.file_manager.file_content = new_content
+                self.refresh_prefill()
         
-        # Show current content
-        elif user_input == "show":
-            if self.file_manager.file_content is None:
-                console.print("[yellow]⚠ No file loaded.[/yellow]")
-            else:
-                syntax = Syntax(self.file_manager.file_content, "python", theme="monokai", line_numbers=True)
-                console.print(Panel(syntax, title=f"Current File: {self.file_manager.current_file}", border_style="cyan"))
+        # Show current content, a window at a time
+        elif is_command(user_input, "show"):
+            self.show_command(user_input[5:].strip())
         
         # Save changes
         elif user_input == "save":
@@ -72,134 +235,534 @@ class AICodeAssistant:
             else:
                 console.print("[yellow]⚠ No file loaded.[/yellow]")
         
-        # Edit with instruction (with streaming)
+        # Edit with instruction (queued; the result goes to the file that was loaded)
         elif user_input.startswith("edit "):
             if self.file_manager.file_content is None:
                 console.print("[yellow]⚠ No file loaded. Use 'load <file>' first or just type your question.[/yellow]")
                 return
             
             instruction = user_input.split(" ", 1)[1]
-            console.print("[cyan]⏳ Thinking about code changes...[/cyan]")
-            
-            # Use streaming for code editing
-            def update_display(current_text):
-                # Clean the text to extract only code
-                clean_text = self.clean_streaming_output(current_text)
-                syntax = Syntax(clean_text, "python", theme="monokai", line_numbers=True)
-                return Panel(syntax, title="🔄 AI is writing code...", border_style="yellow")
-            
-            full_response = ""
-            try:
-                with Live(update_display(""), refresh_per_second=4, vertical_overflow="visible", transient=True) as live:
-                    def streaming_callback(text):
-                        nonlocal full_response
-                        full_response = text
-                        live.update(update_display(text))
-                    
-                    response = self.ai_handler.chat_stream(
-                        instruction, 
-                        is_code_context=True, 
-                        current_code=self.file_manager.file_content,
-                        callback=streaming_callback
-                    )
-            except Exception as e:
-                console.print(f"[red]❌ Error during streaming: {str(e)}[/red]")
-                return
-            
-            # Clear the live display area by printing empty lines
-            console.print("\n" * 2)  # Add some space
-            
-            # Extract only the code part for file content
-            pure_code = extract_pure_code(full_response)
-            
-            if pure_code:
-                self.file_manager.file_content = pure_code
-                syntax = Syntax(self.file_manager.file_content, "python", theme="monokai", line_numbers=True)
-                console.print(Panel(syntax, title="✅ Updated Code", border_style="green"))
-                console.print(f"[green]Code length: {len(self.file_manager.file_content)} characters[/green]")
-            else:
-                console.print("[red]❌ Could not extract valid code from response[/red]")
-                console.print(f"AI response: {full_response}")
+            job = self.jobs.submit("edit", instruction, self.run_edit, path=self.file_manager.current_file)
+            self.report_queued(job, "⏳ Thinking about code changes")
         
-        # General AI chat mode (with streaming)
+        # General AI chat mode (queued)
         else:
             if self.file_manager.current_file:
                 console.print("[yellow]💡 Tip: You have a file loaded. Use 'edit' for code changes or 'clear' to remove the file.[/yellow]")
             
-            console.print("[cyan]⏳ Thinking...[/cyan]")
-            
-            # Use streaming for general chat
-            def update_chat_display(current_text):
-                return Panel.fit(
-                    current_text,
-                    title="🤖 AI is thinking...",
-                    border_style="blue",
-                    subtitle="Type 'help' for commands" if not self.file_manager.current_file else f"File: {self.file_manager.current_file}"
-                )
-            
-            full_response = ""
-            try:
-                with Live(update_chat_display(""), refresh_per_second=4, vertical_overflow="visible", transient=True) as live:
-                    def streaming_callback(text):
-                        nonlocal full_response
-                        full_response = text
-                        live.update(update_chat_display(text))
-                    
-                    response = self.ai_handler.chat_stream(
-                        user_input, 
-                        is_code_context=False,
-                        callback=streaming_callback
-                    )
-            except Exception as e:
-                console.print(f"[red]❌ Error during streaming: {str(e)}[/red]")
+            job = self.jobs.submit("chat", user_input, self.run_chat)
+            self.report_queued(job, "⏳ Thinking")
+    
+    def cancelled(self):
+        """Whether the running job has been cancelled"""
+        job = self.jobs.current
+        return job is not None and job.cancelled.is_set()
+    
+    def report_queued(self, job, action):
+        waiting = len(self.jobs.jobs()) - len(self.jobs.history) - 1
+        if waiting:
+            console.print(f"[cyan]📥 Queued {job.label()} ({waiting} ahead); 'jobs' lists them, 'cancel {job.id}' drops it[/cyan]")
+        else:
+            console.print(f"[cyan]{action} ({job.label()}, 'cancel' or Ctrl-C stops it)...[/cyan]")
+    
+    def run_edit(self, job):
+        """Job body for `edit`: edit the target file's latest text, returning the updated code or None"""
+        # Waits without a spinner (the toolbar shows the load); a load error fails the job
+        self.model_loader.wait()
+        # Read when the job starts, so queued edits of one file build on each other
+        content = self.file_manager.content_of(job.path)
+        updated, failures = self.edit_pipeline().edit(job.description, content, job.path, history=self.conversation)
+        if failures:
+            errors = "\n\n".join(f"{name}:\n{error}" for name, error in failures.items())
+            console.print(Panel(errors, title="❌ Edit fails its checks (not applied)", border_style="red"))
+            return None
+        return updated
+    
+    def run_chat(self, job):
+        """Job body for chat: stream the answer above the prompt, a line at a time"""
+        self.model_loader.wait()
+        context = self.project_context(job.description)
+        subtitle = "Type 'help' for commands" if not self.file_manager.current_file else f"File: {self.file_manager.current_file}"
+        
+        view = StreamingTextPanel(f"🤖 AI Response ({job.label()})", "blue", subtitle=subtitle)
+        parts = []
+        events = self.ai_handler.stream(
+            job.description, is_code_context=False, use_cache=self.use_cache, history=self.conversation, context=context,
+            cancel=job.cancelled
+        )
+        self.consume(events, view, parts, job)
+        console.print(view.footer())
+        self.record_render(view)
+        return "".join(parts)
+    
+    def on_job_finished(self, job):
+        """JobQueue callback (inference thread): run finish_job on the REPL's event loop and wait for it.
+        
+        Buffers, their history and the prefill are then only changed from the
+        REPL thread, and the next queued job still starts from the updated
+        buffer. Without a running REPL (tests, exit) the job finishes here.
+        """
+        loop = self.loop
+        claimed = threading.Lock()
+        finished = threading.Event()
+        
+        def finish():
+            if not claimed.acquire(blocking=False):
                 return
-            
-            # Clear the live display area
-            console.print("\n" * 2)  # Add some space
-            
-            # Display the final response in a nice panel
+            try:
+                self.finish_job(job)
+            finally:
+                finished.set()
+        
+        if loop is not None:
+            try:
+                loop.call_soon_threadsafe(finish)
+            except RuntimeError:
+                pass  # The loop has closed
+            # The REPL may stop before it gets to the callback
+            while not finished.wait(0.1):
+                if self.loop is not loop:
+                    break
+        finish()
+        finished.wait()
+    
+    def finish_job(self, job):
+        """Report a finished job; an edit's result is attached to its file, whether or not it is still loaded"""
+        try:
+            self.report_job(job)
+        finally:
+            # The buffer or the history has changed, and with them the next edit's prompt
+            self.refresh_prefill()
+    
+    def report_job(self, job):
+        if job.status == "failed":
+            if isinstance(job.error, ModelNotFoundError):
+                show_model_help(job.error.model_path)
+            else:
+                console.print(f"[red]❌ {job.label()} failed: {str(job.error)}[/red]")
+            return
+        if job.kind != "edit" or not job.result:
+            return
+        
+        from rich.syntax import Syntax
+        loaded = self.file_manager.attach(job.path, job.result, label=job.description)
+        syntax = Syntax(job.result, lexer_for(job.path), theme="monokai", line_numbers=True)
+        console.print(Panel(syntax, title=f"✅ Updated Code ({job.label()})", border_style="green"))
+        console.print(f"[green]Code length: {len(job.result)} characters[/green]")
+        if not loaded:
+            console.print(f"[cyan]📝 Kept as unsaved changes to {job.path}; 'load {job.path}' to review and save them.[/cyan]")
+    
+    def refresh_prefill(self):
+        """Prefill for the loaded buffer as it is now, or forget the prefill when nothing is loaded"""
+        if self.file_manager.current_file and self.file_manager.file_content is not None:
+            self.prefiller.schedule(self.file_manager.current_file, self.file_manager.file_content)
+        else:
+            self.prefiller.invalidate()
+    
+    def run_prefill(self, target):
+        """Prefiller body: evaluate the next edit's prompt once the model is loaded and no job is running"""
+        self.model_loader.wait()
+        while self.jobs.busy:
+            if target.cancelled.wait(0.05):
+                return None
+        handler = self.ai_handler
+        # Large files are edited in chunks whose prompts depend on the instruction
+        if target.cancelled.is_set() or handler.count_tokens(target.code) > handler.edit_budget():
+            return None
+        return handler.prefill(target.code, history=self.conversation)
+    
+    def jobs_command(self):
+        """List recent, running and queued jobs"""
+        from rich.table import Table
+        
+        jobs = self.jobs.jobs()
+        if not jobs:
+            console.print("[yellow]⚠ No jobs yet.[/yellow]")
+            return
+        table = Table(title="🧵 Jobs", show_header=True, header_style="bold magenta")
+        table.add_column("#", justify="right")
+        table.add_column("Kind", style="cyan")
+        table.add_column("Status")
+        table.add_column("Target", style="dim")
+        table.add_column("Request")
+        table.add_column("Tokens", justify="right")
+        table.add_column("Time", justify="right")
+        styles = {"queued": "yellow", "running": "cyan", "done": "green", "failed": "red", "cancelled": "dim"}
+        for job in jobs:
+            request = job.description if len(job.description) <= 50 else job.description[:47] + "..."
+            table.add_row(
+                str(job.id), job.kind, f"[{styles[job.status]}]{job.status}[/{styles[job.status]}]",
+                job.path or "-", request, str(job.tokens), f"{job.elapsed:.1f}s" if job.started_at else "-"
+            )
+        console.print(table)
+    
+    def history_command(self):
+        """List the versions of the loaded file, marking the current one"""
+        from rich.table import Table
+        
+        history = self.file_manager.history()
+        if history is None:
+            console.print("[yellow]⚠ No edits to this file yet.[/yellow]")
+            return
+        table = Table(title=f"🕘 History of {self.file_manager.current_file}", show_header=True, header_style="bold magenta")
+        table.add_column("#", justify="right")
+        table.add_column("Change")
+        table.add_column("Lines", justify="right")
+        table.add_column("When", style="dim")
+        for number, version in history.entries():
+            label = version.label if len(version.label) <= 50 else version.label[:47] + "..."
+            marker = "▶ " if number == history.current else ""
+            lines = f"[green]+{version.added}[/green] [red]-{version.removed}[/red]" if number else "-"
+            table.add_row(f"{marker}{number}", label, lines, time.strftime("%H:%M:%S", time.localtime(version.created)))
+        console.print(table)
+        console.print(f"[dim]{format_bytes(history.size)} of deltas and checkpoints; 'diff N' compares version N with the current text.[/dim]")
+    
+    def diff_command(self, arg):
+        """Show what changed from version N (default: the previous version) to the current text"""
+        from rich.syntax import Syntax
+        
+        history = self.file_manager.history()
+        if history is None:
+            console.print("[yellow]⚠ No edits to this file yet.[/yellow]")
+            return
+        try:
+            number = int(arg) if arg else max(history.current - 1, history.base)
+            diff = history.diff(number, self.file_manager.file_content, self.file_manager.current_file)
+        except (ValueError, IndexError) as e:
+            console.print(f"[red]❌ {str(e) if isinstance(e, IndexError) else 'Usage: diff [N]'}[/red]")
+            return
+        if not diff:
+            console.print(f"[cyan]No differences from version {number}.[/cyan]")
+            return
+        console.print(Panel(Syntax(diff, "diff", theme="monokai"), title=f"🔍 Version {number} → current", border_style="cyan"))
+    
+    def cancel_command(self, arg):
+        """Cancel the running job, job N, or every job (`cancel all`)"""
+        if arg == "all":
+            cancelled = self.jobs.cancel_all()
+        else:
+            job = self.jobs.cancel(int(arg.lstrip("#")) if arg else None)
+            cancelled = [job] if job else []
+        if not cancelled:
+            console.print("[yellow]⚠ Nothing to cancel.[/yellow]")
+            return
+        for job in cancelled:
+            console.print(f"[yellow]⏹ Cancelled {job.label()}[/yellow]")
+    
+    def session_state(self):
+        """Open buffers, their history and the conversation, as saved by `snapshot`"""
+        return {
+            "files": self.file_manager.session_state(),
+            "conversation": self._conversation.state() if self._conversation is not None else None,
+        }
+    
+    def save_snapshot(self, state=None):
+        """Write the session state and, once the model is loaded, its evaluated context"""
+        save_session(self.session_dir, state or self.session_state())
+        saved = "file and history"
+        # Never waits for a model that is still loading
+        handler = self.ai_handler if self.model_loader.ready else None
+        context = handler.save_context() if handler is not None else None
+        if context:
+            path = save_kv(self.session_dir, handler.context_key(), *context)
+            saved += f", {len(context[0])} evaluated tokens ({format_bytes(os.path.getsize(path))})"
+        console.print(f"[green]💾 Session saved: {saved}.[/green]")
+    
+    def autosave(self):
+        """Save the session on exit, once running jobs have stopped"""
+        self.jobs.cancel_all()
+        self.jobs.wait(5)
+        try:
+            self.save_snapshot()
+        except Exception as e:
+            console.print(f"[red]❌ Could not save the session: {str(e)}[/red]")
+    
+    def resume_command(self):
+        """Restore the files now; history and model state follow as a job once the model is loaded"""
+        state = load_session(self.session_dir)
+        if state is None:
+            console.print("[yellow]⚠ No saved session for this project.[/yellow]")
+            return
+        self.prefiller.invalidate()
+        self.file_manager.restore_session(state["files"])
+        job = self.jobs.submit("resume", "restore the history and model state", lambda job: self.restore_context(state))
+        self.report_queued(job, "♻️ Restoring the model context")
+    
+    def restore_context(self, state):
+        """Job body for `resume`: put the saved history and evaluated context back"""
+        self.model_loader.wait()
+        if state.get("conversation"):
+            self.conversation.restore(state["conversation"])
+        handler = self.ai_handler
+        key = handler.context_key()
+        start = time.perf_counter()
+        saved = load_kv(self.session_dir, key) if key else None
+        if saved is None:
+            console.print("[cyan]♻️ History restored; there is no saved state for this model, so the next prompt is evaluated in full.[/cyan]")
+            return
+        handler.load_context(*saved)
+        console.print(f"[green]♻️ Restored {len(saved[0])} evaluated tokens in {time.perf_counter() - start:.2f}s.[/green]")
+    
+    def project_context(self, question):
+        """Snippets from the project relevant to a chat question, or None"""
+        retrieval = self.file_manager.retrieval
+        if retrieval is None or not retrieval.ready:
+            return None
+        budget = min(RETRIEVAL_TOKENS, self.ai_handler.context_budget() // 4)
+        snippets = retrieval.retrieve(question, budget, self.ai_handler.count_many)
+        if not snippets:
+            return None
+        sources = ", ".join(dict.fromkeys(snippet.path for snippet in snippets))
+        console.print(f"[dim]📚 Using {len(snippets)} snippet(s) from {sources}[/dim]")
+        return format_context(snippets)
+    
+    def edit_pipeline(self):
+        """The shared edit pipeline, streaming through this REPL and reporting above the prompt"""
+        return EditPipeline(
+            self.ai_handler, self.stream_edit, self.validator, self.excerpt_validator,
+            report=self.report_edit, cancelled=self.cancelled,
+        )
+    
+    def report_edit(self, level, message):
+        console.print(message, style=REPORT_STYLES[level], markup=False)
+    
+    def stream_edit(self, instruction, edit_format, code, history=None, remember=True, use_cache=True):
+        """Stream an edit response for the running job, returning the raw response or None on error"""
+        job = self.jobs.current
+        # Code lines are printed above the prompt as they settle
+        view = StreamingCodePanel(
+            f"🔄 AI is writing code... ({job.label()})" if job else "🔄 AI is writing code...",
+            "yellow",
+            lexer="diff" if edit_format == "diff" else "python",
+            extract_code=edit_format != "diff"
+        )
+        
+        parts = []
+        events = self.ai_handler.stream(
+            instruction,
+            is_code_context=True,
+            current_code=code,
+            edit_format=edit_format,
+            use_cache=self.use_cache and use_cache,
+            history=history,
+            remember=remember,
+            cancel=job.cancelled if job else None
+        )
+        try:
+            finished = self.consume(events, view, parts, job)
+        except Exception as e:
+            console.print(f"[red]❌ Error during streaming: {str(e)}[/red]")
+            return None
+        self.record_render(view)
+        if not finished:
+            # A partial edit cannot be applied; what was generated has been printed above
+            if parts:
+                console.print("[yellow]⏹ The partial response above was not applied.[/yellow]")
+            return None
+        
+        stats = self.ai_handler.last_stats
+        if stats and "acceptance_rate" in stats:
             console.print(
-                Panel.fit(
-                    full_response,
-                    title="🤖 AI Response",
-                    border_style="blue",
-                    subtitle="Type 'help' for commands" if not self.file_manager.current_file else f"File: {self.file_manager.current_file}"
-                )
+                f"[cyan]⚡ {stats['tokens_per_sec']:.1f} tokens/sec, "
+                f"{stats['accepted']}/{stats['drafted']} drafted tokens accepted ({stats['acceptance_rate']:.0%})[/cyan]"
             )
+        return "".join(parts)
     
-    def clean_streaming_output(self, text):
-        """Clean streaming output to extract only code"""
-        # Remove markdown code blocks if present
-        if "```" in text:
-            # Extract content between first and last ```
-            code_blocks = re.findall(r'```(?:python)?\s*(.*?)\s*```', text, re.DOTALL)
-            if code_blocks:
-                return code_blocks[0].strip()
-        
-        # If no markdown, try to find the actual code part
-        lines = text.split('\n')
-        code_lines = []
-        
-        for line in lines:
-            # Look for lines that contain Python code patterns
-            if (line.strip().startswith(('#', 'def ', 'import ', 'from ', 'class ')) or
-                '=' in line or ':' in line or '(' in line or ')' in line or
-                'return ' in line or 'print(' in line):
-                code_lines.append(line)
-            # Skip empty lines at the beginning
-            elif code_lines and not line.strip():
-                code_lines.append(line)
-            # Skip explanatory text
-            elif not code_lines and not line.strip():
+    def show_command(self, arg):
+        """Show lines N-M (or a page from N) of the current file; with no range, page through it"""
+        view = self.file_manager.view()
+        if view is None:
+            console.print("[yellow]⚠ No file loaded.[/yellow]")
+            return
+        page = max(console.size.height - 6, 10)
+        total = view.line_count
+        try:
+            start, end = parse_range(arg, total, page)
+        except ValueError:
+            console.print("[red]❌ Usage: show [N | N-M][/red]")
+            return
+        lexer = lexer_for(self.file_manager.current_file)
+        self.print_window(view, start, end, lexer)
+        if arg or end >= total:
+            return
+        
+        # Longer than a screen: only the page being looked at is highlighted
+        while True:
+            try:
+                choice = console.input("[cyan]Enter: next page · b: back · <line>: jump · q: quit [/cyan]").strip().lower()
+            except (EOFError, KeyboardInterrupt):
+                break
+            if choice == "q" or (not choice and end >= total):
+                break
+            if choice == "b":
+                start = max(start - page, 0)
+            elif choice.isdigit():
+                start = min(max(int(choice) - 1, 0), max(total - page, 0))
+            elif not choice:
+                start = end
+            else:
                 continue
+            end = min(start + page, total)
+            self.print_window(view, start, end, lexer)
+    
+    def print_window(self, view, start, end, lexer):
+        text = render_window(view, start, end, lexer, self.file_manager.highlight_cache)
+        title = f"Current File: {self.file_manager.current_file} (lines {start + 1}-{end} of {view.line_count})"
+        console.print(Panel(text, title=title, border_style="cyan"))
+    
+    def cache_command(self, arg):
+        """Show response cache stats, toggle it for this session, or clear it"""
+        if not self.require_model():
+            return
+        cache = self.ai_handler.cache
+        if cache is None:
+            console.print("[yellow]⚠ Response cache is disabled (RESPONSE_CACHE=0).[/yellow]")
+            return
         
-        if code_lines:
-            return '\n'.join(code_lines).strip()
+        if arg == "off":
+            self.use_cache = False
+            console.print("[yellow]Response cache bypassed for this session.[/yellow]")
+        elif arg == "on":
+            self.use_cache = True
+            console.print("[green]Response cache enabled.[/green]")
+        elif arg == "clear":
+            cache.clear()
+            console.print("[green]🗑️ Response cache cleared.[/green]")
+        else:
+            stats = cache.stats()
+            console.print(
+                f"[cyan]📦 Response cache: {stats['entries']} entries, "
+                f"{stats['bytes'] / 1024:.0f}/{stats['max_bytes'] / 1024:.0f} KB, "
+                f"{stats['hits']} hits / {stats['misses']} misses ({stats['hit_rate']:.0%})"
+                f"{'' if self.use_cache else ', bypassed'}[/cyan]"
+            )
+    
+    def memory_command(self, arg):
+        """Show how much conversation history is kept, or forget it"""
+        if not self.require_model():
+            return
+        conversation = self.conversation
+        if arg == "clear":
+            conversation.clear()
+            console.print("[green]🧹 Conversation history cleared.[/green]")
+            return
+        summarized = f", {conversation.evicted} older message(s) summarized" if conversation.evicted else ""
+        console.print(
+            f"[cyan]🧠 Conversation: {len(conversation.turns)} message(s), "
+            f"{conversation.tokens}/{conversation.budget} tokens{summarized}[/cyan]"
+        )
+    
+    def consume(self, events, view, parts, job=None):
+        """Feed streamed deltas to the view and parts, counting them on the job; False if the reply is incomplete.
+        
+        The view's settled lines are printed above the prompt, at most
+        REFRESH_PER_SECOND times a second.
+        """
+        console.print(view.header())
+        next_frame = 0.0
+        try:
+            for event in events:
+                if event.done:
+                    print_settled(console, view, final=True)
+                    self.report_finish(event)
+                    return event.finish_reason not in INCOMPLETE
+                view.feed(event.delta)
+                parts.append(event.delta)
+                if job is not None:
+                    job.tokens += 1
+                now = time.perf_counter()
+                if now >= next_frame:
+                    print_settled(console, view)
+                    next_frame = now + 1 / REFRESH_PER_SECOND
+        except KeyboardInterrupt:
+            # Interrupted between tokens; closing the stream stops decoding
+            events.close()
+            print_settled(console, view, final=True)
+            console.print(f"[yellow]⏹ Cancelled after {len(parts)} token(s); partial response kept.[/yellow]")
+            return False
+        print_settled(console, view, final=True)
+        return True
+    
+    def record_render(self, view):
+        """Attach the time spent drawing the last response to its telemetry record"""
+        render_ms = (view.feed_seconds + view.render_seconds) * 1000
+        self.ai_handler.telemetry.annotate(render_ms=round(render_ms, 2))
+    
+    def stats_command(self):
+        """Show p50/p95 latencies and throughput for the requests of this session"""
+        from rich.table import Table
+        
+        if self.ai_handler is None:
+            console.print("[yellow]⚠ No requests yet.[/yellow]")
+            return
+        summary = self.ai_handler.telemetry.summary()
+        if not summary["requests"]:
+            console.print("[yellow]⚠ No requests yet.[/yellow]")
+            return
+        
+        labels = {
+            "ttft_ms": ("Time to first token", "ms"),
+            "prompt_eval_ms": ("Prompt evaluation", "ms"),
+            "decode_tokens_per_sec": ("Decoding", "tokens/s"),
+            "total_ms": ("Total model time", "ms"),
+            "render_ms": ("Rendering", "ms"),
+            "prompt_tokens": ("Prompt size", "tokens"),
+        }
+        table = Table(title=f"📊 Session stats ({summary['requests']} requests)", show_header=True, header_style="bold magenta")
+        table.add_column("Metric", style="cyan")
+        table.add_column("p50", justify="right")
+        table.add_column("p95", justify="right")
+        table.add_column("Unit", style="dim")
+        for field, (label, unit) in labels.items():
+            row = summary["metrics"].get(field)
+            if row:
+                table.add_row(label, f"{row['p50']:.1f}", f"{row['p95']:.1f}", unit)
+        console.print(table)
         
-        # Fallback: return the original text but clean it up
-        return text.strip()
+        reasons = ", ".join(f"{reason} {count}" for reason, count in summary["finish_reasons"].items())
+        console.print(f"[cyan]Cache hits: {summary['cache_hits']}/{summary['requests']} · Finish reasons: {reasons}[/cyan]")
+        if summary["early_stops"] or summary["cancelled"]:
+            console.print(
+                f"[cyan]Early stops: {summary['early_stops']} (up to {summary['tokens_saved']} tokens not generated) · "
+                f"Cancelled: {summary['cancelled']}[/cyan]"
+            )
+        if self.ai_handler.telemetry.trace_path:
+            console.print(f"[dim]Trace: {self.ai_handler.telemetry.trace_path}[/dim]")
+        plan = getattr(self.ai_handler, "memory_plan", None)
+        if plan:
+            console.print(
+                f"[cyan]Memory budget: {format_bytes(plan['budget'])} · Context: {plan['n_ctx']} tokens · "
+                f"KV cache: {plan['kv_type']} · mlock: {'on' if plan['use_mlock'] else 'off'} · "
+                f"Estimated: {format_bytes(plan['estimated_bytes'])}[/cyan]"
+            )
+        console.print(f"[cyan]{self.memory_status()}[/cyan]")
+    
+    def report_finish(self, event):
+        """Warn when a response stopped for a reason other than finishing normally"""
+        if event.cached:
+            console.print("[cyan]⚡ Replayed from response cache ('cache off' to bypass)[/cyan]")
+        if event.finish_reason == "length":
+            console.print(f"[yellow]⚠ Response hit the {event.completion_tokens}-token limit and may be truncated.[/yellow]")
+        elif event.stopped_by == "cancelled":
+            console.print(f"[yellow]⏹ Cancelled after {event.completion_tokens} token(s); partial response kept.[/yellow]")
+        elif event.stopped_by and not event.cached:
+            console.print(f"[cyan]✂️ Stopped early ({event.stopped_by}) after {event.completion_tokens} token(s), up to {event.tokens_saved} not generated[/cyan]")
 
 def main():
+    # Headless subcommands skip the REPL entirely
+    if len(sys.argv) > 1 and sys.argv[1] == "batch":
+        from batch import batch_main
+        sys.exit(batch_main(sys.argv[2:]))
+    if len(sys.argv) > 1 and sys.argv[1] == "serve":
+        from server import serve_main
+        sys.exit(serve_main(sys.argv[2:]))
+    if len(sys.argv) > 1 and sys.argv[1] == "tune":
+        from tuning import tune_main
+        sys.exit(tune_main(sys.argv[2:]))
+    if len(sys.argv) > 1 and sys.argv[1] == "bench":
+        from benchmark import bench_main
+        sys.exit(bench_main(sys.argv[2:]))
+    
     assistant = AICodeAssistant()
     assistant.run()
 
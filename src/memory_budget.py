@@ -0,0 +1,178 @@
+import os
+import struct
+
+# Context sizes tried below the requested one, halving down to this
+MIN_CTX = 1024
+# llama.cpp compute buffers, the tokenizer and the Python process itself
+OVERHEAD_BYTES = 384 * 1024 * 1024
+# mlock only when the plan leaves this share of the budget free; a locked model that does not fit cannot be paged out
+MLOCK_SHARE = 0.9
+
+# KV-cache element types: (ggml type id, bytes per element). q8_0/q4_0 store 32 values in 34/18 bytes
+KV_TYPES = {
+    "f16": (1, 2.0),
+    "q8_0": (8, 34 / 32),
+    "q4_0": (2, 18 / 32),
+}
+# A 7B llama-class model, for when the GGUF header cannot be read
+DEFAULT_SHAPE = {"n_layer": 32, "n_embd_kv": 4096}
+
+_GGUF_SCALARS = {0: "<B", 1: "<b", 2: "<H", 3: "<h", 4: "<I", 5: "<i", 6: "<f", 7: "<?", 10: "<Q", 11: "<q", 12: "<d"}
+_GGUF_STRING, _GGUF_ARRAY = 8, 9
+
+
+def _read(f, fmt):
+    size = struct.calcsize(fmt)
+    data = f.read(size)
+    if len(data) != size:
+        raise ValueError("Truncated GGUF header")
+    return struct.unpack(fmt, data)[0]
+
+
+def _read_value(f, kind):
+    if kind in _GGUF_SCALARS:
+        return _read(f, _GGUF_SCALARS[kind])
+    if kind == _GGUF_STRING:
+        return f.read(_read(f, "<Q")).decode("utf-8", errors="replace")
+    if kind == _GGUF_ARRAY:
+        item_kind, count = _read(f, "<I"), _read(f, "<Q")
+        if item_kind in _GGUF_SCALARS:
+            # Arrays (e.g. token scores) are never needed here; skip them without decoding
+            f.seek(count * struct.calcsize(_GGUF_SCALARS[item_kind]), os.SEEK_CUR)
+        else:
+            for _ in range(count):
+                _read_value(f, item_kind)
+        return None
+    raise ValueError(f"Unknown GGUF value type {kind}")
+
+
+def read_gguf_metadata(path):
+    """Scalar and string key/value metadata from a GGUF file's header (arrays are skipped)"""
+    metadata = {}
+    with open(path, "rb") as f:
+        if f.read(4) != b"GGUF":
+            raise ValueError(f"Not a GGUF file: {path}")
+        _read(f, "<I")  # version
+        _read(f, "<Q")  # tensor count
+        for _ in range(_read(f, "<Q")):
+            key = f.read(_read(f, "<Q")).decode("utf-8", errors="replace")
+            value = _read_value(f, _read(f, "<I"))
+            if value is not None:
+                metadata[key] = value
+    return metadata
+
+
+def model_shape(path):
+    """Layer count and K/V width per token (smaller than the embedding with grouped-query attention)"""
+    try:
+        metadata = read_gguf_metadata(path)
+        arch = metadata["general.architecture"]
+        n_layer = metadata[f"{arch}.block_count"]
+        n_embd = metadata[f"{arch}.embedding_length"]
+        n_head = metadata.get(f"{arch}.attention.head_count") or 1
+        n_head_kv = metadata.get(f"{arch}.attention.head_count_kv") or n_head
+    except (OSError, ValueError, KeyError):
+        return dict(DEFAULT_SHAPE)
+    return {"n_layer": n_layer, "n_embd_kv": n_embd * n_head_kv // n_head}
+
+
+def kv_cache_bytes(shape, n_ctx, kv_type="f16"):
+    """Size of the K and V caches for n_ctx tokens"""
+    return int(2 * shape["n_layer"] * shape["n_embd_kv"] * n_ctx * KV_TYPES[kv_type][1])
+
+
+def _mlock_limit():
+    try:
+        import resource
+        limit = resource.getrlimit(resource.RLIMIT_MEMLOCK)[0]
+    except (ImportError, OSError, ValueError, AttributeError):
+        return 0
+    return float("inf") if limit == resource.RLIM_INFINITY else limit
+
+
+def plan_memory(budget, n_ctx, shape, model_bytes, mlock_limit=None):
+    """Context size, KV-cache type and mmap/mlock settings that fit budget bytes.
+
+    The weights are memory-mapped, so they are paged in from the file and
+    can be dropped under pressure instead of going to swap. What is left of
+    the budget goes to the KV cache: the requested context in f16, then in
+    q8_0, then halved contexts, down to MIN_CTX with a q4_0 cache.
+    """
+    available = budget - model_bytes - OVERHEAD_BYTES
+    sizes = []
+    size = n_ctx
+    while size > MIN_CTX:
+        sizes.append(size)
+        size //= 2
+    sizes.append(min(MIN_CTX, n_ctx))
+    choice = None
+    for size in sizes:
+        for kv_type in ("f16", "q8_0"):
+            if kv_cache_bytes(shape, size, kv_type) <= available:
+                choice = (size, kv_type)
+                break
+        if choice:
+            break
+    if choice is None:
+        choice = (sizes[-1], "q4_0")
+    size, kv_type = choice
+    estimated = model_bytes + OVERHEAD_BYTES + kv_cache_bytes(shape, size, kv_type)
+    if mlock_limit is None:
+        mlock_limit = _mlock_limit()
+    return {
+        "budget": budget,
+        "n_ctx": size,
+        "kv_type": kv_type,
+        "use_mmap": True,
+        "use_mlock": estimated <= budget * MLOCK_SHARE and model_bytes <= mlock_limit,
+        "estimated_bytes": estimated,
+        "fits": estimated <= budget,
+    }
+
+
+def budget_from_env():
+    """MEMORY_BUDGET_MB in bytes, or None when the low-memory mode is off"""
+    megabytes = os.getenv("MEMORY_BUDGET_MB")
+    return int(float(megabytes) * 1024 * 1024) if megabytes else None
+
+
+def plan_for_model(model_path, budget, n_ctx):
+    try:
+        model_bytes = os.path.getsize(model_path)
+    except OSError:
+        model_bytes = 0
+    return plan_memory(budget, n_ctx, model_shape(model_path), model_bytes)
+
+
+def llama_params(plan):
+    """Llama() keyword arguments for a plan; USE_MMAP and USE_MLOCK still override it"""
+    type_id = KV_TYPES[plan["kv_type"]][0]
+    params = {"n_ctx": plan["n_ctx"], "type_k": type_id, "type_v": type_id}
+    if plan["kv_type"] != "f16":
+        # llama.cpp only supports a quantized V cache with flash attention
+        params["flash_attn"] = True
+    for name, env in (("use_mmap", "USE_MMAP"), ("use_mlock", "USE_MLOCK")):
+        if not os.getenv(env):
+            params[name] = plan[name]
+    return params
+
+
+def resident_bytes():
+    """Resident set size of this process (current on Linux, peak elsewhere), or None"""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        import resource
+        import sys
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # kilobytes on Linux, bytes on macOS
+        return peak if sys.platform == "darwin" else peak * 1024
+    except (ImportError, OSError):
+        return None
+
+
+def format_bytes(count):
+    return f"{count / 1024 ** 3:.1f} GB" if count >= 1024 ** 3 else f"{count / 1024 ** 2:.0f} MB"
@@ -0,0 +1,279 @@
+import gc
+import os
+import threading
+from collections import OrderedDict
+from ai_handler import AIHandler, DEFAULT_MODEL_PATH, MAX_TOKENS, console
+from response_cache import ResponseCache, model_identity
+
+TASKS = ("chat", "edit")
+# Weights are memory-mapped from the GGUF file; the KV cache and scratch buffers add roughly this share
+OVERHEAD_SHARE = 0.2
+# Without MODEL_POOL_MB, loaded models may use this share of physical RAM
+DEFAULT_RAM_SHARE = 0.75
+
+
+def routes_from_env():
+    """Model file per task: EDIT_MODEL_PATH and CHAT_MODEL_PATH default to MODEL_PATH"""
+    default = os.getenv("MODEL_PATH", DEFAULT_MODEL_PATH)
+    return {
+        "chat": os.getenv("CHAT_MODEL_PATH") or default,
+        "edit": os.getenv("EDIT_MODEL_PATH") or default,
+    }
+
+
+def budget_from_env():
+    """RAM budget in bytes from MODEL_POOL_MB, else a share of physical RAM, else None (unlimited)"""
+    megabytes = os.getenv("MODEL_POOL_MB")
+    if megabytes:
+        return int(float(megabytes) * 1024 * 1024)
+    try:
+        return int(os.sysconf("SC_PHYS_PAGES") * os.sysconf("SC_PAGE_SIZE") * DEFAULT_RAM_SHARE)
+    except (AttributeError, ValueError, OSError):
+        return None
+
+
+def estimate_bytes(model_path):
+    """Memory a loaded model needs, estimated from its file size"""
+    try:
+        return int(os.path.getsize(model_path) * (1 + OVERHEAD_SHARE))
+    except OSError:
+        return 0
+
+
+class ModelPool:
+    """Loaded models keyed by file path, kept within a RAM budget.
+
+    Models load on first use (or when pre-warmed). Before a load, the least
+    recently used models that are not serving a request are evicted until
+    the new one fits; a model larger than the whole budget still loads once
+    nothing else is left to evict.
+    """
+    def __init__(self, factory, budget=None, estimate=estimate_bytes):
+        self.factory = factory
+        self.budget = budget
+        self.estimate = estimate
+        self.loads = 0
+        self.evictions = 0
+        self._handlers = OrderedDict()
+        self._sizes = {}
+        self._busy = {}
+        self._loading = {}
+        self._lock = threading.Lock()
+
+    def __contains__(self, path):
+        with self._lock:
+            return path in self._handlers
+
+    @property
+    def used(self):
+        with self._lock:
+            return sum(self._sizes.values())
+
+    def loaded(self):
+        """Paths of the loaded models, least recently used first"""
+        with self._lock:
+            return list(self._handlers)
+
+    def peek(self, path=None):
+        """The loaded handler for path (default: the most recently used one), or None.
+
+        Never loads a model and leaves the LRU order alone, so status lines and
+        token counting cannot evict anything.
+        """
+        with self._lock:
+            if path is None:
+                return next(reversed(self._handlers.values()), None)
+            return self._handlers.get(path)
+
+    def get(self, path):
+        """The handler for path, loading it if needed"""
+        while True:
+            with self._lock:
+                handler = self._handlers.get(path)
+                if handler is not None:
+                    self._handlers.move_to_end(path)
+                    return handler
+                pending = self._loading.get(path)
+                if pending is None:
+                    pending = self._loading[path] = threading.Event()
+                    break
+            # Another thread is loading the same model; use its result (or retry if it failed)
+            pending.wait()
+
+        try:
+            size = self.estimate(path)
+            self._make_room(size)
+            handler = self.factory(path)
+            with self._lock:
+                self._handlers[path] = handler
+                self._sizes[path] = size
+                self.loads += 1
+            return handler
+        finally:
+            with self._lock:
+                del self._loading[path]
+            pending.set()
+
+    def acquire(self, path):
+        """get(), marking the model busy so it is not evicted mid-request"""
+        handler = self.get(path)
+        with self._lock:
+            self._busy[path] = self._busy.get(path, 0) + 1
+        return handler
+
+    def release(self, path):
+        with self._lock:
+            self._busy[path] -= 1
+            if not self._busy[path]:
+                del self._busy[path]
+
+    def _make_room(self, size):
+        if self.budget is None:
+            return
+        evicted = False
+        with self._lock:
+            for path in list(self._handlers):
+                if sum(self._sizes.values()) + size <= self.budget:
+                    break
+                if self._busy.get(path):
+                    continue
+                del self._handlers[path]
+                del self._sizes[path]
+                self.evictions += 1
+                evicted = True
+        if evicted:
+            # llama.cpp frees a model's memory when its last reference goes
+            gc.collect()
+
+    def prewarm(self, paths):
+        """Load paths on a background thread, in order; failures surface on first real use"""
+        def load():
+            for path in paths:
+                try:
+                    self.get(path)
+                except Exception:
+                    pass
+        thread = threading.Thread(target=load, daemon=True)
+        thread.start()
+        return thread
+
+
+class RoutedModel:
+    """The model a ModelRouter hands to AIHandler: the edit model's context size and a loaded model's tokenizer"""
+    def __init__(self, pool, model_path):
+        self.pool = pool
+        self.model_path = model_path
+        self._n_ctx = None
+
+    def n_ctx(self):
+        if self._n_ctx is None:
+            self._n_ctx = self.pool.get(self.model_path).llm.n_ctx()
+        return self._n_ctx
+
+    def tokenize(self, text, add_bos=True, special=False):
+        handler = self.pool.peek() or self.pool.get(self.model_path)
+        return handler.llm.tokenize(text, add_bos=add_bos, special=special)
+
+
+class ModelRouter(AIHandler):
+    """AIHandler that sends each request to the model configured for its task.
+
+    Prompts are built here exactly as by AIHandler; stream_messages picks
+    the model by task ("chat" or "edit") from a ModelPool.
+    The edit model is loaded up front so load errors surface the same way
+    as with a single model, and the budgets are taken from it then. Only
+    stream_messages loads models: token counts come from the most recently
+    used model (the one serving the current task) and the model state
+    methods use a model that is already loaded. The routed handlers share
+    this router's response cache and telemetry.
+    """
+    def __init__(self, routes=None, factory=None, budget=None, estimate=estimate_bytes, prewarm=None, cache=None):
+        self.routes = routes or routes_from_env()
+        if cache is None and factory is None:
+            cache = ResponseCache.from_env()
+        self.pool = ModelPool(self._load, budget if budget is not None else budget_from_env(), estimate)
+        super().__init__(llm=RoutedModel(self.pool, self.routes["edit"]), cache=cache)
+        self.model_id = model_identity(self.model_path)
+        self._factory = factory or (lambda path: AIHandler(model_path=path, cache=self.cache))
+
+        # Loads the edit model and fixes the context size the budgets are computed from
+        self.llm.n_ctx()
+        if prewarm is None:
+            prewarm = [task.strip() for task in os.getenv("PREWARM_MODELS", "").split(",") if task.strip()]
+        if prewarm:
+            tasks = TASKS if "all" in prewarm else prewarm
+            self.pool.prewarm(list(dict.fromkeys(self.route(task) for task in tasks)))
+
+    def _load(self, path):
+        handler = self._factory(path)
+        handler.telemetry = self.telemetry
+        return handler
+
+    def route(self, task):
+        return self.routes.get(task or "edit") or self.routes["edit"]
+
+    def loaded_handler(self, task="edit"):
+        """The handler for task if its model is loaded, else the most recently used one (None before any load)"""
+        return self.pool.peek(self.route(task)) or self.pool.peek()
+
+    def count_tokens(self, text):
+        # Models of one family share a tokenizer; across families this is an estimate, as budgets already are
+        handler = self.pool.peek()
+        return handler.count_tokens(text) if handler is not None else len(text) // 4
+
+    @property
+    def memory_plan(self):
+        handler = self.loaded_handler()
+        return handler.memory_plan if handler is not None else None
+
+    def stream_messages(self, messages, temperature, max_tokens=MAX_TOKENS, use_cache=True, grammar=None,
+                        detectors=None, cancel=None, task=None):
+        kwargs = {"use_cache": use_cache, "grammar": grammar, "detectors": detectors, "cancel": cancel}
+        return self._stream_routed(self.route(task), task, messages, temperature, max_tokens, kwargs)
+
+    def _stream_routed(self, path, task, messages, temperature, max_tokens, kwargs):
+        # A generator, so a lazy load happens when streaming starts (under the REPL's live panel)
+        if path not in self.pool:
+            console.print(f"[cyan]⏳ Loading {os.path.basename(path)} for {task or 'edit'} requests...[/cyan]")
+        handler = self.pool.acquire(path)
+        try:
+            yield from handler.stream_messages(messages, temperature, max_tokens, **kwargs)
+        finally:
+            self.last_stats = handler.last_stats
+            self.pool.release(path)
+
+    def prefill_messages(self, messages, task=None):
+        # Only warms a model that is already loaded; a background prefill should not evict one
+        path = self.route(task)
+        if path not in self.pool:
+            return None
+        handler = self.pool.acquire(path)
+        try:
+            return handler.prefill_messages(messages, task)
+        finally:
+            self.pool.release(path)
+
+    def context_key(self):
+        handler = self.loaded_handler()
+        return handler.context_key() if handler is not None else None
+
+    def save_context(self):
+        handler = self.loaded_handler()
+        return handler.save_context() if handler is not None else None
+
+    def load_context(self, input_ids, blob):
+        handler = self.loaded_handler()
+        if handler is not None:
+            handler.load_context(input_ids, blob)
+
+    def describe(self):
+        """Task → model file name, for status lines"""
+        return ", ".join(f"{task}: {os.path.basename(self.routes[task])}" for task in TASKS)
+
+
+def create_handler():
+    """A plain AIHandler when every task uses the same model, otherwise a ModelRouter"""
+    routes = routes_from_env()
+    if len(set(routes.values())) == 1:
+        return AIHandler(model_path=routes["edit"])
+    return ModelRouter(routes)
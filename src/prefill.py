@@ -0,0 +1,97 @@
+import os
+import threading
+import time
+
+# Set PREFILL=0 to evaluate edit prompts only when `edit` runs
+PREFILL_ENABLED = os.getenv("PREFILL", "1").lower() not in ("0", "false", "no")
+# Seconds to wait after a change before prefilling, so quick successive loads only prefill the last file
+PREFILL_DELAY = 0.3
+
+
+class Target:
+    """One buffer to prefill; cancelled is set once it is superseded or invalidated"""
+    def __init__(self, path, code):
+        self.path = path
+        self.code = code
+        self.cancelled = threading.Event()
+        self.tokens = None
+        self.elapsed = None
+
+
+class Prefiller:
+    """Evaluates the static part of the next edit prompt in the background.
+
+    After a file is loaded the user spends a while typing the instruction;
+    run(target) uses that time to put the system prompt and the fenced file
+    through the model, so the edit only has to evaluate the instruction.
+    It returns the prompt tokens evaluated, or None if it skipped the
+    target, and should give up once target.cancelled is set. Only the most
+    recent schedule() is prefilled; invalidate() forgets it.
+    """
+    def __init__(self, run, delay=PREFILL_DELAY, enabled=PREFILL_ENABLED):
+        self.run = run
+        self.delay = delay
+        self.enabled = enabled
+        self.ready = None
+        self._target = None
+        self._wake = threading.Condition()
+        self._thread = None
+
+    def schedule(self, path, code):
+        """Prefill for code (the buffer of path), replacing any earlier target"""
+        if not self.enabled:
+            return None
+        target = Target(path, code)
+        with self._wake:
+            self._drop()
+            self._target = target
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._work, name="juno-prefill", daemon=True)
+                self._thread.start()
+            self._wake.notify()
+        return target
+
+    def invalidate(self):
+        """Forget the prefilled buffer, e.g. after `clear`"""
+        with self._wake:
+            self._drop()
+
+    def _drop(self):
+        if self._target is not None:
+            self._target.cancelled.set()
+        self._target = None
+        self.ready = None
+
+    def is_ready(self, path, code):
+        ready = self.ready
+        return ready is not None and ready.path == path and ready.code == code
+
+    def status(self):
+        """Toolbar text for the prefilled buffer, or None"""
+        ready = self.ready
+        if ready is None:
+            return None
+        return f"⚡ {os.path.basename(ready.path)} prefilled ({ready.tokens} tokens)"
+
+    def _work(self):
+        while True:
+            with self._wake:
+                while self._target is None:
+                    self._wake.wait()
+                target = self._target
+            # Debounce: a newer target or invalidate() in the meantime cancels this one
+            if target.cancelled.wait(self.delay):
+                continue
+            start = time.perf_counter()
+            try:
+                tokens = self.run(target)
+            except Exception:
+                # Prefilling is an optimisation; the edit evaluates the whole prompt itself
+                tokens = None
+            with self._wake:
+                if self._target is target:
+                    self._target = None
+                    if tokens is not None and not target.cancelled.is_set():
+                        target.tokens = tokens
+                        target.elapsed = time.perf_counter() - start
+                        self.ready = target
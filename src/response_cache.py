@@ -0,0 +1,151 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from urllib.request import pathname2url
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.expanduser("~"), ".cache", "juno", "responses.sqlite3")
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+
+def model_identity(model_path):
+    """Identify a model file cheaply: path, size and mtime instead of hashing gigabytes"""
+    try:
+        stat = os.stat(model_path)
+        return f"{os.path.abspath(model_path)}:{stat.st_size}:{stat.st_mtime_ns}"
+    except OSError:
+        return str(model_path)
+
+
+class ResponseCache:
+    """Content-addressed, size-bounded LRU cache of model responses in SQLite.
+
+    Responses are stored as the list of streamed deltas (zlib-compressed
+    JSON) so a hit can be replayed through the streaming path unchanged.
+    A read_only cache never writes the database: its puts and LRU touches
+    are kept in `deferred` for the process that owns the cache to apply
+    (batch workers hand them to the parent), so many processes can read
+    one cache without contending for its write lock.
+    """
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_bytes=DEFAULT_MAX_BYTES, read_only=False):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.read_only = read_only
+        self.deferred = []
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        if read_only:
+            self._db = sqlite3.connect(f"file:{pathname2url(os.path.abspath(path))}?mode=ro", uri=True, check_same_thread=False)
+            return
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY, payload BLOB NOT NULL, size INTEGER NOT NULL,"
+            " meta TEXT NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used)")
+        self._db.commit()
+
+    @classmethod
+    def from_env(cls):
+        """Build the cache from RESPONSE_CACHE* settings, or None when disabled"""
+        if os.getenv("RESPONSE_CACHE", "1").lower() in ("0", "false", "no"):
+            return None
+        try:
+            return cls(
+                path=os.getenv("RESPONSE_CACHE_PATH", DEFAULT_CACHE_PATH),
+                max_bytes=int(float(os.getenv("RESPONSE_CACHE_MB", DEFAULT_MAX_BYTES / 1024 / 1024)) * 1024 * 1024),
+                read_only=os.getenv("RESPONSE_CACHE_READONLY", "0").lower() not in ("0", "false", "no"),
+            )
+        except (OSError, sqlite3.Error):
+            return None
+
+    @staticmethod
+    def make_key(model_id, messages, params):
+        """Hash everything that can change the model's answer (the code being edited is in messages)"""
+        material = {"model": model_id, "messages": messages, "params": params}
+        blob = json.dumps(material, sort_keys=True, ensure_ascii=False).encode("utf-8")
+        return hashlib.sha256(blob).hexdigest()
+
+    def get(self, key):
+        """Return (deltas, meta) for key, or None on a miss"""
+        with self._lock:
+            row = self._db.execute("SELECT payload, meta FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self._touch(key)
+            self.hits += 1
+        return json.loads(zlib.decompress(row[0])), json.loads(row[1])
+
+    def _touch(self, key):
+        if self.read_only:
+            self.deferred.append(("touch", key))
+            return
+        self._db.execute("UPDATE responses SET last_used = ? WHERE key = ?", (time.time(), key))
+        self._db.commit()
+
+    def put(self, key, deltas, meta):
+        if self.read_only:
+            with self._lock:
+                self.deferred.append(("put", key, deltas, meta))
+            return
+        payload = zlib.compress(json.dumps(deltas, ensure_ascii=False).encode("utf-8"))
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses (key, payload, size, meta, last_used) VALUES (?, ?, ?, ?, ?)",
+                (key, payload, len(payload), json.dumps(meta), time.time()),
+            )
+            self._evict()
+            self._db.commit()
+
+    def _evict(self):
+        """Drop least recently used entries until the cache fits in max_bytes"""
+        total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in self._db.execute("SELECT key, size FROM responses ORDER BY last_used").fetchall():
+            self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    def take_deferred(self):
+        """The writes a read_only cache has held back, oldest first; they are forgotten here"""
+        with self._lock:
+            deferred, self.deferred = self.deferred, []
+        return deferred
+
+    def apply(self, writes):
+        """Apply writes taken from a read_only copy of this cache"""
+        for write in writes:
+            if write[0] == "put":
+                self.put(*write[1:])
+            else:
+                with self._lock:
+                    self._touch(write[1])
+
+    def clear(self):
+        with self._lock:
+            self._db.execute("DELETE FROM responses")
+            self._db.commit()
+            self.hits = self.misses = 0
+
+    def stats(self):
+        with self._lock:
+            entries, size = self._db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "entries": entries,
+            "bytes": size,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
@@ -0,0 +1,331 @@
+import array
+import hashlib
+import heapq
+import json
+import math
+import os
+import re
+import sqlite3
+import threading
+import time
+import zlib
+from collections import Counter
+
+DEFAULT_INDEX_DIR = os.path.join(os.path.expanduser("~"), ".cache", "juno", "retrieval")
+# Larger files are almost always generated or data; they are indexed by name only
+MAX_FILE_BYTES = 256 * 1024
+SNIPPET_LINES = 40
+# Files ranked before snippets are cut and scored
+CANDIDATE_FILES = 8
+# Query terms found in more than this share of files carry almost no signal and would dominate query time
+COMMON_TERM_SHARE = 0.25
+# BM25 parameters
+K1 = 1.2
+B = 0.75
+
+_IDENT_RE = re.compile(r"[A-Za-z_][A-Za-z0-9_]*")
+_PART_RE = re.compile(r"[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+|[A-Z]+|[0-9]+")
+
+
+def terms(text):
+    """Lowercased identifiers plus their snake_case/camelCase parts"""
+    found = []
+    for ident in _IDENT_RE.findall(text):
+        lower = ident.lower()
+        if len(lower) > 1:
+            found.append(lower)
+        parts = _PART_RE.findall(ident)
+        if len(parts) > 1:
+            found.extend(part.lower() for part in parts if len(part) > 1)
+    return found
+
+
+class Snippet:
+    """A run of lines from a project file, ranked for a query"""
+    def __init__(self, path, start, end, text, score):
+        self.path = path
+        self.start = start
+        self.end = end
+        self.text = text
+        self.score = score
+
+    def __repr__(self):
+        return f"Snippet({self.path}:{self.start + 1}-{self.end}, score={self.score:.2f})"
+
+
+def split_snippets(text):
+    """Cut a file into windows of about SNIPPET_LINES lines, preferring blank-line boundaries"""
+    lines = text.split("\n")
+    snippets = []
+    start = 0
+    while start < len(lines):
+        end = min(start + SNIPPET_LINES, len(lines))
+        if end < len(lines):
+            for cut in range(end, start + SNIPPET_LINES // 2, -1):
+                if not lines[cut - 1].strip():
+                    end = cut
+                    break
+        snippets.append((start, end, "\n".join(lines[start:end])))
+        start = end
+    return snippets
+
+
+def format_context(snippets):
+    """Render snippets as a prompt preamble"""
+    blocks = [
+        f"{snippet.path} (lines {snippet.start + 1}-{snippet.end}):\n```\n{snippet.text.strip()}\n```"
+        for snippet in snippets
+    ]
+    return "Relevant code from the current project:\n\n" + "\n\n".join(blocks)
+
+
+class RetrievalIndex:
+    """BM25 index over the project's files, used to ground chat answers.
+
+    Files come from the shared FileIndex, so .gitignore rules apply. The
+    index holds one document per file with compact postings (an array of
+    document ids and one of term frequencies per term) and is persisted to
+    SQLite keyed by path, mtime and size; a refresh only re-reads files
+    whose stat changed. Queries rank files first, then cut only the top
+    files into snippets and fit the best ones into a token budget.
+    """
+    def __init__(self, file_index, path=None, refresh_interval=30.0):
+        self.file_index = file_index
+        self.root = file_index.root
+        if path is None:
+            digest = hashlib.sha1(self.root.encode("utf-8")).hexdigest()[:16]
+            path = os.path.join(DEFAULT_INDEX_DIR, f"{digest}.sqlite3")
+        self.path = path
+        self.refresh_interval = refresh_interval
+        self._lock = threading.Lock()
+        self._db_lock = threading.Lock()
+        self._ready = threading.Event()
+        self._refreshing = False
+        self._last_refresh = 0.0
+        self._db = None
+        self._files = {}
+        self._paths = []
+        self._lengths = array.array("I")
+        self._postings = {}
+        self._total_length = 0
+        self._dead = 0
+
+    # Building
+
+    def start(self):
+        """Load the saved index and bring it up to date in a background thread"""
+        threading.Thread(target=self._build, daemon=True).start()
+        return self
+
+    def wait(self, timeout=None):
+        return self._ready.wait(timeout)
+
+    @property
+    def ready(self):
+        return self._ready.is_set()
+
+    @property
+    def documents(self):
+        return len(self._files)
+
+    def _build(self):
+        try:
+            self.file_index.wait()
+            self._open()
+            self._load()
+            self.refresh()
+        finally:
+            self._ready.set()
+
+    def _open(self):
+        if self.path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS files ("
+            " path TEXT PRIMARY KEY, mtime INTEGER NOT NULL, size INTEGER NOT NULL,"
+            " length INTEGER NOT NULL, terms BLOB NOT NULL)"
+        )
+        self._db.commit()
+
+    def _load(self):
+        with self._db_lock:
+            rows = self._db.execute("SELECT path, mtime, size, length, terms FROM files").fetchall()
+        with self._lock:
+            for path, mtime, size, length, blob in rows:
+                self._add(path, mtime, size, length, json.loads(zlib.decompress(blob)))
+
+    def _add(self, path, mtime, size, length, counts):
+        doc_id = len(self._paths)
+        self._paths.append(path)
+        self._lengths.append(length)
+        self._files[path] = (doc_id, mtime, size)
+        self._total_length += length
+        for term, tf in counts.items():
+            postings = self._postings.get(term)
+            if postings is None:
+                postings = self._postings[term] = (array.array("I"), array.array("H"))
+            postings[0].append(doc_id)
+            postings[1].append(min(tf, 65535))
+
+    def _remove(self, path):
+        doc_id = self._files.pop(path)[0]
+        self._paths[doc_id] = None
+        self._total_length -= self._lengths[doc_id]
+        self._dead += 1
+
+    def _compact(self):
+        """Drop removed documents from the postings once they are the majority"""
+        remap = {}
+        paths, lengths = [], array.array("I")
+        for doc_id, path in enumerate(self._paths):
+            if path is not None:
+                remap[doc_id] = len(paths)
+                paths.append(path)
+                lengths.append(self._lengths[doc_id])
+        postings = {}
+        for term, (ids, tfs) in self._postings.items():
+            new_ids, new_tfs = array.array("I"), array.array("H")
+            for doc_id, tf in zip(ids, tfs):
+                new_id = remap.get(doc_id)
+                if new_id is not None:
+                    new_ids.append(new_id)
+                    new_tfs.append(tf)
+            if new_ids:
+                postings[term] = (new_ids, new_tfs)
+        self._paths, self._lengths, self._postings = paths, lengths, postings
+        self._files = {path: (remap[doc_id], mtime, size) for path, (doc_id, mtime, size) in self._files.items()}
+        self._dead = 0
+
+    def _read(self, rel_path, size):
+        """Term counts for one file; binary and oversized files are indexed by path only"""
+        counts = Counter(terms(rel_path))
+        if size <= MAX_FILE_BYTES:
+            try:
+                with open(os.path.join(self.root, rel_path), "rb") as f:
+                    data = f.read()
+            except OSError:
+                data = b""
+            if b"\0" not in data[:8192]:
+                counts.update(terms(data.decode("utf-8", errors="ignore")))
+        return counts
+
+    def mark_stale(self):
+        """Force the next query to check for changed files, e.g. after a save"""
+        self._last_refresh = 0.0
+
+    def _maybe_refresh(self):
+        if not self.ready or self._refreshing:
+            return
+        if time.monotonic() - self._last_refresh < self.refresh_interval:
+            return
+        self._refreshing = True
+        threading.Thread(target=self.refresh, daemon=True).start()
+
+    def refresh(self):
+        """Re-read files whose mtime or size changed, add new ones and forget deleted ones"""
+        self._refreshing = True
+        try:
+            known = dict(self._files)
+            seen = set()
+            changed = []
+            for rel_path in self.file_index.files():
+                seen.add(rel_path)
+                try:
+                    stat = os.stat(os.path.join(self.root, rel_path))
+                except OSError:
+                    continue
+                entry = known.get(rel_path)
+                if entry and entry[1] == stat.st_mtime_ns and entry[2] == stat.st_size:
+                    continue
+                counts = self._read(rel_path, stat.st_size)
+                changed.append((rel_path, stat.st_mtime_ns, stat.st_size, sum(counts.values()), counts))
+            removed = [path for path in known if path not in seen]
+
+            with self._lock:
+                for path in removed:
+                    self._remove(path)
+                for path, mtime, size, length, counts in changed:
+                    if path in self._files:
+                        self._remove(path)
+                    self._add(path, mtime, size, length, counts)
+                if self._dead > len(self._files):
+                    self._compact()
+                self._last_refresh = time.monotonic()
+
+            if self._db is not None and (changed or removed):
+                with self._db_lock:
+                    self._db.executemany("DELETE FROM files WHERE path = ?", [(path,) for path in removed])
+                    self._db.executemany(
+                        "INSERT OR REPLACE INTO files (path, mtime, size, length, terms) VALUES (?, ?, ?, ?, ?)",
+                        [
+                            (path, mtime, size, length, zlib.compress(json.dumps(counts).encode("utf-8")))
+                            for path, mtime, size, length, counts in changed
+                        ],
+                    )
+                    self._db.commit()
+            return len(changed), len(removed)
+        finally:
+            self._refreshing = False
+
+    # Queries
+
+    def _idf(self, df, total):
+        return math.log(1 + (total - df + 0.5) / (df + 0.5))
+
+    def search_files(self, query, limit=CANDIDATE_FILES):
+        """Top files for query as (path, score), best first"""
+        self._maybe_refresh()
+        with self._lock:
+            total = len(self._files)
+            if not total:
+                return []
+            average = self._total_length / total or 1.0
+            paths, lengths = self._paths, self._lengths
+            scores = {}
+            for term in set(terms(query)):
+                postings = self._postings.get(term)
+                if postings is None:
+                    continue
+                ids, tfs = postings
+                if len(ids) > max(total * COMMON_TERM_SHARE, 50):
+                    continue
+                idf = self._idf(len(ids), total)
+                for doc_id, tf in zip(ids, tfs):
+                    norm = K1 * (1 - B + B * lengths[doc_id] / average)
+                    scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (K1 + 1) / (tf + norm)
+            best = heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
+            return [(paths[doc_id], score) for doc_id, score in best if paths[doc_id] is not None]
+
+    def retrieve(self, query, budget, count_many=None, limit=CANDIDATE_FILES):
+        """The most relevant snippets for query whose combined size fits budget tokens.
+
+        count_many(texts) returns token counts and is called once with every candidate.
+        """
+        count_many = count_many or (lambda texts: [len(text) // 4 for text in texts])
+        wanted = set(terms(query))
+        with self._lock:
+            total = len(self._files) or 1
+            idf = {term: self._idf(len(self._postings[term][0]), total) for term in wanted if term in self._postings}
+
+        candidates = []
+        for path, _ in self.search_files(query, limit):
+            try:
+                with open(os.path.join(self.root, path), "r", encoding="utf-8", errors="ignore") as f:
+                    text = f.read(MAX_FILE_BYTES)
+            except OSError:
+                continue
+            for start, end, snippet in split_snippets(text):
+                counts = Counter(term for term in terms(snippet) if term in idf)
+                score = sum(idf[term] * tf * (K1 + 1) / (tf + K1) for term, tf in counts.items())
+                if score > 0:
+                    candidates.append(Snippet(path, start, end, snippet, score))
+
+        ranked = sorted(candidates, key=lambda snippet: -snippet.score)
+        chosen, used = [], 0
+        for snippet, tokens in zip(ranked, count_many([snippet.text for snippet in ranked])):
+            if used + tokens > budget:
+                continue
+            chosen.append(snippet)
+            used += tokens
+        return chosen
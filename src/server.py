@@ -0,0 +1,545 @@
+import argparse
+import hashlib
+import http.client
+import json
+import os
+import queue
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+from rich.console import Console
+from ai_handler import AIHandler, StreamEvent, ModelLoadError, ModelNotFoundError, show_model_help, MAX_TOKENS
+from edit_protocol import EDIT_GRAMMARS
+from early_stop import STOP_DETECTORS
+from model_router import create_handler
+from response_cache import model_identity
+
+console = Console()
+
+DEFAULT_SERVER_URL = "http://127.0.0.1:8765"
+DEFAULT_MAX_QUEUE = 16
+# Token counts a RemoteHandler remembers when it has to ask the daemon for them
+TOKEN_COUNT_MEMO = 256
+
+
+def server_url():
+    """Address of the `juno serve` daemon from JUNO_SERVER, or None when attaching is disabled"""
+    url = os.getenv("JUNO_SERVER", DEFAULT_SERVER_URL).strip()
+    if url.lower() in ("", "0", "off", "false", "no"):
+        return None
+    return url if "://" in url else f"http://{url}"
+
+
+class _Job:
+    """One queued completion; the worker pushes StreamEvents (then None) onto events"""
+    def __init__(self, messages, temperature, max_tokens, use_cache, grammar=None, detectors=None, task=None):
+        self.messages = messages
+        self.temperature = temperature
+        self.max_tokens = max_tokens
+        self.use_cache = use_cache
+        self.grammar = grammar
+        self.detectors = detectors
+        self.task = task
+        self.events = queue.Queue()
+        self.cancelled = threading.Event()
+        self.stats = None
+
+
+class InferenceServer:
+    """Keeps one AIHandler warm and serves it over an OpenAI-compatible HTTP API.
+
+    Requests are queued and run one at a time by a single worker thread,
+    since a llama.cpp context cannot decode two prompts at once. Each HTTP
+    connection is served on its own thread and streams the events of its job.
+    """
+    def __init__(self, handler, host="127.0.0.1", port=8765, max_queue=DEFAULT_MAX_QUEUE):
+        self.handler = handler
+        self.jobs = queue.Queue(maxsize=max_queue)
+        self.httpd = ThreadingHTTPServer((host, port), _RequestHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.juno = self
+        self._worker = threading.Thread(target=self._work, daemon=True)
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        """Serve on background threads (used by tests); returns self"""
+        self._worker.start()
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        return self
+
+    def serve_forever(self):
+        self._worker.start()
+        self.httpd.serve_forever()
+
+    def shutdown(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        self.jobs.put(None)
+
+    def submit(self, job):
+        """Queue a job; raises queue.Full when the server is saturated"""
+        self.jobs.put_nowait(job)
+
+    def _work(self):
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                return
+            if job.cancelled.is_set():
+                continue
+            try:
+                events = self.handler.stream_messages(
+                    job.messages, job.temperature, job.max_tokens, use_cache=job.use_cache, grammar=job.grammar,
+                    detectors=job.detectors, cancel=job.cancelled, task=job.task
+                )
+                try:
+                    for event in events:
+                        if job.cancelled.is_set():
+                            break  # Client went away; stop decoding for it
+                        if event.done:
+                            job.stats = self.handler.last_stats
+                        job.events.put(event)
+                finally:
+                    events.close()
+            except Exception as e:
+                job.events.put(e)
+            finally:
+                job.events.put(None)
+
+
+def _completion_id():
+    return f"chatcmpl-{uuid.uuid4().hex[:24]}"
+
+
+def _juno_meta(event, stats):
+    """Fields beyond the OpenAI schema that the REPL uses for its status lines"""
+    return {
+        "cached": event.cached,
+        "time_to_first_token": event.time_to_first_token,
+        "prompt_eval_time": event.prompt_eval_time,
+        "stopped_by": event.stopped_by,
+        "tokens_saved": event.tokens_saved,
+        "elapsed": event.elapsed,
+        "stats": stats,
+    }
+
+
+def _usage(event):
+    return {
+        "prompt_tokens": event.prompt_tokens,
+        "completion_tokens": event.completion_tokens,
+        "total_tokens": event.prompt_tokens + event.completion_tokens,
+    }
+
+
+class _RequestHandler(BaseHTTPRequestHandler):
+    server_version = "JunoServe/1.0"
+
+    @property
+    def juno(self):
+        return self.server.juno
+
+    def log_message(self, format, *args):
+        pass  # Keep the daemon's console for our own status lines
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_error(self, status, message, kind="invalid_request_error"):
+        self._send_json(status, {"error": {"message": message, "type": kind}})
+
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def do_GET(self):
+        handler = self.juno.handler
+        if self.path == "/health":
+            self._send_json(200, {
+                "status": "ok",
+                "model": handler.model_path,
+                "model_id": handler.model_id,
+                "n_ctx": handler.llm.n_ctx(),
+                "edit_budget": handler.edit_budget(),
+                "context_budget": handler.context_budget(),
+                "cache": handler.cache is not None,
+                "queued": self.juno.jobs.qsize(),
+            })
+        elif self.path == "/v1/models":
+            model = os.path.basename(handler.model_path)
+            self._send_json(200, {"object": "list", "data": [{"id": model, "object": "model", "owned_by": "juno"}]})
+        elif self.path == "/juno/cache":
+            if handler.cache is None:
+                self._send_error(404, "Response cache is disabled")
+            else:
+                self._send_json(200, handler.cache.stats())
+        else:
+            self._send_error(404, f"Unknown path {self.path}")
+
+    def do_POST(self):
+        try:
+            body = self._read_json()
+        except ValueError:
+            self._send_error(400, "Request body is not valid JSON")
+            return
+        handler = self.juno.handler
+        if self.path == "/v1/chat/completions":
+            self._chat_completion(body)
+        elif self.path == "/juno/tokenize":
+            if "contents" in body:
+                self._send_json(200, {"counts": handler.count_many(body["contents"])})
+            else:
+                self._send_json(200, {"count": handler.count_tokens(body.get("content", ""))})
+        elif self.path == "/juno/cache/clear":
+            if handler.cache is not None:
+                handler.cache.clear()
+            self._send_json(200, {"cleared": handler.cache is not None})
+        else:
+            self._send_error(404, f"Unknown path {self.path}")
+
+    def _chat_completion(self, body):
+        messages = body.get("messages")
+        if not isinstance(messages, list) or not messages:
+            self._send_error(400, "'messages' must be a non-empty list")
+            return
+        try:
+            temperature = float(body.get("temperature", 0.7))
+            max_tokens = int(body.get("max_tokens") or MAX_TOKENS)
+        except (TypeError, ValueError):
+            self._send_error(400, "'temperature' and 'max_tokens' must be numbers")
+            return
+
+        # "grammar" (a juno extension) names one of the built-in edit grammars
+        grammar = body.get("grammar")
+        if grammar is not None and grammar not in EDIT_GRAMMARS:
+            self._send_error(400, f"Unknown grammar {grammar!r}; expected one of {sorted(EDIT_GRAMMARS)}")
+            return
+
+        # "stop_detectors" (also a juno extension) names early-stop detectors to run while decoding
+        detectors = body.get("stop_detectors") or []
+        unknown = [name for name in detectors if name not in STOP_DETECTORS]
+        if unknown:
+            self._send_error(400, f"Unknown stop detector(s) {unknown}; expected some of {sorted(STOP_DETECTORS)}")
+            return
+
+        # "task" (juno) picks the model when the server routes tasks to different models
+        job = _Job(
+            messages, temperature, max_tokens, use_cache=body.get("cache", True) is not False,
+            grammar=grammar, detectors=detectors, task=body.get("task"),
+        )
+        try:
+            self.juno.submit(job)
+        except queue.Full:
+            self._send_error(503, "Server busy: request queue is full", kind="server_error")
+            return
+
+        meta = {"id": _completion_id(), "created": int(time.time()), "model": os.path.basename(self.juno.handler.model_path)}
+        if body.get("stream"):
+            self._stream_job(job, meta)
+        else:
+            self._finish_job(job, meta)
+
+    def _stream_job(self, job, meta):
+        """Send the job's events as OpenAI chat.completion.chunk server-sent events"""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+
+        def send(payload):
+            self.wfile.write(f"data: {payload}\n\n".encode("utf-8"))
+            self.wfile.flush()
+
+        try:
+            while True:
+                item = job.events.get()
+                if item is None:
+                    break
+                if isinstance(item, Exception):
+                    send(json.dumps({"error": {"message": str(item), "type": "server_error"}}))
+                    break
+                chunk = {**meta, "object": "chat.completion.chunk"}
+                if item.done:
+                    chunk["choices"] = [{"index": 0, "delta": {}, "finish_reason": item.finish_reason}]
+                    chunk["usage"] = _usage(item)
+                    chunk["juno"] = _juno_meta(item, job.stats)
+                else:
+                    chunk["choices"] = [{"index": 0, "delta": {"content": item.delta}, "finish_reason": None}]
+                send(json.dumps(chunk))
+            send("[DONE]")
+        except (BrokenPipeError, ConnectionResetError):
+            job.cancelled.set()
+
+    def _finish_job(self, job, meta):
+        parts, done = [], None
+        while True:
+            item = job.events.get()
+            if item is None:
+                break
+            if isinstance(item, Exception):
+                self._send_error(500, str(item), kind="server_error")
+                return
+            if item.done:
+                done = item
+            else:
+                parts.append(item.delta)
+        done = done or StreamEvent("", done=True)
+        self._send_json(200, {
+            **meta,
+            "object": "chat.completion",
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": "".join(parts)}, "finish_reason": done.finish_reason}],
+            "usage": _usage(done),
+            "juno": _juno_meta(done, job.stats),
+        })
+
+
+class RemoteCache:
+    """The parts of ResponseCache the REPL uses, answered by the server's cache"""
+    def __init__(self, handler):
+        self.handler = handler
+
+    def stats(self):
+        return self.handler._request("GET", "/juno/cache")
+
+    def clear(self):
+        self.handler._request("POST", "/juno/cache/clear", {})
+
+
+def vocab_tokenizer(model_path):
+    """The tokenizer of the GGUF file at model_path, loaded without its weights, or None when it cannot be read here"""
+    try:
+        import llama_cpp
+        from llama_cpp._internals import _LlamaModel
+    except ImportError:
+        return None
+    try:
+        llama_cpp.llama_backend_init()
+        params = llama_cpp.llama_model_default_params()
+        params.vocab_only = True
+        return _LlamaModel(path_model=model_path, params=params, verbose=False)
+    except ValueError:
+        return None
+
+
+class RemoteModel:
+    """The model AIHandler sees for a daemon: its path and context size from /health.
+
+    When the daemon's model file is readable here (the same file: path,
+    size and mtime match), its vocabulary is loaded so tokens are counted
+    locally; vocab is None otherwise.
+    """
+    def __init__(self, info):
+        self.model_path = info["model"]
+        self._n_ctx = info["n_ctx"]
+        identity = model_identity(self.model_path)
+        same_file = identity != self.model_path and identity == info["model_id"]
+        self.vocab = vocab_tokenizer(self.model_path) if same_file else None
+
+    def n_ctx(self):
+        return self._n_ctx
+
+    def tokenize(self, text, add_bos=True, special=False):
+        return self.vocab.tokenize(text, add_bos, special)
+
+
+class RemoteHandler(AIHandler):
+    """AIHandler whose model lives in a running `juno serve` daemon.
+
+    Prompts (and conversation history) are built locally exactly as
+    in-process and the budgets follow from the daemon's context size; only
+    stream_messages goes over HTTP, so the REPL, chunked edits and batch
+    jobs work unchanged against either handler. Tokens are counted with the
+    model's vocabulary when its file is readable here; otherwise each batch
+    of texts not counted recently is sent to the daemon in one request.
+    """
+    def __init__(self, url, connect_timeout=2.0, timeout=600.0):
+        self.server_url = url.rstrip("/")
+        parsed = urlsplit(self.server_url)
+        self._host, self._port = parsed.hostname, parsed.port or 80
+        self.timeout = timeout
+
+        info = self._request("GET", "/health", timeout=connect_timeout)
+        super().__init__(llm=RemoteModel(info))
+        self.model_id = info["model_id"]
+        self.cache = RemoteCache(self) if info.get("cache") else None
+        self._counts = OrderedDict()
+        self._counts_lock = threading.Lock()
+
+    def _connect(self, timeout=None):
+        return http.client.HTTPConnection(self._host, self._port, timeout=timeout or self.timeout)
+
+    def _request(self, method, path, payload=None, timeout=None):
+        connection = self._connect(timeout)
+        try:
+            body = json.dumps(payload) if payload is not None else None
+            connection.request(method, path, body=body, headers={"Content-Type": "application/json"})
+            response = connection.getresponse()
+            data = json.loads(response.read() or b"{}")
+            if response.status != 200:
+                raise ConnectionError(data.get("error", {}).get("message", f"HTTP {response.status}"))
+            return data
+        finally:
+            connection.close()
+
+    def count_tokens(self, text):
+        if self.llm.vocab is not None:
+            return super().count_tokens(text)
+        return self.count_many([text])[0]
+
+    def count_many(self, texts):
+        if self.llm.vocab is not None:
+            return super().count_many(texts)
+        keys = [hashlib.sha1(text.encode("utf-8")).hexdigest() for text in texts]
+        counts = {}
+        with self._counts_lock:
+            for key in keys:
+                if key in self._counts:
+                    self._counts.move_to_end(key)
+                    counts[key] = self._counts[key]
+        missing = {key: text for key, text in zip(keys, texts) if key not in counts}
+        if missing:
+            fetched = dict(zip(missing, self._request("POST", "/juno/tokenize", {"contents": list(missing.values())})["counts"]))
+            counts.update(fetched)
+            with self._counts_lock:
+                self._counts.update(fetched)
+                while len(self._counts) > TOKEN_COUNT_MEMO:
+                    self._counts.popitem(last=False)
+        return [counts[key] for key in keys]
+
+    def prefill(self, current_code, history=None, edit_format=None):
+        # Returns before building the prompt, which would count the whole file for nothing
+        return None
+
+    def prefill_messages(self, messages, task=None):
+        # The daemon's worker owns the model and keeps its own KV cache; there is nothing to warm from here
+        return None
+
+    def context_key(self):
+        # The daemon stays warm across REPL restarts by itself; there is no state to save here
+        return None
+
+    def save_context(self):
+        return None
+
+    def stream_messages(self, messages, temperature, max_tokens=MAX_TOKENS, use_cache=True, grammar=None, detectors=None, cancel=None,
+                        task=None):
+        payload = {
+            "messages": messages,
+            "temperature": temperature,
+            "max_tokens": max_tokens,
+            "stream": True,
+            "cache": use_cache,
+            "grammar": grammar,
+            "stop_detectors": list(detectors or ()),
+            "task": task,
+        }
+        connection = self._connect()
+        connection.request("POST", "/v1/chat/completions", body=json.dumps(payload), headers={"Content-Type": "application/json"})
+        return self._observe(self._read_events(connection, cancel), grammar)
+
+    def _read_events(self, connection, cancel=None):
+        """Turn the server-sent chunks back into StreamEvents"""
+        completion_tokens = 0
+        try:
+            response = connection.getresponse()
+            if response.status != 200:
+                data = json.loads(response.read() or b"{}")
+                raise ConnectionError(data.get("error", {}).get("message", f"HTTP {response.status}"))
+            while True:
+                line = response.readline()
+                if not line:
+                    break
+                line = line.decode("utf-8").strip()
+                if not line.startswith("data: "):
+                    continue
+                data = line[len("data: "):]
+                if data == "[DONE]":
+                    break
+                chunk = json.loads(data)
+                if "error" in chunk:
+                    raise RuntimeError(chunk["error"]["message"])
+                choice = chunk["choices"][0]
+                if choice.get("finish_reason") is None and "juno" not in chunk:
+                    delta = choice["delta"].get("content")
+                    if delta:
+                        completion_tokens += 1
+                        yield StreamEvent(delta)
+                    if cancel is not None and cancel.is_set():
+                        yield StreamEvent("", done=True, finish_reason="cancelled", completion_tokens=completion_tokens, stopped_by="cancelled")
+                        return
+                    continue
+                usage, juno = chunk.get("usage", {}), chunk.get("juno", {})
+                self.last_stats = juno.get("stats")
+                yield StreamEvent(
+                    "",
+                    done=True,
+                    finish_reason=choice.get("finish_reason"),
+                    prompt_tokens=usage.get("prompt_tokens", 0),
+                    completion_tokens=usage.get("completion_tokens", 0),
+                    time_to_first_token=juno.get("time_to_first_token"),
+                    elapsed=juno.get("elapsed", 0.0),
+                    cached=juno.get("cached", False),
+                    prompt_eval_time=juno.get("prompt_eval_time"),
+                    stopped_by=juno.get("stopped_by"),
+                    tokens_saved=juno.get("tokens_saved", 0)
+                )
+        except KeyboardInterrupt:
+            yield StreamEvent("", done=True, finish_reason="cancelled", completion_tokens=completion_tokens, stopped_by="cancelled")
+        finally:
+            # Closing mid-stream tells the server to stop generating for us
+            connection.close()
+
+
+def attach_or_load(fallback=create_handler):
+    """ModelLoader factory: attach to a running `juno serve`, else load the model in-process"""
+    url = server_url()
+    if url:
+        try:
+            return RemoteHandler(url, connect_timeout=0.5)
+        except (OSError, ValueError, KeyError):
+            pass  # No server (or not a juno one) listening there
+    return fallback()
+
+
+def serve_main(argv):
+    """Entry point for `python src/main.py serve ...`"""
+    default = urlsplit(server_url() or DEFAULT_SERVER_URL)
+    parser = argparse.ArgumentParser(prog="juno serve", description="Keep the model loaded and serve it on a local HTTP port")
+    parser.add_argument("--host", default=default.hostname or "127.0.0.1", help="Interface to bind (default: localhost only)")
+    parser.add_argument("--port", type=int, default=default.port or 8765, help="Port to listen on")
+    parser.add_argument("--queue", type=int, default=DEFAULT_MAX_QUEUE, help="Requests allowed to wait before new ones get HTTP 503")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    try:
+        with console.status("[cyan]⏳ Loading model...[/cyan]"):
+            handler = create_handler()
+    except ModelNotFoundError as e:
+        show_model_help(e.model_path)
+        return 1
+    except ModelLoadError as e:
+        console.print(f"[red]❌ {str(e)}[/red]")
+        return 1
+
+    server = InferenceServer(handler, host=args.host, port=args.port, max_queue=args.queue)
+    console.print(f"[green]✅ Model loaded in {time.perf_counter() - start:.1f}s: {os.path.basename(handler.model_path)}[/green]")
+    console.print(f"[bold green]🚀 Serving on {server.url} (OpenAI-compatible: POST /v1/chat/completions). Ctrl+C to stop.[/bold green]")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        console.print("\n[red]Stopping server...[/red]")
+    finally:
+        server.httpd.server_close()
+    return 0
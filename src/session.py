@@ -0,0 +1,90 @@
+import hashlib
+import json
+import os
+import struct
+import time
+import zlib
+from array import array
+
+DEFAULT_SESSION_DIR = os.path.join(os.path.expanduser("~"), ".cache", "juno", "sessions")
+# Save the session on exit (`quit` or Ctrl-C); `resume` restores it
+SESSION_AUTOSAVE = os.getenv("SESSION_AUTOSAVE", "1").lower() not in ("0", "false", "no")
+
+SESSION_FILE = "session.json.z"
+SESSION_VERSION = 1
+KV_MAGIC = b"JUNOKV1\0"
+
+
+def session_dir(root=None, cwd=None):
+    """Snapshot directory of the project in cwd; each project keeps its own session"""
+    root = root or os.getenv("SESSION_PATH") or DEFAULT_SESSION_DIR
+    project = os.path.abspath(cwd or os.getcwd())
+    return os.path.join(root, hashlib.sha1(project.encode("utf-8")).hexdigest()[:16])
+
+
+def kv_path(directory, key):
+    """Where the model state for a context key (model file and context shape) is kept"""
+    return os.path.join(directory, hashlib.sha1(key.encode("utf-8")).hexdigest()[:16] + ".kv")
+
+
+def _write_atomic(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def save_session(directory, state):
+    """Write the session state (files, buffers, history) as compressed JSON"""
+    payload = {"version": SESSION_VERSION, "saved_at": time.time(), **state}
+    _write_atomic(os.path.join(directory, SESSION_FILE), zlib.compress(json.dumps(payload, ensure_ascii=False).encode("utf-8")))
+
+
+def load_session(directory):
+    """The saved session state, or None if there is none (or it is from another version)"""
+    try:
+        with open(os.path.join(directory, SESSION_FILE), "rb") as f:
+            state = json.loads(zlib.decompress(f.read()).decode("utf-8"))
+    except (OSError, ValueError, zlib.error):
+        return None
+    return state if state.get("version") == SESSION_VERSION else None
+
+
+def save_kv(directory, key, input_ids, blob):
+    """Write a model state: a small header, the evaluated token ids, then llama.cpp's state data.
+
+    The state data only covers the KV cells in use, so the file grows with
+    the evaluated context rather than the configured window.
+    """
+    header = json.dumps({"key": key, "n_tokens": len(input_ids), "size": len(blob)}).encode("utf-8")
+    tokens = array("i", input_ids).tobytes()
+    path = kv_path(directory, key)
+    _write_atomic(path, b"".join([KV_MAGIC, struct.pack("<I", len(header)), header, tokens, blob]))
+    return path
+
+
+def load_kv(directory, key):
+    """(input_ids, blob) saved for key, or None when there is none or it belongs to another context"""
+    try:
+        with open(kv_path(directory, key), "rb") as f:
+            data = f.read()
+    except OSError:
+        return None
+    if not data.startswith(KV_MAGIC):
+        return None
+    try:
+        offset = len(KV_MAGIC)
+        (length,) = struct.unpack_from("<I", data, offset)
+        offset += 4
+        header = json.loads(data[offset:offset + length].decode("utf-8"))
+        offset += length
+    except (struct.error, ValueError):
+        return None
+    tokens = array("i")
+    end = offset + header["n_tokens"] * tokens.itemsize
+    if header["key"] != key or len(data) != end + header["size"]:
+        return None
+    tokens.frombytes(data[offset:end])
+    # A view, so the state data is not copied again before llama.cpp reads it
+    return tokens.tolist(), memoryview(data)[end:]
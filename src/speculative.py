@@ -0,0 +1,80 @@
+from llama_cpp.llama_speculative import LlamaDraftModel
+
+
+def find_draft_tokens(input_ids, max_ngram_size, num_pred_tokens):
+    """Find the continuation of the most recent earlier occurrence of the trailing n-gram"""
+    length = len(input_ids)
+
+    for ngram_size in range(min(max_ngram_size, length - 1), 0, -1):
+        ngram = input_ids[length - ngram_size:]
+        first = ngram[0]
+        # Walk backwards so the latest copy wins; while copying code that is
+        # the occurrence the model is currently reproducing
+        for start in range(length - ngram_size - 1, -1, -1):
+            if input_ids[start] != first or input_ids[start:start + ngram_size] != ngram:
+                continue
+            begin = start + ngram_size
+            end = min(begin + num_pred_tokens, length)
+            if begin < end:
+                return input_ids[begin:end]
+
+    return []
+
+
+class PromptLookupDraft(LlamaDraftModel):
+    """Prompt-lookup draft model that proposes tokens copied from the prompt.
+
+    Edit prompts contain the whole loaded file and most of the answer repeats
+    it, so n-gram lookups into the context make cheap, usually correct drafts
+    that llama.cpp verifies in a single batch.
+    """
+    def __init__(self, max_ngram_size=3, num_pred_tokens=10):
+        self.max_ngram_size = max_ngram_size
+        self.num_pred_tokens = num_pred_tokens
+        self.reset_stats()
+
+    def reset_stats(self):
+        """Forget acceptance statistics, e.g. at the start of a request"""
+        self.drafted = 0
+        self.accepted = 0
+        self.calls = 0
+        self._last_length = 0
+        self._last_draft = []
+
+    def settle(self):
+        """Drop the final draft, whose verification was cut short when generation stopped"""
+        self.drafted -= len(self._last_draft)
+        self._last_draft = []
+
+    def _record_acceptance(self, input_ids):
+        """Count how many tokens of the previous draft survived verification"""
+        if not self._last_draft or len(input_ids) <= self._last_length:
+            return
+        landed = input_ids[self._last_length:self._last_length + len(self._last_draft)]
+        for drafted, actual in zip(self._last_draft, landed):
+            if drafted != actual:
+                break
+            self.accepted += 1
+
+    def stats(self):
+        """Return acceptance statistics for the drafts made so far"""
+        rate = self.accepted / self.drafted if self.drafted else 0.0
+        return {
+            "drafted": self.drafted,
+            "accepted": self.accepted,
+            "calls": self.calls,
+            "acceptance_rate": rate,
+        }
+
+    def __call__(self, input_ids, /, **kwargs):
+        import numpy as np
+
+        ids = input_ids.tolist()
+        self._record_acceptance(ids)
+
+        draft = find_draft_tokens(ids, self.max_ngram_size, self.num_pred_tokens)
+        self.calls += 1
+        self.drafted += len(draft)
+        self._last_length = len(ids)
+        self._last_draft = draft
+        return np.array(draft, dtype=np.intc)
@@ -0,0 +1,226 @@
+import threading
+import time
+from rich.rule import Rule
+from rich.text import Text
+from utils import looks_like_code
+
+# Completed lines are frozen (highlighted once) in chunks of at least this many
+FREEZE_AFTER_LINES = 16
+# Settled lines are printed above the REPL prompt at most this often, so frames are coalesced
+REFRESH_PER_SECOND = 4
+
+
+def print_settled(console, view, final=False):
+    """Print the lines view has settled since the last frame, timing it as render work"""
+    start = time.perf_counter()
+    lines = view.settled(final)
+    if lines is not None:
+        console.print(lines)
+    view.render_seconds += time.perf_counter() - start
+
+
+class CodeFenceTracker:
+    """Incrementally extracts code from a streamed response.
+
+    Mirrors parse_fenced_code/extract_pure_code: the body of the first fenced
+    block if there is one, otherwise the lines that look like code. Each
+    delta is processed once; only the unfinished last line is re-examined.
+    """
+    BEFORE, IN_CODE, AFTER = "before", "in_code", "after"
+
+    def __init__(self, extract_code=True):
+        self.extract_code = extract_code
+        self.state = self.BEFORE
+        self.lines = []
+        self.partial = ""
+        # Bumped whenever already emitted lines are discarded (prose before a fence)
+        self.generation = 0
+        self._seen_code = False
+
+    def feed(self, delta):
+        if not delta:
+            return
+        pieces = (self.partial + delta).split("\n")
+        self.partial = pieces.pop()
+        for line in pieces:
+            self._consume(line)
+
+    def _consume(self, line):
+        if not self.extract_code:
+            self.lines.append(line)
+            return
+
+        is_fence = line.strip().startswith("```")
+        if self.state == self.BEFORE:
+            if is_fence:
+                # Everything so far was prose; the code block starts here
+                self.state = self.IN_CODE
+                self.lines = []
+                self.generation += 1
+            elif looks_like_code(line):
+                self._seen_code = True
+                self.lines.append(line)
+            elif self._seen_code and not line.strip():
+                self.lines.append(line)
+        elif self.state == self.IN_CODE:
+            if is_fence:
+                self.state = self.AFTER
+            else:
+                self.lines.append(line)
+
+    def tail(self):
+        """The unfinished last line, if it belongs in the display"""
+        if not self.partial or self.state == self.AFTER:
+            return None
+        if self.extract_code and self.partial.lstrip().startswith("`"):
+            return None
+        if self.extract_code and self.state == self.BEFORE and not looks_like_code(self.partial):
+            return None
+        return self.partial
+
+
+class StreamingCodePanel:
+    """View of a streamed code response for print_settled.
+
+    Tokens are fed as deltas and only update the fence tracker; highlighting
+    happens once per frame, so frames are coalesced. Completed lines are
+    highlighted once, in chunks, as they settle; the unfinished last line is
+    highlighted only in the final frame.
+    """
+    def __init__(self, title, border_style, lexer="python", extract_code=True, theme="monokai"):
+        from rich.syntax import Syntax
+
+        self.title = title
+        self.border_style = border_style
+        self.tracker = CodeFenceTracker(extract_code=extract_code)
+        self._highlighter = Syntax("", lexer, theme=theme)
+        self._lock = threading.Lock()
+        self._frozen = []
+        self._generation = 0
+        self._printed = 0
+        self.tokens = 0
+        self.frames = 0
+        self.feed_seconds = 0.0
+        self.render_seconds = 0.0
+
+    def feed(self, delta):
+        start = time.perf_counter()
+        with self._lock:
+            self.tracker.feed(delta)
+            self.tokens += 1
+        self.feed_seconds += time.perf_counter() - start
+
+    def _highlight(self, lines, first_number):
+        """Highlight lines, returning one line-numbered Text per line"""
+        highlighted = self._highlighter.highlight("\n".join(lines)).split("\n", allow_blank=True)
+        numbered = []
+        for offset, line in enumerate(highlighted[:len(lines)]):
+            text = Text(f"{first_number + offset:>4} ", style="dim")
+            text.append_text(line)
+            numbered.append(text)
+        return numbered
+
+    def _freeze(self, lines):
+        """Highlight settled lines once, cutting at a top-level line so lexer state is clean"""
+        pending = lines[len(self._frozen):]
+        if len(pending) < FREEZE_AFTER_LINES:
+            return
+        cut = None
+        for index in range(len(pending) - 1, 0, -1):
+            line = pending[index]
+            if line and not line[0].isspace():
+                cut = index
+                break
+        if cut is None:
+            return
+        self._frozen.extend(self._highlight(pending[:cut], len(self._frozen) + 1))
+
+    def header(self):
+        return Rule(self.title, style=self.border_style, align="left")
+
+    def settled(self, final=False):
+        """Highlighted lines completed since the last call, as one Text, or None.
+
+        While the tracker may still drop lines (prose before an opening
+        fence) nothing is released; final=True releases everything left,
+        including the unfinished last line.
+        """
+        with self._lock:
+            if self.tracker.extract_code and self.tracker.state == CodeFenceTracker.BEFORE and not final:
+                return None
+            if self.tracker.generation != self._generation:
+                self._frozen = []
+                self._generation = self.tracker.generation
+            lines = self.tracker.lines
+            if final:
+                tail = self.tracker.tail()
+                rest = lines[len(self._frozen):] + ([tail] if tail is not None else [])
+                if rest:
+                    self._frozen.extend(self._highlight(rest, len(self._frozen) + 1))
+            else:
+                self._freeze(lines)
+            new = self._frozen[self._printed:]
+            self._printed = len(self._frozen)
+        self.frames += 1
+        return Text("\n").join(new) if new else None
+
+    def text(self):
+        """The code extracted so far"""
+        with self._lock:
+            tail = self.tracker.tail()
+            return "\n".join(self.tracker.lines + ([tail] if tail is not None else []))
+
+    def cpu_per_token(self):
+        """Seconds of feed plus print_settled work per streamed token"""
+        if not self.tokens:
+            return 0.0
+        return (self.feed_seconds + self.render_seconds) / self.tokens
+
+
+class StreamingTextPanel:
+    """View of streamed chat text for print_settled; deltas are joined only when a frame is drawn"""
+    def __init__(self, title, border_style, subtitle=None):
+        self.title = title
+        self.border_style = border_style
+        self.subtitle = subtitle
+        self._chunks = []
+        self._text = ""
+        self._joined = 0
+        self._printed = 0
+        self._lock = threading.Lock()
+        self.tokens = 0
+        self.frames = 0
+        self.feed_seconds = 0.0
+        self.render_seconds = 0.0
+
+    def feed(self, delta):
+        start = time.perf_counter()
+        with self._lock:
+            self._chunks.append(delta)
+            self.tokens += 1
+        self.feed_seconds += time.perf_counter() - start
+
+    def text(self):
+        with self._lock:
+            if self._joined != len(self._chunks):
+                self._text += "".join(self._chunks[self._joined:])
+                self._joined = len(self._chunks)
+            return self._text
+
+    def header(self):
+        return Rule(self.title, style=self.border_style, align="left")
+
+    def footer(self):
+        return Rule(self.subtitle or "", style=self.border_style, align="right")
+
+    def settled(self, final=False):
+        """Text of the lines completed since the last call (with final=True, everything left), or None"""
+        text = self.text()
+        end = len(text) if final else text.rfind("\n") + 1
+        if end <= self._printed:
+            return None
+        # The newline ending the block is left to print()
+        new = text[self._printed:end]
+        self._printed = end
+        self.frames += 1
+        return Text(new[:-1] if new.endswith("\n") else new)
@@ -0,0 +1,124 @@
+import re
+import threading
+import time
+from array import array
+from types import SimpleNamespace
+
+_TOKEN_RE = re.compile(r"\s+|\w+|[^\w\s]")
+# One vocabulary for every stub, as instances of one model file share theirs (saved token ids stay valid)
+_VOCAB = {}
+_WORDS = []
+_VOCAB_LOCK = threading.Lock()
+
+
+class StubLlama:
+    """Deterministic stand-in for llama_cpp.Llama, for tests and benchmarks.
+
+    Implements the parts of the Llama API that AIHandler uses. Text is split
+    into word/whitespace/punctuation tokens, and replies come from `reply`,
+    which is either a fixed string or a callable taking the message list.
+    Optional per-token delays simulate prompt evaluation and decoding. Like
+    llama.cpp, a prompt sharing a prefix with the previous context only
+    evaluates the new tokens (reused_tokens counts the rest).
+    """
+    def __init__(self, reply="Hello from the stub model.", n_ctx=4096,
+                 prompt_seconds_per_token=0.0, decode_seconds_per_token=0.0):
+        self.reply = reply
+        self._n_ctx = n_ctx
+        self.prompt_seconds_per_token = prompt_seconds_per_token
+        self.decode_seconds_per_token = decode_seconds_per_token
+        self.model_path = "stub"
+        self.n_tokens = 0
+        self.reused_tokens = 0
+        self.calls = []
+        self._input_ids = []
+
+    def n_ctx(self):
+        return self._n_ctx
+
+    def tokenize(self, text, add_bos=True, special=False):
+        if isinstance(text, bytes):
+            text = text.decode("utf-8", errors="ignore")
+        ids = [0] if add_bos else []
+        for piece in _TOKEN_RE.findall(text):
+            if piece not in _VOCAB:
+                with _VOCAB_LOCK:
+                    if piece not in _VOCAB:
+                        _VOCAB[piece] = len(_WORDS) + 1
+                        _WORDS.append(piece)
+            ids.append(_VOCAB[piece])
+        return ids
+
+    def detokenize(self, tokens, prev_tokens=None):
+        return "".join(_WORDS[token - 1] for token in tokens if token > 0).encode("utf-8")
+
+    def reset(self):
+        self.n_tokens = 0
+        self._input_ids = []
+
+    def save_state(self):
+        # The "state data" is just the token ids; there is no KV cache to copy
+        data = array("i", self._input_ids).tobytes()
+        return SimpleNamespace(
+            input_ids=list(self._input_ids), scores=None, n_tokens=len(self._input_ids), llama_state=data, llama_state_size=len(data)
+        )
+
+    def load_state(self, state):
+        tokens = array("i")
+        tokens.frombytes(state.llama_state)
+        if tokens.tolist() != list(state.input_ids)[:state.n_tokens]:
+            raise RuntimeError("Failed to set llama state data")
+        self._input_ids = tokens.tolist()
+        self.n_tokens = state.n_tokens
+
+    def _prompt_text(self, messages):
+        return "".join(f"<|im_start|>{m['role']}\n{m['content']}<|im_end|>\n" for m in messages)
+
+    def _reply_for(self, messages):
+        return self.reply(messages) if callable(self.reply) else self.reply
+
+    def _generate(self, messages, max_tokens, stop):
+        prompt_tokens = self.tokenize(self._prompt_text(messages))
+        # llama.cpp rejects a prompt that fills the context and shortens replies to the space left
+        if len(prompt_tokens) >= self._n_ctx:
+            raise ValueError(f"Requested tokens ({len(prompt_tokens)}) exceed context window of {self._n_ctx}")
+        max_tokens = min(max_tokens, self._n_ctx - len(prompt_tokens))
+        reused = 0
+        for previous, token in zip(self._input_ids, prompt_tokens[:-1]):
+            if previous != token:
+                break
+            reused += 1
+        self.reused_tokens = reused
+        if self.prompt_seconds_per_token:
+            time.sleep(self.prompt_seconds_per_token * (len(prompt_tokens) - reused))
+        self.n_tokens = len(prompt_tokens)
+        self._input_ids = list(prompt_tokens)
+
+        text = self._reply_for(messages)
+        for sequence in stop or []:
+            if sequence in text:
+                text = text[:text.index(sequence)]
+        pieces = _TOKEN_RE.findall(text)
+        finish_reason = "length" if len(pieces) > max_tokens else "stop"
+        for piece in pieces[:max_tokens]:
+            if self.decode_seconds_per_token:
+                time.sleep(self.decode_seconds_per_token)
+            self.n_tokens += 1
+            self._input_ids.extend(self.tokenize(piece, add_bos=False))
+            yield piece
+        self._finish_reason = finish_reason
+
+    def create_chat_completion(self, messages, max_tokens=2048, temperature=0.8, stop=None, stream=False, **kwargs):
+        self.calls.append({"messages": messages, "max_tokens": max_tokens, "temperature": temperature, "stop": stop, **kwargs})
+        if stream:
+            return self._stream(messages, max_tokens, stop)
+        text = "".join(self._generate(messages, max_tokens, stop))
+        return {
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": self._finish_reason}],
+        }
+
+    def _stream(self, messages, max_tokens, stop):
+        yield {"choices": [{"index": 0, "delta": {"role": "assistant"}, "finish_reason": None}]}
+        for piece in self._generate(messages, max_tokens, stop):
+            yield {"choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}]}
+        yield {"choices": [{"index": 0, "delta": {}, "finish_reason": self._finish_reason}]}
@@ -0,0 +1,123 @@
+import json
+import math
+import os
+import threading
+import time
+from collections import deque
+
+# Requests kept in memory for `stats`
+DEFAULT_CAPACITY = 256
+
+
+def percentile(values, share):
+    """Nearest-rank percentile of values (share between 0 and 1), or None when empty"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = min(max(math.ceil(share * len(ordered)), 1), len(ordered))
+    return ordered[rank - 1]
+
+
+def request_record(event, grammar=None):
+    """Metrics for one completed request, from its final StreamEvent"""
+    ttft = event.time_to_first_token
+    prompt_eval = event.prompt_eval_time if event.prompt_eval_time is not None else ttft
+    # Decoding starts once the first token is out; the first token is part of prompt evaluation
+    decode_seconds = event.elapsed - (ttft or 0.0)
+    decode_tokens = max(event.completion_tokens - 1, 0)
+    return {
+        "prompt_tokens": event.prompt_tokens,
+        "completion_tokens": event.completion_tokens,
+        "ttft_ms": round(ttft * 1000, 2) if ttft is not None else None,
+        "prompt_eval_ms": round(prompt_eval * 1000, 2) if prompt_eval is not None else None,
+        "decode_tokens_per_sec": round(decode_tokens / decode_seconds, 2) if decode_tokens and decode_seconds > 0 else None,
+        "total_ms": round(event.elapsed * 1000, 2),
+        "finish_reason": event.finish_reason,
+        "cached": event.cached,
+        "grammar": grammar,
+        "stopped_by": event.stopped_by,
+        "tokens_saved": event.tokens_saved,
+    }
+
+
+class Telemetry:
+    """Per-request inference metrics for the session.
+
+    Records are kept in a ring buffer of the last `capacity` requests and,
+    when trace_path is set (JUNO_TRACE), appended to a JSONL file as they
+    complete. Figures measured after a request finishes (e.g. the REPL's
+    render time) are attached with annotate(), which adds a line carrying
+    the same id to the trace.
+    """
+    def __init__(self, capacity=DEFAULT_CAPACITY, trace_path=None):
+        self.records = deque(maxlen=capacity)
+        self.trace_path = trace_path
+        self._lock = threading.Lock()
+        self._next_id = 1
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            capacity=int(os.getenv("JUNO_TELEMETRY_SIZE", DEFAULT_CAPACITY)),
+            trace_path=os.getenv("JUNO_TRACE") or None,
+        )
+
+    def record(self, fields):
+        """Store one request's metrics, returning the stored record"""
+        with self._lock:
+            record = {"id": self._next_id, "time": round(time.time(), 3), **fields}
+            self._next_id += 1
+            self.records.append(record)
+        self._trace(record)
+        return record
+
+    def annotate(self, **fields):
+        """Add fields to the most recent request"""
+        with self._lock:
+            if not self.records:
+                return
+            record = self.records[-1]
+            record.update(fields)
+        self._trace({"id": record["id"], **fields})
+
+    def _trace(self, line):
+        if not self.trace_path:
+            return
+        try:
+            with open(self.trace_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(line) + "\n")
+        except OSError:
+            # A trace that cannot be written must not break a request
+            self.trace_path = None
+
+    def values(self, field, include_cached=False):
+        with self._lock:
+            return [
+                record[field] for record in self.records
+                if record.get(field) is not None and (include_cached or not record.get("cached"))
+            ]
+
+    def summary(self):
+        """p50/p95 of each latency and rate over the session, plus counts"""
+        with self._lock:
+            records = list(self.records)
+        rows = {}
+        for field in ("ttft_ms", "prompt_eval_ms", "decode_tokens_per_sec", "total_ms", "render_ms", "prompt_tokens"):
+            # Replays from the response cache would flatter the model's latencies; render time is real either way
+            values = self.values(field, include_cached=field == "render_ms")
+            if values:
+                rows[field] = {"p50": percentile(values, 0.5), "p95": percentile(values, 0.95), "count": len(values)}
+        finish = {}
+        for record in records:
+            reason = record.get("finish_reason") or "unknown"
+            finish[reason] = finish.get(reason, 0) + 1
+        early = [record for record in records if record.get("stopped_by") not in (None, "cancelled")]
+        return {
+            "requests": len(records),
+            "cache_hits": sum(1 for record in records if record.get("cached")),
+            "cancelled": sum(1 for record in records if record.get("stopped_by") == "cancelled"),
+            "early_stops": len(early),
+            "tokens_saved": sum(record.get("tokens_saved") or 0 for record in early),
+            "finish_reasons": finish,
+            "metrics": rows,
+        }
@@ -0,0 +1,297 @@
+import argparse
+import json
+import os
+import platform
+import time
+from rich.console import Console
+from response_cache import model_identity
+
+console = Console()
+
+DEFAULT_PROFILE_PATH = os.path.join(os.path.expanduser("~"), ".cache", "juno", "tuning.json")
+BATCH_SIZES = (128, 256, 512, 1024)
+PREFILL_TOKENS = 512
+DECODE_TOKENS = 32
+# A larger thread count or batch must beat the best so far by this much to be chosen; fewer threads leave the machine responsive
+MIN_GAIN = 0.03
+
+# Llama() parameters the profile can set, with the values used when neither env nor profile does
+DEFAULTS = {
+    "n_threads": 4,
+    "n_threads_batch": None,
+    "n_batch": 512,
+    "n_gpu_layers": 30,
+    "use_mlock": False,
+    "use_mmap": True,
+}
+ENV_VARS = {
+    "n_threads": "N_THREADS",
+    "n_threads_batch": "N_THREADS_BATCH",
+    "n_batch": "N_BATCH",
+    "n_gpu_layers": "N_GPU_LAYERS",
+    "use_mlock": "USE_MLOCK",
+    "use_mmap": "USE_MMAP",
+}
+
+
+def parse_cpuinfo(text):
+    """Number of physical cores (distinct package/core id pairs) in /proc/cpuinfo text, or None"""
+    cores = set()
+    package = core = None
+    for line in text.splitlines() + [""]:
+        key, _, value = line.partition(":")
+        key = key.strip()
+        if key == "physical id":
+            package = value.strip()
+        elif key == "core id":
+            core = value.strip()
+        elif not line.strip():
+            if core is not None:
+                cores.add((package, core))
+            package = core = None
+    return len(cores) or None
+
+
+def cpu_topology():
+    """Logical CPUs, physical cores and the CPUs this process may run on"""
+    logical = os.cpu_count() or 1
+    try:
+        available = len(os.sched_getaffinity(0))
+    except AttributeError:
+        available = logical
+    try:
+        with open("/proc/cpuinfo", "r", encoding="utf-8") as f:
+            physical = parse_cpuinfo(f.read())
+    except OSError:
+        physical = None
+    physical = min(physical or logical, available)
+    return {"logical": logical, "physical": physical, "available": available}
+
+
+def thread_candidates(topology):
+    """Thread counts worth measuring: fractions of the physical cores, all cores and all CPUs"""
+    physical, available = topology["physical"], topology["available"]
+    counts = {max(physical // 4, 1), max(physical // 2, 1), max(physical * 3 // 4, 1), physical, available}
+    return sorted(count for count in counts if count <= available)
+
+
+def profile_key(model_path):
+    """Profiles are per host and per model file (path, size and mtime)"""
+    return f"{platform.node()}|{model_identity(model_path)}"
+
+
+def _read_profiles(path):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def load_profile(model_path, path=None):
+    return _read_profiles(path or DEFAULT_PROFILE_PATH).get(profile_key(model_path))
+
+
+def save_profile(model_path, profile, path=None):
+    path = path or DEFAULT_PROFILE_PATH
+    profiles = _read_profiles(path)
+    profiles[profile_key(model_path)] = profile
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(profiles, f, indent=2)
+    return path
+
+
+def _parse(raw, default):
+    if isinstance(default, bool):
+        return raw.lower() in ("1", "true", "yes")
+    return int(raw)
+
+
+def runtime_params(model_path, path=None):
+    """Llama() keyword arguments: env vars first, then the tuned profile, then the defaults"""
+    profile = load_profile(model_path, path) or {}
+    params = {}
+    for name, default in DEFAULTS.items():
+        raw = os.getenv(ENV_VARS[name])
+        if raw:
+            params[name] = _parse(raw, default if default is not None else 0)
+        elif profile.get(name) is not None:
+            params[name] = profile[name]
+        elif default is not None:
+            params[name] = default
+    return params
+
+
+def _set_threads(llm, n_threads, n_threads_batch):
+    llm.n_threads, llm.n_threads_batch = n_threads, n_threads_batch
+    context = getattr(llm, "_ctx", None)
+    if context is not None:
+        context.set_n_threads(n_threads, n_threads_batch)
+
+
+def measure_prefill(llm, tokens, n_threads, n_batch):
+    """Prompt evaluation speed in tokens/sec"""
+    _set_threads(llm, n_threads, n_threads)
+    llm.n_batch = n_batch
+    llm.reset()
+    start = time.perf_counter()
+    llm.eval(tokens)
+    return len(tokens) / (time.perf_counter() - start)
+
+
+def measure_decode(llm, tokens, n_threads, count=DECODE_TOKENS):
+    """Single-token evaluation speed in tokens/sec, after a short prompt"""
+    _set_threads(llm, n_threads, n_threads)
+    llm.reset()
+    llm.eval(tokens[:16])
+    start = time.perf_counter()
+    for token in tokens[16:16 + count]:
+        llm.eval([token])
+    return count / (time.perf_counter() - start)
+
+
+def _best(results):
+    """The first (smallest) setting that no later one beats by more than MIN_GAIN"""
+    best_setting, best_speed = results[0]
+    for setting, speed in results[1:]:
+        if speed > best_speed * (1 + MIN_GAIN):
+            best_setting, best_speed = setting, speed
+    return best_setting, best_speed
+
+
+def tune(llm, tokens, threads, batch_sizes=BATCH_SIZES, decode_tokens=DECODE_TOKENS, progress=None):
+    """Sweep thread counts and batch sizes on a loaded model.
+
+    Decoding and prompt evaluation are tuned separately (llama.cpp takes a
+    thread count for each), then the batch size is tuned for prompt
+    evaluation at its best thread count. Returns (profile, measurements).
+    """
+    progress = progress or (lambda label: None)
+    # The first evaluation pays for paging the weights in; keep it out of the measurements
+    measure_prefill(llm, tokens[:64], threads[-1], batch_sizes[0])
+    measurements = []
+
+    decode = []
+    for count in threads:
+        progress(f"decode, {count} threads")
+        decode.append((count, measure_decode(llm, tokens, count, decode_tokens)))
+        measurements.append(("decode", count, None, decode[-1][1]))
+    n_threads, decode_speed = _best(decode)
+
+    prefill = []
+    default_batch = DEFAULTS["n_batch"] if DEFAULTS["n_batch"] in batch_sizes else batch_sizes[-1]
+    for count in threads:
+        progress(f"prefill, {count} threads")
+        prefill.append((count, measure_prefill(llm, tokens, count, default_batch)))
+        measurements.append(("prefill", count, default_batch, prefill[-1][1]))
+    n_threads_batch, _ = _best(prefill)
+
+    batches = []
+    for size in batch_sizes:
+        progress(f"prefill, batch {size}")
+        batches.append((size, measure_prefill(llm, tokens, n_threads_batch, size)))
+        measurements.append(("prefill", n_threads_batch, size, batches[-1][1]))
+    n_batch, prefill_speed = _best(batches)
+
+    profile = {
+        "n_threads": n_threads,
+        "n_threads_batch": n_threads_batch,
+        "n_batch": n_batch,
+        "decode_tokens_per_sec": round(decode_speed, 2),
+        "prefill_tokens_per_sec": round(prefill_speed, 2),
+        "tuned_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+    return profile, measurements
+
+
+def memory_settings(model_path, llama_cpp):
+    """mmap stays on; mlock only when the model fits comfortably in RAM and the limit allows it"""
+    settings = {"use_mmap": True, "use_mlock": False}
+    if not llama_cpp.llama_supports_gpu_offload():
+        settings["n_gpu_layers"] = 0
+    try:
+        import resource
+        size = os.path.getsize(model_path)
+        ram = os.sysconf("SC_PHYS_PAGES") * os.sysconf("SC_PAGE_SIZE")
+        limit = resource.getrlimit(resource.RLIMIT_MEMLOCK)[0]
+    except (ImportError, OSError, ValueError, AttributeError):
+        return settings
+    fits_limit = limit == resource.RLIM_INFINITY or limit >= size
+    settings["use_mlock"] = bool(llama_cpp.llama_supports_mlock() and size < ram / 2 and fits_limit)
+    return settings
+
+
+def _sample_tokens(llm, count):
+    from benchmark import synthetic_code
+    tokens = llm.tokenize(synthetic_code(count).encode("utf-8"), add_bos=False)
+    return tokens[:count]
+
+
+def tune_main(argv):
+    """Entry point for `python src/main.py tune ...`"""
+    from rich.table import Table
+
+    parser = argparse.ArgumentParser(prog="juno tune", description="Measure llama.cpp thread and batch settings for this machine")
+    parser.add_argument("--quick", action="store_true", help="Fewer thread counts, batch sizes and tokens")
+    parser.add_argument("--profiles", default=DEFAULT_PROFILE_PATH, help="Where tuned profiles are stored")
+    args = parser.parse_args(argv)
+
+    from ai_handler import DEFAULT_MODEL_PATH, show_model_help
+    model_path = os.getenv("MODEL_PATH", DEFAULT_MODEL_PATH)
+    if not os.path.exists(model_path):
+        show_model_help(model_path)
+        return 1
+
+    import llama_cpp
+    topology = cpu_topology()
+    threads = thread_candidates(topology)
+    batch_sizes = BATCH_SIZES
+    prefill_tokens = PREFILL_TOKENS
+    if args.quick:
+        threads = sorted({threads[len(threads) // 2], threads[-1]})
+        batch_sizes = (256, 512)
+        prefill_tokens = 256
+    console.print(
+        f"[cyan]🖥 {topology['physical']} physical cores, {topology['logical']} logical CPUs "
+        f"({topology['available']} available); trying {', '.join(map(str, threads))} threads[/cyan]"
+    )
+
+    settings = memory_settings(model_path, llama_cpp)
+    gpu_layers = settings.get("n_gpu_layers", runtime_params(model_path, args.profiles)["n_gpu_layers"])
+    with console.status("[cyan]⏳ Loading model...[/cyan]"):
+        llm = llama_cpp.Llama(
+            model_path=model_path,
+            n_ctx=max(prefill_tokens * 2, 1024),
+            n_batch=max(batch_sizes),
+            n_threads=threads[-1],
+            n_gpu_layers=gpu_layers,
+            use_mmap=settings["use_mmap"],
+            verbose=False,
+        )
+    tokens = _sample_tokens(llm, prefill_tokens)
+    with console.status("[cyan]⏱ Tuning...[/cyan]") as status:
+        profile, measurements = tune(
+            llm, tokens, threads, batch_sizes,
+            progress=lambda label: status.update(f"[cyan]⏱ Tuning: {label}...[/cyan]"),
+        )
+    profile.update(settings)
+    profile["cpu"] = topology
+
+    table = Table(title="⏱ Tuning runs", show_header=True, header_style="bold magenta")
+    table.add_column("Phase", style="cyan")
+    table.add_column("Threads", justify="right")
+    table.add_column("Batch", justify="right")
+    table.add_column("Tokens/s", justify="right")
+    for phase, count, batch, speed in measurements:
+        table.add_row(phase, str(count), str(batch or "-"), f"{speed:.1f}")
+    console.print(table)
+
+    path = save_profile(model_path, profile, args.profiles)
+    console.print(
+        f"[green]✅ Saved profile for {os.path.basename(model_path)}: {profile['n_threads']} threads "
+        f"({profile['n_threads_batch']} for prompts), batch {profile['n_batch']}, "
+        f"mlock {'on' if profile['use_mlock'] else 'off'} → {path}[/green]"
+    )
+    console.print("[dim]N_THREADS, N_THREADS_BATCH, N_BATCH, N_GPU_LAYERS, USE_MLOCK and USE_MMAP still override it.[/dim]")
+    return 0
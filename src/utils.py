@@ -1,7 +1,5 @@
 from rich.console import Console
 from rich.panel import Panel
-from rich.syntax import Syntax
-from rich.table import Table
 import re
 
 console = Console()
@@ -19,6 +17,8 @@ def show_banner():
     )
 
 def show_help():
+    from rich.table import Table
+    
     table = Table(title="Available Commands", show_header=True, header_style="bold blue")
     table.add_column("Command", style="yellow", no_wrap=True)
     table.add_column("Description", style="white")
@@ -26,9 +26,19 @@ def show_help():
     table.add_row("load <file_path> or @<prefix>", "Load a file to work with")
     # table.add_row("load ", "Show files starting with prefix (press Tab)")
     table.add_row("save", "Save changes to the current file")
-    table.add_row("show", "Show the current file content")
-    table.add_row("edit <instruction>", "Update the file using AI (file must be loaded)")
+    table.add_row("show \\[N | N-M]", "Show the current file a page at a time, or lines N-M")
+    table.add_row("edit <instruction>", "Update the file using AI (file must be loaded); runs as a background job")
+    table.add_row("jobs", "List queued, running and recent AI jobs")
+    table.add_row("cancel \\[N | all]", "Cancel the running job, job N, or every job (Ctrl-C also stops the running job)")
+    table.add_row("undo / redo", "Step back or forward through the edits of the loaded file")
+    table.add_row("history", "List the versions of the loaded file")
+    table.add_row("diff \\[N]", "Show the changes from version N (default: the previous one) to the current text")
     table.add_row("clear", "Clear the current file from memory")
+    table.add_row("cache \\[on|off|clear]", "Show response cache stats, bypass it, or clear it")
+    table.add_row("memory \\[clear]", "Show or forget the conversation history")
+    table.add_row("stats", "Show p50/p95 request latencies for this session")
+    table.add_row("snapshot", "Save the session: loaded file, unsaved changes, history and the model's evaluated context (also done on exit)")
+    table.add_row("resume", "Restore the saved session of this project without re-evaluating its prompts")
     table.add_row("help", "Show this help message")
     table.add_row("quit", "Exit the program")
     # table.add_row("<any other text>", "Chat with the AI (general purpose)")
@@ -39,6 +49,12 @@ def show_help():
     # console.print("- Type anything else to chat with the AI normally")
     # console.print("- Use 'load @prefix' + Tab to see file suggestions")
 
+def looks_like_code(line):
+    """Heuristic used when the model answers without a code fence"""
+    return (line.strip().startswith(('#', 'def ', 'import ', 'from ', 'class ')) or
+            '=' in line or ':' in line or '(' in line or ')' in line or
+            'return ' in line or 'print(' in line)
+
 def extract_pure_code(text):
     """Extract only the code from the model's response, removing explanations and markdown"""
     
@@ -54,9 +70,7 @@ def extract_pure_code(text):
     
     for line in lines:
         # Look for lines that contain Python code patterns
-        if (line.strip().startswith(('#', 'def ', 'import ', 'from ', 'class ')) or
-            '=' in line or ':' in line or '(' in line or ')' in line or
-            'return ' in line or 'print(' in line):
+        if looks_like_code(line):
             code_lines.append(line)
         # Skip empty lines at the beginning
         elif code_lines and not line.strip():
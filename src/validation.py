@@ -0,0 +1,183 @@
+import ast
+import os
+import shlex
+import shutil
+import subprocess
+import tempfile
+from concurrent.futures import ThreadPoolExecutor, wait
+
+# Seconds a check command may run before it counts as failed
+CHECK_TIMEOUT = 60
+# Edits generated per request; each is checked while the next one is written, and the first to pass wins
+EDIT_CANDIDATES = int(os.getenv("EDIT_CANDIDATES", 1))
+# Repair prompts sent when an edit fails its checks
+EDIT_RETRIES = int(os.getenv("EDIT_RETRIES", 2))
+# Lines of a failing command's output passed back to the model
+MAX_ERROR_LINES = 20
+
+PYTHON_EXTENSIONS = (".py", ".pyw", ".pyi")
+
+
+def is_python(path):
+    # Without a file name the code is whatever the REPL was editing, which it treats as Python
+    return path is None or path.lower().endswith(PYTHON_EXTENSIONS)
+
+
+def syntax_error(code, filename="<edit>"):
+    """The first error from parsing and compiling code, or None.
+
+    Compiling the tree also catches errors the parser lets through, such as
+    `return` outside a function.
+    """
+    try:
+        compile(ast.parse(code, filename), filename, "exec", dont_inherit=True)
+    except (SyntaxError, ValueError) as e:
+        line = getattr(e, "lineno", None)
+        text = (getattr(e, "text", None) or "").strip()
+        where = f"line {line}: " if line else ""
+        return f"{where}{getattr(e, 'msg', str(e))}" + (f"\n    {text}" if text else "")
+    return None
+
+
+def _tail(output, limit=MAX_ERROR_LINES):
+    lines = output.strip().splitlines()
+    if len(lines) > limit:
+        lines = ["..."] + lines[-limit:]
+    return "\n".join(lines)
+
+
+class Validator:
+    """Checks edited code: a syntax check, then optional shell commands.
+
+    commands are shell command lines run from the current directory, in
+    parallel; `{file}` is replaced by a temporary copy of the candidate
+    (under the edited file's name), and a command fails when it exits
+    non-zero or runs past timeout. check() returns the failed checks as
+    {name: error}; submit() runs it on a worker thread, so candidates are
+    validated while the model is still generating the next one.
+    """
+    def __init__(self, commands=(), timeout=CHECK_TIMEOUT, workers=None):
+        self.commands = [command for command in commands if command.strip()]
+        self.timeout = timeout
+        self.workers = workers or min(os.cpu_count() or 1, 8)
+        self._runs = None
+        self._pool = None
+
+    @classmethod
+    def from_env(cls):
+        """EDIT_CHECKS holds the commands, separated by `;`"""
+        commands = [command.strip() for command in os.getenv("EDIT_CHECKS", "").split(";")]
+        return cls(commands, timeout=float(os.getenv("EDIT_CHECK_TIMEOUT", CHECK_TIMEOUT)))
+
+    def check(self, code, path=None):
+        name = os.path.basename(path) if path else "<edit>"
+        if is_python(path):
+            error = syntax_error(code, name)
+            if error:
+                # Nothing else can pass on code that does not parse
+                return {"syntax": error}
+        if not self.commands:
+            return {}
+
+        directory = tempfile.mkdtemp(prefix="juno-check-")
+        try:
+            copy = os.path.join(directory, os.path.basename(path) if path else "edit.py")
+            with open(copy, "w", encoding="utf-8") as f:
+                f.write(code)
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.workers)
+            results = self._pool.map(lambda command: self._run(command, copy, path), self.commands)
+            return {command: error for command, error in zip(self.commands, results) if error}
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+
+    def _run(self, command, copy, path):
+        try:
+            result = subprocess.run(
+                command.replace("{file}", shlex.quote(copy)), shell=True,
+                capture_output=True, text=True, timeout=self.timeout,
+            )
+        except subprocess.TimeoutExpired:
+            return f"timed out after {self.timeout:g}s"
+        if result.returncode == 0:
+            return None
+        output = result.stdout + result.stderr
+        # Report the user's file rather than the temporary copy
+        output = output.replace(copy, path or "edit.py")
+        return _tail(output) or f"exited with status {result.returncode}"
+
+    def submit(self, code, path=None):
+        """check() on a worker thread, returning a Future"""
+        if self._runs is None:
+            self._runs = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="juno-check")
+        return self._runs.submit(self.check, code, path)
+
+
+def new_failures(failures, known):
+    """Failures except the checks that already failed before the edit"""
+    return {name: error for name, error in failures.items() if name not in known}
+
+
+def fix_instruction(instruction, failures):
+    """Repair prompt for an edit whose result failed its checks"""
+    errors = "\n\n".join(f"{name}:\n{error}" for name, error in failures.items())
+    return (
+        f"The code was just edited for this instruction: {instruction}\n\n"
+        f"The result fails these checks:\n{errors}\n\nFix the code so the checks pass, keeping the intended change."
+    )
+
+
+def _first_passing(candidates, known, block):
+    """The earliest generated (code, failures) that passes, or None; block waits for every check"""
+    futures = [future for _, future in candidates]
+    if block:
+        wait(futures)
+    for code, future in candidates:
+        if future.done() and not new_failures(future.result(), known):
+            return code, {}
+    return None
+
+
+def validated_edit(generate, instruction, code, validator, path=None, candidates=1, retries=EDIT_RETRIES, report=None):
+    """Generate an edit, validate it and ask for repairs until it passes.
+
+    generate(instruction, code, attempt) returns the edited code or None;
+    attempt numbers the candidates from 0 and is None for repair prompts.
+    Up to `candidates` edits are generated one after another, each checked
+    in the background while the next is generated, stopping at the first
+    that passes. Checks that already fail on the original code are ignored.
+    Returns (code, failures): failures is empty when code passed, and code
+    is None when nothing could be generated.
+    """
+    report = report or (lambda message: None)
+    baseline = validator.submit(code, path)
+    generated = []
+    for attempt in range(max(candidates, 1)):
+        if generated and baseline.done() and _first_passing(generated, baseline.result(), block=False):
+            break
+        updated = generate(instruction, code, attempt)
+        if updated is not None:
+            generated.append((updated, validator.submit(updated, path)))
+    if not generated:
+        return None, {}
+
+    known = baseline.result()
+    passing = _first_passing(generated, known, block=True)
+    if passing:
+        if len(generated) > 1:
+            index = next(index for index, (updated, _) in enumerate(generated) if updated is passing[0])
+            report(f"Candidate {index + 1} of {len(generated)} passed the checks")
+        return passing
+    updated, future = generated[0]
+    failures = new_failures(future.result(), known)
+    for retry in range(retries):
+        report(f"Checks failed ({', '.join(failures)}); asking for a fix ({retry + 1}/{retries})")
+        fixed = generate(fix_instruction(instruction, failures), updated, None)
+        if fixed is None:
+            break
+        updated = fixed
+        failures = new_failures(validator.check(updated, path), known)
+        if not failures:
+            break
+    return updated, failures
+
@@ -0,0 +1,182 @@
+import difflib
+import os
+import time
+
+# Memory kept for the versions of one file; the oldest are dropped first
+EDIT_HISTORY_BYTES = int(float(os.getenv("EDIT_HISTORY_MB", 32)) * 1024 * 1024)
+# Every Nth version is stored whole, so rebuilding any version applies at most N-1 deltas
+CHECKPOINT_EVERY = 16
+
+
+def line_delta(old, new):
+    """Reversible line-level delta from old to new (lists of lines) as (old start, new start, old lines, new lines) hunks.
+
+    The common prefix and suffix are cut off first, so an edit of a few
+    lines in a large file only compares the lines around the change.
+    """
+    start = 0
+    limit = min(len(old), len(new))
+    while start < limit and old[start] == new[start]:
+        start += 1
+    end = 0
+    while end < limit - start and old[len(old) - 1 - end] == new[len(new) - 1 - end]:
+        end += 1
+    a, b = old[start:len(old) - end], new[start:len(new) - end]
+    hunks = []
+    for tag, i1, i2, j1, j2 in difflib.SequenceMatcher(None, a, b).get_opcodes():
+        if tag != "equal":
+            hunks.append((start + i1, start + j1, tuple(a[i1:i2]), tuple(b[j1:j2])))
+    return hunks
+
+
+def apply_delta(lines, hunks, reverse=False):
+    """lines with a delta applied (reverse=True turns the new lines back into the old ones)"""
+    result = []
+    position = 0
+    for old_start, new_start, old, new in hunks:
+        start, removed, added = (new_start, new, old) if reverse else (old_start, old, new)
+        result.extend(lines[position:start])
+        result.extend(added)
+        position = start + len(removed)
+    result.extend(lines[position:])
+    return result
+
+
+def _delta_bytes(hunks):
+    return sum(len(line) for _, _, old, new in hunks for line in old + new)
+
+
+class Version:
+    """One entry of a file's history: how it was made and the delta from the version before"""
+    __slots__ = ("label", "created", "delta", "added", "removed")
+
+    def __init__(self, label, delta):
+        self.label = label
+        self.created = time.time()
+        self.delta = delta
+        self.added = sum(len(new) for _, _, _, new in delta)
+        self.removed = sum(len(old) for _, _, old, _ in delta)
+
+
+class VersionHistory:
+    """Versions of one file, stored as line deltas with periodic whole-text checkpoints.
+
+    Versions are numbered from 0 (the text the history started from) and
+    keep their numbers when old ones are dropped to stay under max_bytes.
+    Any version is rebuilt from the nearest checkpoint or from the current
+    text, whichever is fewer deltas away. Committing after an undo drops the
+    versions that could have been redone.
+    """
+    def __init__(self, text, label="loaded", max_bytes=EDIT_HISTORY_BYTES, checkpoint_every=CHECKPOINT_EVERY):
+        self.max_bytes = max_bytes
+        self.checkpoint_every = checkpoint_every
+        self.base = 0
+        self.current = 0
+        self._versions = [Version(label, [])]
+        self._checkpoints = {0: text}
+        self._text = text
+        self._bytes = len(text)
+
+    @property
+    def latest(self):
+        return self.base + len(self._versions) - 1
+
+    @property
+    def text(self):
+        return self._text
+
+    @property
+    def size(self):
+        """Bytes held by deltas and checkpoints (approximate: characters)"""
+        return self._bytes
+
+    def version(self, number):
+        return self._versions[number - self.base]
+
+    def commit(self, text, label):
+        """Record text as a new version after the current one; returns its number, or None if unchanged"""
+        if text == self._text:
+            return None
+        self._truncate()
+        delta = line_delta(self._text.splitlines(True), text.splitlines(True))
+        self._versions.append(Version(label, delta))
+        self._bytes += _delta_bytes(delta)
+        self.current = self.latest
+        self._text = text
+        if self.current % self.checkpoint_every == 0:
+            self._checkpoints[self.current] = text
+            self._bytes += len(text)
+        self._evict()
+        return self.current
+
+    def _truncate(self):
+        while self.latest > self.current:
+            number = self.latest
+            self._bytes -= _delta_bytes(self._versions.pop().delta)
+            checkpoint = self._checkpoints.pop(number, None)
+            if checkpoint is not None:
+                self._bytes -= len(checkpoint)
+
+    def _evict(self):
+        """Drop the oldest versions (never the current one) until the history fits max_bytes"""
+        while self._bytes > self.max_bytes and self.base < self.current:
+            following = self.base + 1
+            if following not in self._checkpoints:
+                text = "".join(apply_delta(self._checkpoints[self.base].splitlines(True), self.version(following).delta))
+                self._checkpoints[following] = text
+                self._bytes += len(text)
+            self._bytes -= len(self._checkpoints.pop(self.base)) + _delta_bytes(self.version(following).delta)
+            self._versions.pop(0)
+            self.base = following
+            # The oldest kept version is a checkpoint; its delta is no longer needed
+            self.version(following).delta = []
+
+    def get(self, number):
+        """Text of a version"""
+        if not self.base <= number <= self.latest:
+            raise IndexError(f"No version {number} (versions {self.base}-{self.latest} are kept)")
+        if number == self.current:
+            return self._text
+        # Start from the nearest checkpoint, or from the current text if that is fewer deltas away
+        start = max(index for index in self._checkpoints if index <= number)
+        text = self._checkpoints[start]
+        if abs(number - self.current) < number - start:
+            start, text = self.current, self._text
+        lines = text.splitlines(True)
+        for index in range(start, number, -1):
+            lines = apply_delta(lines, self.version(index).delta, reverse=True)
+        for index in range(start + 1, number + 1):
+            lines = apply_delta(lines, self.version(index).delta)
+        return "".join(lines)
+
+    def undo(self):
+        """Step back one version; returns its text, or None at the oldest kept version"""
+        if self.current == self.base:
+            return None
+        delta = self.version(self.current).delta
+        self.current -= 1
+        checkpoint = self._checkpoints.get(self.current)
+        self._text = checkpoint if checkpoint is not None else "".join(apply_delta(self._text.splitlines(True), delta, reverse=True))
+        return self._text
+
+    def redo(self):
+        """Step forward to the version undone last; returns its text, or None if there is none"""
+        if self.current == self.latest:
+            return None
+        self.current += 1
+        checkpoint = self._checkpoints.get(self.current)
+        delta = self.version(self.current).delta
+        self._text = checkpoint if checkpoint is not None else "".join(apply_delta(self._text.splitlines(True), delta))
+        return self._text
+
+    def entries(self):
+        """(number, Version) pairs, oldest first"""
+        return list(enumerate(self._versions, self.base))
+
+    def diff(self, number, text=None, path="file"):
+        """Unified diff from version number to text (default: the current version)"""
+        text = self._text if text is None else text
+        return "".join(difflib.unified_diff(
+            self.get(number).splitlines(True), text.splitlines(True),
+            fromfile=f"{path} (version {number})", tofile=f"{path} (current)",
+        ))
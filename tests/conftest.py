@@ -0,0 +1,19 @@
+import os
+import sys
+import pytest
+
+# The app modules import each other by name (python src/main.py), so mirror that here
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+
+@pytest.fixture
+def assistant(tmp_path, monkeypatch):
+    """A REPL in an empty project whose model (a stub) replies "Sure." to everything"""
+    from ai_handler import AIHandler, ModelLoader
+    from main import AICodeAssistant
+    from stub_model import StubLlama
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("RETRIEVAL", "0")
+    assistant = AICodeAssistant(model_loader=ModelLoader(factory=lambda: AIHandler(llm=StubLlama(reply="Sure."), cache=None)).start())
+    assistant.prefiller.enabled = False
+    return assistant
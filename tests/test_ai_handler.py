@@ -1,5 +1,5 @@
 import pytest
-from src.ai_handler import AIHandler
+from ai_handler import AIHandler
 
 def test_ai_handler_initialization():
     """Test that AIHandler can be initialized"""
@@ -9,4 +9,53 @@ def test_ai_handler_initialization():
 def test_ai_handler_attributes():
     """Test that AIHandler has required attributes"""
     handler = AIHandler()
-    assert hasattr(handler, 'llm')
\ No newline at end of file
+    assert hasattr(handler, 'llm')
+
+def test_stream_yields_deltas_and_summary():
+    """Test that stream() yields token deltas followed by a metadata event"""
+    from stub_model import StubLlama
+    handler = AIHandler(llm=StubLlama(reply="def f():\n    return 1\n"))
+    events = list(handler.stream("write f", is_code_context=True, current_code="x = 1\n", edit_format="full"))
+    *deltas, summary = events
+    assert "".join(event.delta for event in deltas) == "def f():\n    return 1\n"
+    assert all(not event.done for event in deltas)
+    assert summary.done
+    assert summary.finish_reason == "stop"
+    assert summary.completion_tokens == len(deltas)
+    assert summary.prompt_tokens > 0
+    assert summary.time_to_first_token is not None
+
+def test_chat_wrappers_use_stream():
+    """Test that chat and chat_stream return the same text as stream()"""
+    from stub_model import StubLlama
+    handler = AIHandler(llm=StubLlama(reply="Hi there"))
+    seen = []
+    assert handler.chat("hello") == "Hi there"
+    assert handler.chat_stream("hello", callback=seen.append) == "Hi there"
+    assert seen[-1] == "Hi there"
+
+def test_astream_yields_same_events():
+    """Test the async iterator over the token stream"""
+    import asyncio
+    from stub_model import StubLlama
+    handler = AIHandler(llm=StubLlama(reply="one two three"))
+
+    async def collect():
+        return [event async for event in handler.astream("count")]
+
+    events = asyncio.run(collect())
+    assert "".join(event.delta for event in events) == "one two three"
+    assert events[-1].done
+
+def test_constrained_edit_keeps_code_after_stop_words():
+    """Test that grammar-constrained edits are not cut at '###' and ask for a fenced block"""
+    from stub_model import StubLlama
+    from edit_protocol import parse_fenced_code
+    reply = "```python\nx = 2\n### helpers\ny = 3\n```"
+    stub = StubLlama(reply=reply)
+    handler = AIHandler(llm=stub)
+    handler.edit_grammar = True
+    text = handler.chat("edit", is_code_context=True, current_code="x = 1\n", edit_format="full")
+    assert parse_fenced_code(text) == "x = 2\n### helpers\ny = 3\n"
+    assert "###" not in stub.calls[-1]["stop"]
+    assert "fenced block" in stub.calls[-1]["messages"][0]["content"]
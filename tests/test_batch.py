@@ -0,0 +1,104 @@
+import json
+import os
+from ai_handler import AIHandler
+from stub_model import StubLlama
+from batch import run_batch, run_job
+from edit_pipeline import EXCERPT_NOTE
+from response_cache import ResponseCache
+
+def reply(messages):
+    """Answer like a well-behaved model: hunks in diff mode, the whole file otherwise"""
+    if "SEARCH/REPLACE" in messages[0]["content"]:
+        return "<<<<<<< SEARCH\nx = 1\n=======\nx = 2\n>>>>>>> REPLACE\n"
+    code = messages[1]["content"].split("```python\n", 1)[1].split("\n```", 1)[0]
+    return "```python\n" + code.replace("x = 1", "x = 2") + "\n```"
+
+def stub_handler():
+    return AIHandler(llm=StubLlama(reply=reply))
+
+def cached_handler():
+    return AIHandler(llm=StubLlama(reply=reply), cache=ResponseCache.from_env())
+
+def make_files(root, count):
+    for i in range(count):
+        (root / f"mod{i}.py").write_text("x = 1\n" if i % 2 == 0 else "y = 1\n")
+
+def read_results(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+def test_batch_records_results_and_summary(tmp_path):
+    """Test that every file gets a JSONL record and the summary adds up"""
+    make_files(tmp_path, 4)
+    output = tmp_path / "results.jsonl"
+    summary = run_batch(str(tmp_path / "*.py"), "set x to 2", output=str(output), workers=0,
+                        write=True, handler_factory=stub_handler)
+    records = read_results(output)
+    assert len(records) == 4
+    assert summary["files"] == 4
+    assert summary["changed"] == 2
+    assert (tmp_path / "mod0.py").read_text() == "x = 2\n"
+    assert summary["files_per_min"] > 0
+
+def test_batch_resumes(tmp_path):
+    """Test that files already edited in the results log are skipped and failed ones retried"""
+    make_files(tmp_path, 4)
+    output = tmp_path / "results.jsonl"
+    with open(output, "w", encoding="utf-8") as f:
+        f.write(json.dumps({"path": str(tmp_path / "mod0.py"), "status": "changed"}) + "\n")
+        f.write(json.dumps({"path": str(tmp_path / "mod1.py"), "status": "failed"}) + "\n")
+    summary = run_batch(str(tmp_path / "*.py"), "set x to 2", output=str(output), workers=0,
+                        handler_factory=stub_handler)
+    assert summary["files"] == 3
+    assert len(read_results(output)) == 5
+    # Without --write only the diff is recorded
+    assert (tmp_path / "mod2.py").read_text() == "x = 1\n"
+
+def test_batch_worker_pool(tmp_path):
+    """Test that jobs run through the process pool"""
+    make_files(tmp_path, 6)
+    output = tmp_path / "results.jsonl"
+    summary = run_batch(str(tmp_path / "*.py"), "set x to 2", output=str(output), workers=2,
+                        handler_factory=stub_handler)
+    assert summary["files"] == 6
+    assert {record["status"] for record in read_results(output)} == {"changed", "unchanged"}
+
+def test_batch_workers_only_read_the_cache(tmp_path, monkeypatch):
+    """Test that pool workers open the cache read-only and the parent stores their replies"""
+    monkeypatch.setenv("RESPONSE_CACHE_PATH", str(tmp_path / "cache.sqlite3"))
+    make_files(tmp_path, 4)
+    output = tmp_path / "results.jsonl"
+    run_batch(str(tmp_path / "*.py"), "set x to 2", output=str(output), workers=2, handler_factory=cached_handler)
+    stored = ResponseCache(str(tmp_path / "cache.sqlite3")).stats()["entries"]
+    assert stored
+    assert all("cache_writes" not in record for record in read_results(output))
+
+    run_batch(str(tmp_path / "*.py"), "set x to 2", output=str(output), workers=2, resume=False, handler_factory=cached_handler)
+    assert ResponseCache(str(tmp_path / "cache.sqlite3")).stats()["entries"] == stored
+
+def test_read_only_cache_defers_writes(tmp_path):
+    """Test that a read-only cache serves hits but holds its writes for the owner to apply"""
+    owner = ResponseCache(str(tmp_path / "cache.sqlite3"))
+    owner.put("a", ["one"], {})
+    reader = ResponseCache(str(tmp_path / "cache.sqlite3"), read_only=True)
+    assert reader.get("a") == (["one"], {})
+    reader.put("b", ["two"], {"finish_reason": "stop"})
+    assert owner.get("b") is None
+    owner.apply(reader.take_deferred())
+    assert owner.get("b") == (["two"], {"finish_reason": "stop"}) and reader.take_deferred() == []
+
+def test_batch_edits_large_files_like_the_repl(tmp_path):
+    """Test that a file over the edit budget is edited chunk by chunk with the REPL's excerpt prompt"""
+    def subtract(messages):
+        code = messages[-1]["content"].split("```python\n", 1)[1].split("\n```", 1)[0]
+        return "```python\n" + code.replace("value + 3", "value - 3") + "\n```"
+
+    path = tmp_path / "big.py"
+    path.write_text("".join(f"def function_{i}(value):\n    return value + {i}\n\n" for i in range(40)))
+    handler = AIHandler(llm=StubLlama(reply=subtract), cache=None)
+    handler.edit_format = "full"
+    handler.edit_budget = lambda: 60
+    record = run_job(str(path), "make function_3 subtract", False, handler)
+    prompts = [call["messages"][-1]["content"] for call in handler.llm.calls]
+    assert record["status"] == "changed" and "+    return value - 3" in record["diff"]
+    assert len(prompts) == 1 and EXCERPT_NOTE in prompts[0]
@@ -0,0 +1,56 @@
+import json
+import pytest
+import benchmark
+from benchmark import compare, run_benchmarks, bench_main
+
+def test_run_benchmarks_with_stub_model():
+    """Test that a small run covers every area and produces JSON-ready metrics"""
+    results = run_benchmarks(tree_sizes=(200,), runs=1, render_tokens=200)
+    metrics = results["metrics"]
+    assert results["model"] == "stub"
+    for name in (
+        "generation.ttft", "generation.tokens_per_sec", "prompt_eval.ttft_100pct_budget",
+        "render.code_panel_per_token", "render.text_panel_per_token",
+        "extract.pure_code_mb_per_sec", "completer.200_files_p50", "file_index.build_200_files",
+    ):
+        assert metrics[name]["value"] > 0, name
+    assert metrics["prompt_eval.ttft_25pct_budget"]["tokens"] < metrics["prompt_eval.ttft_100pct_budget"]["tokens"]
+    json.dumps(results)
+
+def test_compare_flags_regressions_in_either_direction():
+    """Test that slower latencies and lower throughput beyond the threshold are flagged"""
+    baseline = {"metrics": {
+        "latency": {"value": 1.0, "unit": "s", "better": "lower"},
+        "rate": {"value": 100.0, "unit": "tokens/s", "better": "higher"},
+        "steady": {"value": 1.0, "unit": "s", "better": "lower"},
+    }}
+    results = {"metrics": {
+        "latency": {"value": 1.5, "unit": "s", "better": "lower"},
+        "rate": {"value": 60.0, "unit": "tokens/s", "better": "higher"},
+        "steady": {"value": 1.1, "unit": "s", "better": "lower"},
+        "new": {"value": 5.0, "unit": "s", "better": "lower"},
+    }}
+    assert [name for name, *_ in compare(results, baseline, threshold=0.25)] == ["latency", "rate"]
+
+def test_bench_main_fails_on_regression(tmp_path, monkeypatch):
+    """Test that the CLI exits non-zero when a metric regressed past the threshold"""
+    fake = {"model": "stub", "timestamp": "", "host": {}, "metrics": {"latency": {"value": 2.0, "unit": "s", "better": "lower"}}}
+    monkeypatch.setattr(benchmark, "run_benchmarks", lambda *args, **kwargs: fake)
+    baseline = tmp_path / "baseline.json"
+    baseline.write_text(json.dumps({"metrics": {"latency": {"value": 1.0, "unit": "s", "better": "lower"}}}))
+    output = tmp_path / "results.json"
+    assert bench_main(["--output", str(output), "--baseline", str(baseline)]) == 1
+    assert bench_main(["--output", str(output), "--baseline", str(baseline), "--threshold", "1.5"]) == 0
+    assert json.loads(output.read_text())["metrics"]["latency"]["value"] == 2.0
+
+def test_bench_main_reports_a_missing_model(tmp_path, monkeypatch):
+    """Test that --model with no usable model file exits with an error instead of a traceback"""
+    monkeypatch.setenv("MODEL_PATH", str(tmp_path / "missing.gguf"))
+    monkeypatch.setattr(benchmark, "run_benchmarks", lambda *args, **kwargs: pytest.fail("ran without a model"))
+    assert bench_main(["--model", "--output", str(tmp_path / "results.json")]) == 1
+
+def test_compare_ignores_differences_below_noise_floor():
+    """Test that sub-millisecond jitter on tiny timings is not reported as a regression"""
+    baseline = {"metrics": {"ttft": {"value": 0.0004, "unit": "s", "better": "lower"}}}
+    results = {"metrics": {"ttft": {"value": 0.0009, "unit": "s", "better": "lower"}}}
+    assert compare(results, baseline) == []
@@ -0,0 +1,62 @@
+from chunked_edit import split_chunks, select_chunks, plan_chunks, splice, dedent_chunk, reindent_chunk
+
+SOURCE = '''import os
+
+CONSTANT = 1
+
+
+@decorator
+def load(path):
+    return open(path).read()
+
+
+class Store:
+    """Keeps things"""
+
+    def get(self, key):
+        return self.items[key]
+
+    def put(self, key, value):
+        self.items[key] = value
+
+
+def main():
+    print(load("x"))
+'''
+
+def count_words(text):
+    return len(text.split())
+
+def test_chunks_round_trip_exactly():
+    """Test that joining the chunks gives back the original source"""
+    chunks, _ = split_chunks(SOURCE)
+    assert "".join(chunk.text for chunk in chunks) == SOURCE
+    assert [chunk.name for chunk in chunks if chunk.name] == ["load", "Store", "main"]
+    assert chunks[1].text.startswith("@decorator")
+
+def test_select_named_chunk():
+    """Test that a chunk named in the instruction is picked"""
+    chunks, _ = split_chunks(SOURCE)
+    assert [chunk.name for chunk in select_chunks(chunks, "make load use a context manager")] == ["load"]
+
+def test_large_class_is_split_into_members():
+    """Test that an over-budget class is edited member by member"""
+    plan = plan_chunks(SOURCE, "validate the key in put", count_words, budget=12)
+    assert [chunk.name for chunk in plan] == ["Store.put"]
+
+def test_splice_preserves_untouched_code():
+    """Test that only edited chunks change, byte for byte"""
+    plan = plan_chunks(SOURCE, "change main", count_words, budget=1000)
+    result = splice(SOURCE, [(plan[0], 'def main():\n    print("hi")')])
+    assert result == SOURCE.replace('    print(load("x"))\n', '    print("hi")\n')
+
+def test_member_indentation_round_trip():
+    """Test that class members are dedented for the model and re-indented after"""
+    text = "    def get(self, key):\n        return self.items[key]\n"
+    excerpt, indent = dedent_chunk(text)
+    assert excerpt.startswith("def get")
+    assert reindent_chunk(excerpt, indent) == text
+
+def test_unparseable_source_is_not_chunked():
+    """Test that syntax errors fall back to a whole-file edit"""
+    assert plan_chunks("def broken(:\n", "fix it", count_words, budget=10) is None
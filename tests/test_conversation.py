@@ -0,0 +1,82 @@
+from ai_handler import AIHandler
+from conversation import Conversation
+from stub_model import StubLlama
+
+def count_words(text):
+    return len(text.split())
+
+SYSTEM = {"role": "system", "content": "system"}
+
+def test_token_counts_are_cached():
+    """Test that each message is tokenized once, when it is added"""
+    calls = []
+
+    def counting(text):
+        calls.append(text)
+        return count_words(text)
+
+    conversation = Conversation(counting, budget=1000)
+    conversation.add_exchange("hello there", "hi")
+    for _ in range(3):
+        conversation.messages(SYSTEM, {"role": "user", "content": "next"})
+    assert calls == ["hello there", "hi"]
+
+def test_history_is_append_only():
+    """Test that each prompt starts with the previous prompt's history unchanged"""
+    conversation = Conversation(count_words, budget=1000)
+    previous = None
+    for turn in range(5):
+        request = {"role": "user", "content": f"question {turn}"}
+        prompt = conversation.messages(SYSTEM, request)
+        if previous:
+            assert prompt[:len(previous)] == previous
+        conversation.add_exchange(request["content"], f"answer {turn}")
+        previous = prompt[:-1] + [request, {"role": "assistant", "content": f"answer {turn}"}]
+
+def test_eviction_summarizes_oldest_turns():
+    """Test that outgrowing the budget folds the oldest turns into a summary"""
+    conversation = Conversation(count_words, budget=100)
+    for turn in range(10):
+        conversation.add_exchange(f"question {turn} " + "word " * 5, f"answer {turn}")
+    assert conversation.tokens <= 100
+    assert conversation.evicted > 0
+    assert conversation.turns[0].role == "user"
+    first_kept = conversation.turns[0].content.split()[1]
+    assert f"answer {int(first_kept) - 1}" in conversation.summary.content
+    assert conversation.turns[-1].content == "answer 9"
+
+def test_eviction_happens_in_blocks():
+    """Test that the prefix stays stable for several turns after an eviction"""
+    conversation = Conversation(count_words, budget=100)
+    evictions = []
+    for turn in range(20):
+        before = conversation.evicted
+        conversation.add_exchange(f"question {turn} " + "word " * 5, f"answer {turn}")
+        evictions.append(conversation.evicted != before)
+    assert 0 < sum(evictions) <= 6
+
+def test_room_trims_for_one_request_only():
+    """Test that a large request drops old turns from its prompt but not from the history"""
+    conversation = Conversation(count_words, budget=1000)
+    for turn in range(5):
+        conversation.add_exchange(f"question {turn}", f"answer {turn}")
+    prompt = conversation.messages(SYSTEM, {"role": "user", "content": "big"}, room=40)
+    assert prompt[1] == {"role": "user", "content": "question 3"}
+    assert len(conversation.turns) == 10
+
+def test_chat_and_edit_share_history_and_kv_prefix():
+    """Test that follow-up turns reuse the previous prompt as a KV cache prefix"""
+    stub = StubLlama(reply=lambda messages: f"reply {len(messages)}")
+    handler = AIHandler(llm=stub)
+    conversation = handler.new_conversation()
+
+    handler.chat("what does this module do?", history=conversation)
+    handler.chat("add a docstring", is_code_context=True, current_code="x = 1\n", edit_format="diff", history=conversation)
+    first_prompt = stub.calls[-1]["messages"]
+    handler.chat("thanks", history=conversation)
+    second_prompt = stub.calls[-1]["messages"]
+
+    assert [message["role"] for message in second_prompt] == ["system", "user", "assistant", "user", "assistant", "user"]
+    assert second_prompt[0] == first_prompt[0]
+    assert second_prompt[3]["content"] == "Edit the loaded code: add a docstring"
+    assert stub.reused_tokens > 0
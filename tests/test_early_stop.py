@@ -0,0 +1,80 @@
+import threading
+from ai_handler import AIHandler
+from early_stop import FenceClosed, RepeatedLines, check, default_detectors
+from response_cache import ResponseCache
+from stub_model import StubLlama
+
+def feed_all(detector, text, size=3):
+    for index in range(0, len(text), size):
+        reason = detector.feed(text[index:index + size])
+        if reason:
+            return index + size
+    return None
+
+def test_fence_closed_stops_at_closing_fence():
+    """Test that decoding stops right after the first code block closes"""
+    text = "Here you go:\n```python\nx = 1\n```\nI changed x."
+    stopped = feed_all(FenceClosed(), text, size=1)
+    assert text[:stopped].endswith("```") and text[:stopped].count("```") == 2
+    assert feed_all(FenceClosed(), "```python\nx = 1\n") is None
+
+def test_repeated_lines_detects_loops_only():
+    """Test that a looping reply is caught but short repeated lines like '}' are not"""
+    assert feed_all(RepeatedLines(), "start\n" + "result = compute(x)\n" * 6) is not None
+    assert feed_all(RepeatedLines(), "a = 1\n" + "    return total_value\n    x += 1\n" * 5) is not None
+    assert feed_all(RepeatedLines(), "        }\n" * 8 + "pass\n" * 8) is None
+    assert check([FenceClosed(), RepeatedLines()], "plain text") is None
+
+def test_full_edit_stops_after_code_block():
+    """Test that a whole-file edit stops at its closing fence and reports the tokens saved"""
+    stub = StubLlama(reply="```python\nx = 2\n```\nI updated x to 2 because you asked for it.")
+    handler = AIHandler(llm=stub, cache=None)
+    events = list(handler.stream("set x to 2", is_code_context=True, current_code="x = 1\n", edit_format="full"))
+    done = events[-1]
+    assert "".join(event.delta for event in events) == "```python\nx = 2\n```"
+    assert done.stopped_by == "code block closed" and done.finish_reason == "stop"
+    assert done.tokens_saved == 2048 - done.completion_tokens
+    assert handler.telemetry.records[-1]["stopped_by"] == "code block closed"
+
+def test_looping_reply_is_incomplete_and_not_cached(tmp_path):
+    """Test that a repetition stop has its own finish reason, is not cached and is never run on edits"""
+    assert "repetition" not in default_detectors(True, "full") and "repetition" not in default_detectors(True, "diff")
+    stub = StubLlama(reply="start\n" + "result = compute(x)\n" * 10)
+    handler = AIHandler(llm=stub, cache=ResponseCache(str(tmp_path / "cache.sqlite3")))
+    done = list(handler.stream("loop"))[-1]
+    assert done.stopped_by == "output repeating" and done.finish_reason == "repetition"
+    again = list(handler.stream("loop"))[-1]
+    assert not again.cached and len(stub.calls) == 2
+
+def test_cancel_keeps_partial_reply_and_stops_decoding():
+    """Test that setting the cancel event ends the request with what was generated so far"""
+    stub = StubLlama(reply="one two three four five six seven eight")
+    handler = AIHandler(llm=stub, cache=None)
+    conversation = handler.new_conversation()
+    cancel = threading.Event()
+    deltas = []
+    for event in handler.stream("count", cancel=cancel, history=conversation):
+        if event.done:
+            done = event
+        else:
+            deltas.append(event.delta)
+            if len(deltas) == 3:
+                cancel.set()
+    assert "".join(deltas) == "one two"
+    assert done.finish_reason == "cancelled" and done.completion_tokens == 3
+    assert stub.n_tokens == done.prompt_tokens + 3
+    assert conversation.turns[-1].content == "one two"
+
+def test_keyboard_interrupt_during_decoding_is_cancellation():
+    """Test that Ctrl-C inside the model's token loop yields the partial reply instead of raising"""
+    class InterruptedStub(StubLlama):
+        def _generate(self, messages, max_tokens, stop):
+            for index, piece in enumerate(super()._generate(messages, max_tokens, stop)):
+                if index == 2:
+                    raise KeyboardInterrupt
+                yield piece
+
+    handler = AIHandler(llm=InterruptedStub(reply="alpha beta gamma"), cache=None)
+    events = list(handler.stream("hi"))
+    assert "".join(event.delta for event in events) == "alpha "
+    assert events[-1].finish_reason == "cancelled"
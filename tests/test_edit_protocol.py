@@ -0,0 +1,79 @@
+import pytest
+from edit_protocol import parse_hunks, apply_hunks, parse_fenced_code, HunkApplyError, EDIT_GRAMMARS
+
+CODE = """def hello_world():
+    print("Hello, World")
+    numbers = [1, 2, 3, 4, 5]
+    for num in numbers:
+        print(num)
+"""
+
+def test_parse_search_replace_blocks():
+    """Test that SEARCH/REPLACE blocks are parsed into hunks"""
+    response = (
+        "<<<<<<< SEARCH\n"
+        '    print("Hello, World")\n'
+        "=======\n"
+        '    print("Hello, Juno")\n'
+        ">>>>>>> REPLACE\n"
+    )
+    hunks = parse_hunks(response)
+    assert len(hunks) == 1
+    assert hunks[0].search == ['    print("Hello, World")']
+    assert hunks[0].replace == ['    print("Hello, Juno")']
+
+def test_apply_exact_hunk():
+    """Test that an exact hunk only touches the matched lines"""
+    hunks = parse_hunks("<<<<<<< SEARCH\n        print(num)\n=======\n        print(num * 2)\n>>>>>>> REPLACE")
+    result = apply_hunks(CODE, hunks)
+    assert result == CODE.replace("print(num)", "print(num * 2)")
+
+def test_apply_hunk_with_lost_indentation():
+    """Test that a hunk missing its indentation is anchored and re-indented"""
+    hunks = parse_hunks("<<<<<<< SEARCH\nfor num in numbers:\n    print(num)\n=======\nfor num in numbers:\n    print(num + 1)\n>>>>>>> REPLACE")
+    result = apply_hunks(CODE, hunks)
+    assert "    for num in numbers:\n        print(num + 1)\n" in result
+
+def test_apply_fuzzy_hunk():
+    """Test that a slightly misquoted SEARCH block still finds its anchor"""
+    hunks = parse_hunks("<<<<<<< SEARCH\n    numbers = [1, 2, 3, 4]\n=======\n    numbers = list(range(10))\n>>>>>>> REPLACE")
+    result = apply_hunks(CODE, hunks)
+    assert "    numbers = list(range(10))" in result
+    assert "[1, 2, 3, 4, 5]" not in result
+
+def test_parse_unified_diff():
+    """Test that unified-diff hunks are accepted as well"""
+    response = (
+        "--- a/hello.py\n"
+        "+++ b/hello.py\n"
+        "@@ -1,2 +1,2 @@\n"
+        " def hello_world():\n"
+        '-    print("Hello, World")\n'
+        '+    print("Hi")\n'
+    )
+    result = apply_hunks(CODE, parse_hunks(response))
+    assert result == CODE.replace("Hello, World", "Hi")
+
+def test_unmatched_hunk_raises():
+    """Test that a hunk with no anchor raises so the caller can fall back"""
+    hunks = parse_hunks("<<<<<<< SEARCH\nclass Totally(Unrelated):\n=======\npass\n>>>>>>> REPLACE")
+    with pytest.raises(HunkApplyError):
+        apply_hunks(CODE, hunks)
+    with pytest.raises(HunkApplyError):
+        apply_hunks(CODE, [])
+
+def test_parse_fenced_code():
+    """Test the zero-cost parse of a grammar-constrained full-file reply"""
+    assert parse_fenced_code("```python\nx = 1\n### section\n```") == "x = 1\n### section\n"
+    assert parse_fenced_code("Here you go:\n```python\nx = 1\n```") is None
+    assert parse_fenced_code("x = 1") is None
+
+def test_edit_grammars_define_every_rule():
+    """Test that each grammar defines every rule it references"""
+    import re
+    for grammar in EDIT_GRAMMARS.values():
+        defined = set(re.findall(r"^(\w+) ::=", grammar, re.MULTILINE))
+        bodies = re.sub(r'"(?:[^"\\]|\\.)*"|\[(?:[^\]\\]|\\.)*\]', "", grammar)
+        referenced = set(re.findall(r"(?<=[\s|])([a-z]\w*)", bodies.replace("::=", " ")))
+        assert "root" in defined
+        assert referenced <= defined
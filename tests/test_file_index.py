@@ -0,0 +1,56 @@
+import os
+import time
+from file_index import FileIndex, parse_gitignore, fuzzy_score
+
+def make_tree(root, paths):
+    for path in paths:
+        full = os.path.join(root, path)
+        os.makedirs(os.path.dirname(full), exist_ok=True)
+        with open(full, "w", encoding="utf-8") as f:
+            f.write("")
+
+def build(root):
+    index = FileIndex(str(root), refresh_interval=0).start()
+    assert index.wait(timeout=5)
+    return index
+
+def test_index_prunes_vcs_and_gitignored(tmp_path):
+    """Test that VCS directories and .gitignore'd paths are not indexed"""
+    make_tree(tmp_path, ["src/main.py", ".git/config", "node_modules/pkg/index.js", "build/out.py", "debug.log"])
+    (tmp_path / ".gitignore").write_text("build/\n*.log\n")
+    index = build(tmp_path)
+    paths = index.search("", limit=1000)
+    assert os.path.join("src", "main.py") in paths
+    assert not any(p.split(os.sep)[0] in (".git", "node_modules", "build") or p.endswith(".log") for p in paths)
+
+def test_gitignore_negation():
+    """Test that a later negated rule re-includes a path"""
+    rules = parse_gitignore("*.py\n!keep.py\n")
+    ignored = False
+    for rule in rules:
+        if rule.matches("keep.py", "keep.py", False):
+            ignored = not rule.negate
+    assert ignored is False
+
+def test_prefix_matches_come_first(tmp_path):
+    """Test that name-prefix matches rank ahead of fuzzy matches"""
+    make_tree(tmp_path, ["main.py", "src/manager.py", "src/domain_model.py"])
+    index = build(tmp_path)
+    assert index.files_with_prefix("ma") == ["main.py", os.path.join("src", "manager.py")]
+    results = index.search("mdl", include_dirs=False)
+    assert results[0] == os.path.join("src", "domain_model.py")
+
+def test_fuzzy_score_prefers_boundaries():
+    """Test that boundary matches outscore scattered ones"""
+    assert fuzzy_score("fm", "src/file_manager.py") > fuzzy_score("fm", "src/platform.py")
+    assert fuzzy_score("xyz", "src/main.py") is None
+
+def test_refresh_picks_up_new_files(tmp_path):
+    """Test that mtime checks rescan only changed directories"""
+    make_tree(tmp_path, ["src/a.py"])
+    index = build(tmp_path)
+    time.sleep(0.01)
+    make_tree(tmp_path, ["src/b.py", "src/pkg/c.py"])
+    index.refresh()
+    assert index.files_with_prefix("b") == [os.path.join("src", "b.py")]
+    assert index.files_with_prefix("c") == [os.path.join("src", "pkg", "c.py")]
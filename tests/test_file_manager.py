@@ -1,7 +1,7 @@
 import pytest
 import tempfile
 import os
-from src.file_manager import FileManager
+from file_manager import FileManager
 
 def test_file_manager_initialization():
     """Test that FileManager can be initialized"""
@@ -12,6 +12,6 @@ def test_file_manager_initialization():
 
 def test_file_completer_initialization():
     """Test that FileCompleter can be initialized"""
-    from src.file_manager import FileCompleter
+    from file_manager import FileCompleter
     completer = FileCompleter()
     assert completer is not None
\ No newline at end of file
@@ -0,0 +1,68 @@
+from file_manager import FileManager
+from file_view import FileView, HighlightCache, LineIndex, parse_range, render_window
+
+def make_source(functions):
+    return "".join(f"def function_{i}(x):\n    return x + {i}\n\n" for i in range(functions))
+
+def test_line_index_slices_str_and_bytes_alike():
+    """Test that line ranges match splitlines for text and for raw bytes"""
+    text = "first\nsecond\n\nfourth\n"
+    for buffer in (text, text.encode("utf-8")):
+        index = LineIndex(buffer)
+        assert len(index) == 4
+        assert index.slice(1, 3) == buffer[6:13]
+        assert index.slice(3, 10) == buffer[14:20]
+    assert len(LineIndex("no newline")) == 1
+    assert len(LineIndex("")) == 0
+
+def test_file_view_maps_large_file(tmp_path):
+    """Test jumping into the middle of a large file through the mmap index"""
+    path = tmp_path / "big.py"
+    source = make_source(50_000)
+    path.write_text(source)
+    view = FileView.from_file(str(path))
+    try:
+        assert view.line_count == len(source.splitlines())
+        assert view.lines(90_000, 90_003) == "\n".join(source.splitlines()[90_000:90_003])
+    finally:
+        view.close()
+
+def test_highlight_cache_survives_edits_elsewhere():
+    """Test that re-showing a window after an edit in another part of the file reuses its highlighting"""
+    cache = HighlightCache()
+    source = make_source(300)
+    render_window(FileView.from_text(source), 600, 640, "python", cache)
+    edited = source.replace("return x + 5\n", "return x * 5\n")
+    text = render_window(FileView.from_text(edited), 600, 640, "python", cache)
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert text.plain.splitlines()[0] == "601 def function_200(x):"
+
+def test_parse_range():
+    """Test the show argument forms"""
+    assert parse_range("", 1000, 30) == (0, 30)
+    assert parse_range("200-400", 1000, 30) == (199, 400)
+    assert parse_range("990", 1000, 30) == (989, 1000)
+
+def test_view_switches_from_file_to_text_after_edit(tmp_path):
+    """Test that the mapped file is shown until the content is edited in memory"""
+    path = tmp_path / "mod.py"
+    path.write_text(make_source(3))
+    manager = FileManager()
+    manager.current_file, manager.file_content = manager.load_file(str(path))
+    assert manager.view()._handle is not None
+    manager.file_content = manager.file_content.replace("x + 1", "x - 1")
+    view = manager.view()
+    assert view._handle is None
+    assert "x - 1" in view.lines(0, view.line_count)
+    manager.save_file(manager.file_content)
+    assert manager.view()._handle is not None
+
+def test_mapped_view_does_not_index_the_text(tmp_path, monkeypatch):
+    """Test that a file whose content is unchanged is only indexed through its mapping"""
+    path = tmp_path / "mod.py"
+    path.write_text(make_source(3))
+    manager = FileManager()
+    manager.current_file, manager.file_content = manager.load_file(str(path))
+    indexed = []
+    monkeypatch.setattr(FileView, "from_text", classmethod(lambda cls, text: indexed.append(text)))
+    assert manager.view()._handle is not None and indexed == []
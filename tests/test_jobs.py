@@ -0,0 +1,97 @@
+import threading
+import time
+from ai_handler import AIHandler, ModelLoader
+from jobs import JobQueue
+from stub_model import StubLlama
+
+def test_jobs_run_in_order_and_queued_jobs_can_be_cancelled():
+    """Test that jobs run one at a time in submission order and a cancelled queued job never runs"""
+    release = threading.Event()
+    ran = []
+    finished = []
+    jobs = JobQueue(on_finish=lambda job: finished.append((job.id, job.status)))
+    first = jobs.submit("chat", "first", lambda job: release.wait(5) and ran.append(job.id))
+    jobs.submit("chat", "second", lambda job: ran.append(job.id))
+    third = jobs.submit("chat", "third", lambda job: ran.append(job.id))
+    assert jobs.cancel(third.id) is third and third.status == "cancelled"
+    while first.status == "queued":
+        time.sleep(0.01)
+    assert "1 queued" in jobs.status()
+    release.set()
+    assert jobs.wait(5)
+    assert ran == [first.id, 2] and finished == [(1, "done"), (2, "done")]
+    assert [job.status for job in jobs.jobs()] == ["cancelled", "done", "done"]
+
+def test_cancel_running_job_sets_its_event():
+    """Test that cancelling the running job signals it and records it as cancelled"""
+    started = threading.Event()
+
+    def run(job):
+        started.set()
+        job.cancelled.wait(5)
+
+    jobs = JobQueue()
+    job = jobs.submit("edit", "slow", run)
+    started.wait(5)
+    assert jobs.cancel() is job
+    assert jobs.wait(5) and job.status == "cancelled"
+    assert jobs.cancel() is None
+
+def test_edit_result_goes_to_its_file_after_switching(tmp_path, monkeypatch):
+    """Test that an edit job returns at once and its result lands on the file it was started for"""
+    from main import AICodeAssistant
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.delenv("EDIT_CHECKS", raising=False)
+    (tmp_path / "a.py").write_text("x = 1\n")
+    (tmp_path / "b.py").write_text("y = 1\n")
+
+    def load():
+        handler = AIHandler(llm=StubLlama(reply="```python\nx = 2\n```", decode_seconds_per_token=0.05), cache=None)
+        handler.edit_format = "full"
+        return handler
+
+    assistant = AICodeAssistant(model_loader=ModelLoader(factory=load).start())
+    assistant.process_command("load a.py")
+    start = time.perf_counter()
+    assistant.process_command("edit set x to 2")
+    assert time.perf_counter() - start < 0.5
+    assistant.process_command("load b.py")
+    assert assistant.jobs.wait(10)
+    assert assistant.file_manager.file_content == "y = 1\n"
+    assistant.process_command("load a.py")
+    assert assistant.file_manager.file_content == "x = 2\n"
+    assert (tmp_path / "a.py").read_text() == "x = 1\n"
+
+def test_finished_jobs_are_reported_on_the_repl_loop(tmp_path, monkeypatch):
+    """Test that job results are attached on the REPL's thread, each before the next queued job starts"""
+    import asyncio
+    from main import AICodeAssistant
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.delenv("EDIT_CHECKS", raising=False)
+    (tmp_path / "a.py").write_text("x = 1\n")
+
+    def load():
+        handler = AIHandler(llm=StubLlama(reply="```python\nx = 2\n```"), cache=None)
+        handler.edit_format = "full"
+        return handler
+
+    assistant = AICodeAssistant(model_loader=ModelLoader(factory=load).start())
+    assistant.prefiller.enabled = False
+    finished_on = []
+    finish_job = assistant.finish_job
+    monkeypatch.setattr(assistant, "finish_job", lambda job: finished_on.append(threading.current_thread()) or finish_job(job))
+    started_with = []
+    run_edit = assistant.run_edit
+    monkeypatch.setattr(assistant, "run_edit", lambda job: started_with.append(assistant.file_manager.content_of(job.path)) or run_edit(job))
+
+    async def repl():
+        assistant.loop = asyncio.get_running_loop()
+        assistant.process_command("load a.py")
+        assistant.process_command("edit set x to 2")
+        assistant.process_command("edit keep x at 2")
+        while assistant.jobs.busy:
+            await asyncio.sleep(0.01)
+
+    asyncio.run(repl())
+    assert finished_on == [threading.main_thread()] * 2
+    assert started_with == ["x = 1\n", "x = 2\n"]
@@ -0,0 +1,35 @@
+import pytest
+from main import is_command
+
+@pytest.mark.parametrize("user_input, name, expected", [
+    ("show", "show", True),
+    ("show 10-20", "show", True),
+    ("show 40", "show", True),
+    ("show me an example of a decorator", "show", False),
+    ("cache", "cache", True),
+    ("cache off", "cache", True),
+    ("cache clear", "cache", True),
+    ("cache invalidation in Django", "cache", False),
+    ("memory clear", "memory", True),
+    ("memory leaks in this loop?", "memory", False),
+    ("diff 2", "diff", True),
+    ("diff between a list and a tuple?", "diff", False),
+    ("cancel #2", "cancel", True),
+    ("cancel 3", "cancel", True),
+    ("cancel all", "cancel", True),
+    ("cancel a pending asyncio task", "cancel", False),
+    ("showcase", "show", False),
+])
+def test_is_command(user_input, name, expected):
+    """Test that a command word followed by anything but its arguments is a chat question"""
+    assert is_command(user_input, name) == expected
+
+def test_command_words_in_questions_are_asked(assistant, monkeypatch):
+    """Test that the REPL runs `show 40` but queues "show me ..." as a chat job"""
+    shown = []
+    monkeypatch.setattr(assistant, "show_command", shown.append)
+    assistant.process_command("show 40")
+    assistant.process_command("show me an example of a decorator")
+    assert shown == ["40"]
+    assert [job.description for job in assistant.jobs.jobs()] == ["show me an example of a decorator"]
+    assert assistant.jobs.wait(5)
@@ -0,0 +1,74 @@
+import os
+import struct
+from ai_handler import AIHandler
+from memory_budget import plan_memory, model_shape, llama_params, DEFAULT_SHAPE, MIN_CTX
+from stub_model import StubLlama
+
+MB = 1024 * 1024
+# RAM cap the default model must fit in; lower it to check a smaller machine
+MEMORY_BUDGET_MB = float(os.getenv("JUNO_TEST_MEMORY_BUDGET_MB", "8192"))
+# A 7B model at Q4_K_M
+MODEL_BYTES = 4096 * MB
+
+def test_plan_shrinks_kv_cache_then_context():
+    """Test that tighter budgets pick a q8_0 cache, then a smaller context, then a q4_0 cache at MIN_CTX"""
+    def plan(budget_mb):
+        plan = plan_memory(budget_mb * MB, 4096, DEFAULT_SHAPE, MODEL_BYTES, mlock_limit=float("inf"))
+        return plan["n_ctx"], plan["kv_type"], plan["fits"]
+
+    assert plan(8192) == (4096, "f16", True)
+    assert plan(5888) == (4096, "q8_0", True)
+    assert plan(5120) == (2048, "q8_0", True)
+    assert plan(4608) == (MIN_CTX, "q4_0", False)
+
+def test_default_model_fits_the_configured_budget():
+    """Test that the planned footprint stays within JUNO_TEST_MEMORY_BUDGET_MB"""
+    plan = plan_memory(int(MEMORY_BUDGET_MB * MB), 4096, DEFAULT_SHAPE, MODEL_BYTES, mlock_limit=0)
+    assert plan["fits"] and plan["estimated_bytes"] <= MEMORY_BUDGET_MB * MB
+    assert plan["use_mmap"] and not plan["use_mlock"]
+
+def test_shape_is_read_from_the_gguf_header(tmp_path):
+    """Test that layer count and grouped-query K/V width come from the GGUF metadata"""
+    def entry(key, kind, value):
+        data = struct.pack("<Q", len(key)) + key.encode() + struct.pack("<I", kind)
+        if kind == 8:
+            return data + struct.pack("<Q", len(value)) + value.encode()
+        if kind == 9:
+            return data + struct.pack("<IQ", 6, len(value)) + struct.pack(f"<{len(value)}f", *value)
+        return data + struct.pack("<I", value)
+
+    entries = [
+        entry("general.architecture", 8, "llama"),
+        entry("tokenizer.ggml.scores", 9, [0.5, 1.5]),
+        entry("llama.block_count", 4, 22),
+        entry("llama.embedding_length", 4, 2048),
+        entry("llama.attention.head_count", 4, 32),
+        entry("llama.attention.head_count_kv", 4, 4),
+    ]
+    path = tmp_path / "tiny.gguf"
+    path.write_bytes(b"GGUF" + struct.pack("<IQQ", 3, 0, len(entries)) + b"".join(entries))
+    assert model_shape(str(path)) == {"n_layer": 22, "n_embd_kv": 256}
+    assert model_shape(str(tmp_path / "missing.gguf")) == DEFAULT_SHAPE
+
+def test_llama_params_leave_explicit_settings_alone(monkeypatch):
+    """Test that a quantized cache turns on flash attention and USE_MLOCK overrides the plan"""
+    plan = plan_memory(5120 * MB, 4096, DEFAULT_SHAPE, MODEL_BYTES, mlock_limit=float("inf"))
+    monkeypatch.delenv("USE_MMAP", raising=False)
+    monkeypatch.setenv("USE_MLOCK", "1")
+    params = llama_params(plan)
+    assert params["type_k"] == params["type_v"] == 8 and params["flash_attn"]
+    assert params["n_ctx"] == 2048 and params["use_mmap"] is True and "use_mlock" not in params
+
+def test_full_context_shifts_instead_of_failing():
+    """Test that a conversation longer than the window drops its oldest turns rather than raising"""
+    llm = StubLlama(reply="ok", n_ctx=256)
+    handler = AIHandler(llm=llm, cache=None)
+    messages = [{"role": "system", "content": "You are terse."}]
+    for turn in range(20):
+        messages.append({"role": "user", "content": f"question {turn} " + "word " * 20})
+        messages.append({"role": "assistant", "content": f"answer {turn}"})
+    messages.append({"role": "user", "content": "the latest question"})
+    events = list(handler.stream_messages(messages, 0.0, max_tokens=512, use_cache=False))
+    sent = llm.calls[-1]["messages"]
+    assert events[-1].done and sent[0]["role"] == "system" and sent[-1]["content"] == "the latest question"
+    assert sent[1]["role"] == "user" and len(sent) < len(messages)
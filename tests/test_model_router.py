@@ -0,0 +1,83 @@
+import threading
+from ai_handler import AIHandler
+from model_router import ModelPool, ModelRouter, routes_from_env
+from stub_model import StubLlama
+
+ROUTES = {"chat": "small.gguf", "edit": "coder.gguf"}
+SIZES = {"small.gguf": 2, "coder.gguf": 6, "other.gguf": 4}
+
+def stub_factory(path):
+    stub = StubLlama(reply=f"reply from {path}")
+    stub.model_path = path
+    return AIHandler(llm=stub, cache=None)
+
+def text_of(events):
+    return "".join(event.delta for event in events)
+
+def test_router_sends_chat_and_edit_to_their_models():
+    """Test that chat goes to the chat model and edits to the coder model, loading the chat model on first use"""
+    router = ModelRouter(ROUTES, factory=stub_factory, budget=None, estimate=SIZES.get, prewarm=[])
+    assert router.pool.loaded() == ["coder.gguf"]
+    assert text_of(router.stream("hello")) == "reply from small.gguf"
+    assert text_of(router.stream("rename x", is_code_context=True, current_code="x = 1\n", use_cache=False)) == "reply from coder.gguf"
+    assert router.pool.loads == 2
+    models = [record["model"] for record in router.telemetry.records]
+    assert models == ["small.gguf", "coder.gguf"]
+
+def test_chat_turns_stay_within_budget():
+    """Test that token counting, budgets and status lines never reload the evicted edit model"""
+    router = ModelRouter(ROUTES, factory=stub_factory, budget=10, estimate={"small.gguf": 6, "coder.gguf": 6}.get, prewarm=[])
+    conversation = router.new_conversation()
+    for turn in range(3):
+        text_of(router.stream(f"question {turn}", history=conversation))
+        router.memory_plan, router.context_key(), router.count_tokens("some text"), router.reply_tokens(), router.edit_budget()
+        assert router.pool.loaded() == ["small.gguf"] and router.pool.used <= 10
+    assert router.pool.loads == 2 and len(conversation.turns) == 6
+
+def test_pool_evicts_least_recently_used_within_budget():
+    """Test that loading past the budget evicts the least recently used model"""
+    pool = ModelPool(stub_factory, budget=10, estimate=SIZES.get)
+    pool.get("coder.gguf")
+    pool.get("small.gguf")
+    pool.get("coder.gguf")
+    pool.get("other.gguf")
+    assert pool.loaded() == ["coder.gguf", "other.gguf"]
+    assert pool.evictions == 1 and pool.used == 10
+
+def test_pool_keeps_busy_models():
+    """Test that a model serving a request is not evicted, even if that exceeds the budget"""
+    pool = ModelPool(stub_factory, budget=8, estimate=SIZES.get)
+    pool.acquire("coder.gguf")
+    pool.get("other.gguf")
+    assert pool.loaded() == ["coder.gguf", "other.gguf"]
+    pool.release("coder.gguf")
+    pool.get("small.gguf")
+    assert "coder.gguf" not in pool
+
+def test_prewarm_loads_in_background():
+    """Test that pre-warming loads the routed models once, with concurrent users sharing the load"""
+    calls = []
+    gate = threading.Event()
+
+    def slow_factory(path):
+        calls.append(path)
+        gate.wait(5)
+        return stub_factory(path)
+
+    pool = ModelPool(slow_factory)
+    thread = pool.prewarm(["small.gguf"])
+    waiter = threading.Thread(target=pool.get, args=("small.gguf",))
+    waiter.start()
+    gate.set()
+    thread.join(5)
+    waiter.join(5)
+    assert calls == ["small.gguf"] and "small.gguf" in pool
+
+def test_routes_default_to_model_path(monkeypatch):
+    """Test that unset routes fall back to MODEL_PATH"""
+    for name in ("CHAT_MODEL_PATH", "EDIT_MODEL_PATH"):
+        monkeypatch.delenv(name, raising=False)
+    monkeypatch.setenv("MODEL_PATH", "coder.gguf")
+    assert set(routes_from_env().values()) == {"coder.gguf"}
+    monkeypatch.setenv("CHAT_MODEL_PATH", "small.gguf")
+    assert routes_from_env() == ROUTES
@@ -0,0 +1,63 @@
+import threading
+import time
+from ai_handler import AIHandler, ModelLoader
+from conversation import Conversation
+from prefill import Prefiller
+from stub_model import StubLlama
+
+CODE = "def area(width, height):\n    return width * height\n" * 20
+
+def wait_for(condition, timeout=5):
+    deadline = time.time() + timeout
+    while not condition():
+        if time.time() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+def test_edit_reuses_the_prefilled_prompt():
+    """Test that after a prefill the edit prompt only evaluates the instruction"""
+    llm = StubLlama(reply="```python\nx = 1\n```")
+    handler = AIHandler(llm=llm, cache=None)
+    history = Conversation(handler.count_tokens, 1000)
+    history.add_exchange("hello", "hi")
+    prefilled = handler.prefill(CODE, history=history)
+    assert llm.calls[-1]["max_tokens"] == 1 and prefilled > handler.count_tokens(CODE)
+
+    list(handler.stream("rename area", is_code_context=True, current_code=CODE, history=history, use_cache=False))
+    # All but the chat template's closing tokens and the one sampled token
+    assert llm.reused_tokens >= prefilled - 10
+
+def test_only_the_latest_target_is_prefilled():
+    """Test that a newer schedule supersedes a pending one and invalidate() forgets the result"""
+    ran = []
+    prefiller = Prefiller(lambda target: ran.append(target.path) or 10, delay=0.1, enabled=True)
+    prefiller.schedule("a.py", "a = 1\n")
+    prefiller.schedule("b.py", "b = 1\n")
+    assert wait_for(lambda: prefiller.ready is not None)
+    assert ran == ["b.py"] and prefiller.is_ready("b.py", "b = 1\n") and not prefiller.is_ready("b.py", "b = 2\n")
+    prefiller.invalidate()
+    assert prefiller.ready is None and prefiller.status() is None
+
+def test_load_prefills_and_clear_invalidates(tmp_path, monkeypatch):
+    """Test that loading a file prefills it once the model is up, and `clear` drops the prefill"""
+    from main import AICodeAssistant
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "a.py").write_text(CODE)
+    release = threading.Event()
+    llm = StubLlama(reply="```python\nx = 1\n```")
+
+    def load():
+        release.wait(5)
+        handler = AIHandler(llm=llm, cache=None)
+        handler.edit_format = "full"
+        return handler
+
+    assistant = AICodeAssistant(model_loader=ModelLoader(factory=load).start())
+    assistant.prefiller.enabled = True
+    assistant.process_command("load a.py")
+    release.set()
+    assert wait_for(lambda: assistant.prefiller.is_ready("a.py", CODE))
+    assert "a.py prefilled" in assistant.toolbar()
+    assistant.process_command("clear")
+    assert assistant.prefiller.ready is None
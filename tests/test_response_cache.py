@@ -0,0 +1,47 @@
+import os
+from response_cache import ResponseCache
+from ai_handler import AIHandler
+from stub_model import StubLlama
+
+def test_put_get_and_stats(tmp_path):
+    """Test that stored deltas come back and hits/misses are counted"""
+    cache = ResponseCache(str(tmp_path / "cache.sqlite3"))
+    key = cache.make_key("model", [{"role": "user", "content": "hi"}], {"temperature": 0.1})
+    assert cache.get(key) is None
+    cache.put(key, ["Hel", "lo"], {"finish_reason": "stop"})
+    assert cache.get(key) == (["Hel", "lo"], {"finish_reason": "stop"})
+    stats = cache.stats()
+    assert (stats["entries"], stats["hits"], stats["misses"]) == (1, 1, 1)
+
+def test_key_covers_code_and_params():
+    """Test that different code or sampling params give different keys"""
+    messages = [{"role": "user", "content": "edit\n```python\nx = 1\n```"}]
+    edited = [{"role": "user", "content": "edit\n```python\nx = 2\n```"}]
+    base = ResponseCache.make_key("model", messages, {"temperature": 0.1})
+    assert base != ResponseCache.make_key("model", edited, {"temperature": 0.1})
+    assert base != ResponseCache.make_key("model", messages, {"temperature": 0.7})
+    assert base != ResponseCache.make_key("other", messages, {"temperature": 0.1})
+
+def test_lru_eviction(tmp_path):
+    """Test that the least recently used entry is evicted first"""
+    cache = ResponseCache(str(tmp_path / "cache.sqlite3"), max_bytes=5_000)
+    # Random hex so compression cannot shrink entries below the budget
+    for name in ("a", "b"):
+        cache.put(name, [os.urandom(2000).hex()], {})
+    cache.get("a")
+    cache.put("c", [os.urandom(2000).hex()], {})
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+
+def test_hit_replays_through_stream(tmp_path):
+    """Test that a cached response streams the same events without calling the model"""
+    llm = StubLlama(reply="x = 2\n")
+    handler = AIHandler(llm=llm, cache=ResponseCache(str(tmp_path / "cache.sqlite3")))
+    first = list(handler.stream("set x to 2", is_code_context=True, current_code="x = 1\n"))
+    second = list(handler.stream("set x to 2", is_code_context=True, current_code="x = 1\n"))
+    assert [e.delta for e in first] == [e.delta for e in second]
+    assert second[-1].cached and not first[-1].cached
+    assert len(llm.calls) == 1
+
+    list(handler.stream("set x to 2", is_code_context=True, current_code="x = 1\n", use_cache=False))
+    assert len(llm.calls) == 2
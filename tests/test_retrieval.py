@@ -0,0 +1,81 @@
+import os
+import time
+from file_index import FileIndex
+from retrieval import RetrievalIndex, format_context, terms
+
+def make_project(root):
+    (root / "auth.py").write_text("def check_password(user, password):\n    return hash_password(password) == user.password_hash\n")
+    (root / "render.py").write_text("class HtmlRenderer:\n    def render_page(self, page):\n        return '<html>' + page.body\n")
+    (root / "notes.txt").write_text("shopping list: milk, eggs\n")
+    (root / "data.bin").write_bytes(b"\0\1\2password")
+
+def build(root, db):
+    file_index = FileIndex(root=str(root)).start()
+    return RetrievalIndex(file_index, path=str(db)).start()
+
+def test_terms_split_identifiers():
+    """Test that identifiers are indexed whole and by their parts"""
+    assert terms("HtmlRenderer check_password") == ["htmlrenderer", "html", "renderer", "check_password", "check", "password"]
+
+def test_retrieves_relevant_snippets(tmp_path):
+    """Test that a question finds the file that answers it"""
+    project = tmp_path / "project"
+    project.mkdir()
+    make_project(project)
+    index = build(project, tmp_path / "index.sqlite3")
+    assert index.wait(10)
+    assert index.search_files("how is the password checked?")[0][0] == "auth.py"
+    snippets = index.retrieve("how do we render a page", budget=200)
+    assert snippets[0].path == "render.py"
+    assert "render.py (lines 1-4)" in format_context(snippets)
+    assert all(snippet.path != "data.bin" for snippet in index.retrieve("password", budget=200))
+
+def test_snippets_fit_budget(tmp_path):
+    """Test that retrieval never returns more than the token budget"""
+    project = tmp_path / "project"
+    project.mkdir()
+    for i in range(5):
+        (project / f"mod{i}.py").write_text("\n".join(f"value_{j} = compute_total({j})" for j in range(200)))
+    index = build(project, tmp_path / "index.sqlite3")
+    index.wait(10)
+    snippets = index.retrieve("compute_total", budget=300)
+    assert snippets
+    assert sum(len(snippet.text) // 4 for snippet in snippets) <= 300
+
+def test_persisted_index_only_rereads_changed_files(tmp_path):
+    """Test that a restart reuses the saved index and re-reads only changed files"""
+    project = tmp_path / "project"
+    project.mkdir()
+    make_project(project)
+    db = tmp_path / "index.sqlite3"
+    build(project, db).wait(10)
+
+    time.sleep(0.01)
+    (project / "auth.py").write_text("def verify_token(token):\n    return token.valid\n")
+    os.remove(project / "notes.txt")
+    index = RetrievalIndex(FileIndex(root=str(project)).start(), path=str(db))
+    index.file_index.wait(10)
+    index._open()
+    index._load()
+    assert index.documents == 4
+    assert index.refresh() == (1, 1)
+    assert index.search_files("verify_token")[0][0] == "auth.py"
+    assert index.search_files("check_password") == []
+    assert index.refresh() == (0, 0)
+
+def test_query_time_on_large_index(tmp_path):
+    """Test that queries stay in the tens of milliseconds with 100k documents"""
+    index = RetrievalIndex(FileIndex(root=str(tmp_path)), path=":memory:")
+    vocabulary = [f"word{i}" for i in range(50_000)]
+    common = {"self": 3, "return": 3, "import": 1, "def": 2}
+    for doc in range(100_000):
+        counts = {vocabulary[(doc * 7919 + k * 104729) % 50_000]: 1 + k % 5 for k in range(30)}
+        counts.update(common)
+        index._add(f"pkg{doc % 100}/mod{doc}.py", 0, 0, sum(counts.values()), counts)
+    index._ready.set()
+    index._last_refresh = time.monotonic()
+
+    start = time.perf_counter()
+    for query in ("def return word12 word345", "self word7 word99 word4242", "import word31337"):
+        assert index.search_files(query)
+    assert (time.perf_counter() - start) / 3 < 0.05
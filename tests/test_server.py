@@ -0,0 +1,125 @@
+import http.client
+import json
+import time
+import pytest
+from ai_handler import AIHandler
+from stub_model import StubLlama
+from server import InferenceServer, RemoteHandler, attach_or_load
+
+@pytest.fixture
+def server():
+    stub = StubLlama(reply="def f():\n    return 1\n")
+    server = InferenceServer(AIHandler(llm=stub), port=0).start()
+    yield server
+    server.shutdown()
+
+def post(server, path, payload):
+    host, port = server.httpd.server_address[:2]
+    connection = http.client.HTTPConnection(host, port, timeout=10)
+    connection.request("POST", path, body=json.dumps(payload), headers={"Content-Type": "application/json"})
+    response = connection.getresponse()
+    return response.status, response.read()
+
+def test_openai_chat_completion(server):
+    """Test the non-streaming OpenAI-compatible endpoint"""
+    status, body = post(server, "/v1/chat/completions", {"messages": [{"role": "user", "content": "hi"}]})
+    data = json.loads(body)
+    assert status == 200
+    assert data["object"] == "chat.completion"
+    assert data["choices"][0]["message"]["content"] == "def f():\n    return 1\n"
+    assert data["choices"][0]["finish_reason"] == "stop"
+    assert data["usage"]["completion_tokens"] > 0
+
+def test_openai_streaming_chunks(server):
+    """Test that stream=True sends chat.completion.chunk events ending in [DONE]"""
+    status, body = post(server, "/v1/chat/completions", {"messages": [{"role": "user", "content": "hi"}], "stream": True})
+    lines = [line[len("data: "):] for line in body.decode().split("\n") if line.startswith("data: ")]
+    assert status == 200
+    assert lines[-1] == "[DONE]"
+    chunks = [json.loads(line) for line in lines[:-1]]
+    text = "".join(chunk["choices"][0]["delta"].get("content", "") for chunk in chunks)
+    assert text == "def f():\n    return 1\n"
+    assert chunks[-1]["choices"][0]["finish_reason"] == "stop"
+
+def test_bad_request(server):
+    """Test that malformed requests get a 400 with an OpenAI-style error"""
+    status, body = post(server, "/v1/chat/completions", {"messages": "hi"})
+    assert status == 400
+    assert "messages" in json.loads(body)["error"]["message"]
+
+def test_remote_handler_matches_local(server):
+    """Test that the REPL's remote handler streams the same events as in-process"""
+    remote = RemoteHandler(server.url)
+    local = AIHandler(llm=StubLlama(reply="def f():\n    return 1\n"))
+    remote_events = list(remote.stream("edit", is_code_context=True, current_code="x = 1\n", edit_format="full"))
+    local_events = list(local.stream("edit", is_code_context=True, current_code="x = 1\n", edit_format="full"))
+    assert [event.delta for event in remote_events] == [event.delta for event in local_events]
+    assert remote_events[-1].done
+    assert remote_events[-1].completion_tokens == local_events[-1].completion_tokens
+    assert remote.count_tokens("x = 1") == local.count_tokens("x = 1")
+    assert remote.edit_budget() == local.edit_budget()
+    assert remote.last_stats["tokens"] == local_events[-1].completion_tokens
+
+def test_remote_token_counts_are_batched(server):
+    """Test that counts come from one tokenize request per batch of new texts and prefill sends nothing"""
+    remote = RemoteHandler(server.url)
+    local = AIHandler(llm=StubLlama())
+    requests = []
+    send = remote._request
+    remote._request = lambda method, path, *args, **kwargs: requests.append(path) or send(method, path, *args, **kwargs)
+    texts = [f"snippet {n} " * n for n in range(1, 6)]
+    assert remote.count_many(texts) == local.count_many(texts)
+    assert remote.count_tokens(texts[2]) == local.count_tokens(texts[2])
+    assert remote.count_many(texts + ["x = 1"]) == local.count_many(texts + ["x = 1"])
+    assert remote.prefill("x = 1\n" * 500) is None
+    assert requests == ["/juno/tokenize", "/juno/tokenize"]
+
+def test_requests_are_queued():
+    """Test that concurrent clients are served one at a time and all complete"""
+    import threading
+    stub = StubLlama(reply="one two three", decode_seconds_per_token=0.01)
+    server = InferenceServer(AIHandler(llm=stub), port=0).start()
+    try:
+        remote = RemoteHandler(server.url)
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(remote.chat("hi"))) for _ in range(3)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(10)
+        assert results == ["one two three"] * 3
+        assert len(stub.calls) == 3
+    finally:
+        server.shutdown()
+
+def test_disconnect_cancels_generation():
+    """Test that a client closing mid-stream frees the worker for the next request"""
+    stub = StubLlama(reply="word " * 200, decode_seconds_per_token=0.01)
+    server = InferenceServer(AIHandler(llm=stub), port=0).start()
+    try:
+        remote = RemoteHandler(server.url)
+        events = remote.stream("hi")
+        next(events)
+        events.close()
+
+        start = time.perf_counter()
+        stub.reply = "done"
+        assert remote.chat("again") == "done"
+        # The abandoned 400-token reply would take ~4s to finish
+        assert time.perf_counter() - start < 2.0
+    finally:
+        server.shutdown()
+
+def test_attach_or_load_falls_back(monkeypatch):
+    """Test that the REPL loads in-process when no server is listening"""
+    monkeypatch.setenv("JUNO_SERVER", "http://127.0.0.1:9")
+    assert attach_or_load(fallback=lambda: "local") == "local"
+    monkeypatch.setenv("JUNO_SERVER", "off")
+    assert attach_or_load(fallback=lambda: "local") == "local"
+
+def test_attach_or_load_uses_server(server, monkeypatch):
+    """Test that the REPL attaches to a running server"""
+    monkeypatch.setenv("JUNO_SERVER", server.url)
+    handler = attach_or_load(fallback=lambda: "local")
+    assert isinstance(handler, RemoteHandler)
+    assert handler.chat("hi") == "def f():\n    return 1\n"
@@ -0,0 +1,51 @@
+from ai_handler import AIHandler, ModelLoader
+from session import save_kv, load_kv, kv_path
+from stub_model import StubLlama
+
+def test_kv_file_round_trip(tmp_path):
+    """Test that a saved model state reads back only under the same context key"""
+    save_kv(str(tmp_path), "model|4096", [1, 5, 9], b"state")
+    input_ids, blob = load_kv(str(tmp_path), "model|4096")
+    assert input_ids == [1, 5, 9] and bytes(blob) == b"state"
+    assert load_kv(str(tmp_path), "model|2048") is None
+
+    path = kv_path(str(tmp_path), "model|4096")
+    with open(path, "rb") as f:
+        data = f.read()
+    with open(path, "wb") as f:
+        f.write(data[:-2])
+    assert load_kv(str(tmp_path), "model|4096") is None
+
+def test_resume_restores_buffer_history_and_context(tmp_path, monkeypatch):
+    """Test that a new session resumes the dirty buffer, the history and a warm context"""
+    from main import AICodeAssistant
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("SESSION_PATH", str(tmp_path / "sessions"))
+    monkeypatch.setenv("RETRIEVAL", "0")
+    (tmp_path / "a.py").write_text("x = 1\n")
+
+    def assistant():
+        llm = StubLlama(reply="Sure.")
+        session = AICodeAssistant(model_loader=ModelLoader(factory=lambda: AIHandler(llm=llm, cache=None)).start())
+        session.prefiller.enabled = False
+        return session, llm
+
+    first, first_llm = assistant()
+    first.process_command("load a.py")
+    first.file_manager.file_content = "x = 2\n"
+    first.process_command("what does this file do?")
+    first.process_command("snapshot")
+    assert first.jobs.wait(5)
+    assert list(tmp_path.joinpath("sessions").glob("*/*.kv"))
+
+    second, second_llm = assistant()
+    second.process_command("resume")
+    assert second.file_manager.current_file == "a.py" and second.file_manager.file_content == "x = 2\n"
+    assert not second.file_manager.saved
+    assert second.jobs.wait(5)
+    assert [turn.content for turn in second.conversation.turns] == ["what does this file do?", "Sure."]
+    assert second_llm.n_tokens == first_llm.n_tokens
+
+    second.process_command("and how would I test it?")
+    assert second.jobs.wait(5)
+    assert second_llm.reused_tokens >= first_llm.n_tokens - 10
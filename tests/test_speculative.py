@@ -0,0 +1,29 @@
+import pytest
+
+pytest.importorskip("llama_cpp")
+np = pytest.importorskip("numpy")
+
+from speculative import find_draft_tokens, PromptLookupDraft
+
+def test_find_draft_tokens_copies_continuation():
+    """Test that the continuation of the trailing n-gram is proposed"""
+    ids = [1, 2, 3, 4, 5, 6, 9, 2, 3]
+    assert find_draft_tokens(ids, max_ngram_size=2, num_pred_tokens=3) == [4, 5, 6]
+
+def test_find_draft_tokens_no_match():
+    """Test that nothing is drafted when the n-gram never occurred before"""
+    assert find_draft_tokens([1, 2, 3, 4], max_ngram_size=3, num_pred_tokens=5) == []
+
+def test_acceptance_stats():
+    """Test that accepted drafts are counted once the sequence advances"""
+    draft = PromptLookupDraft(max_ngram_size=2, num_pred_tokens=3)
+    ids = [1, 2, 3, 4, 5, 6, 9, 2, 3]
+    assert draft(np.array(ids, dtype=np.intc)).tolist() == [4, 5, 6]
+
+    # Model accepted 4 and 5, rejected 6 and sampled 7 instead
+    draft(np.array(ids + [4, 5, 7], dtype=np.intc))
+    draft.settle()
+    stats = draft.stats()
+    assert stats["accepted"] == 2
+    assert stats["drafted"] == 3
+    assert stats["acceptance_rate"] == pytest.approx(2 / 3)
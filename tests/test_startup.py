@@ -0,0 +1,63 @@
+import os
+import subprocess
+import sys
+import threading
+import time
+from ai_handler import ModelLoader
+
+SRC = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+
+# Seconds allowed from interpreter start to a constructed REPL (excludes model load)
+STARTUP_BUDGET = float(os.getenv("JUNO_STARTUP_BUDGET", "1.0"))
+
+STARTUP_SCRIPT = f"""
+import sys, time
+start = time.perf_counter()
+sys.path.insert(0, {SRC!r})
+import main
+heavy = [m for m in ("llama_cpp", "rich.syntax", "rich.live") if m in sys.modules]
+main.AICodeAssistant()
+print(time.perf_counter() - start)
+print(",".join(heavy))
+"""
+
+def test_startup_within_budget():
+    """Test that the REPL is constructed within budget without eager heavy imports"""
+    env = dict(os.environ, MODEL_PATH="models/does-not-exist.gguf")
+    result = subprocess.run([sys.executable, "-c", STARTUP_SCRIPT], capture_output=True, text=True, env=env, timeout=30)
+    assert result.returncode == 0, result.stderr
+    elapsed, heavy = result.stdout.split("\n")[-3:-1]
+    assert float(elapsed) < STARTUP_BUDGET
+    assert heavy == ""
+
+def test_model_loads_in_background():
+    """Test that the loader returns immediately and reports progress"""
+    release = threading.Event()
+
+    def slow_model():
+        release.wait(5)
+        return "handler"
+
+    loader = ModelLoader(factory=slow_model).start()
+    assert not loader.ready
+    assert loader.status().startswith("⏳")
+    release.set()
+    assert loader.wait(5) == "handler"
+    assert loader.status() == "✅ Model ready"
+
+def test_load_works_while_model_loads(tmp_path, monkeypatch):
+    """Test that file commands do not wait for the model"""
+    from main import AICodeAssistant
+    release = threading.Event()
+    loader = ModelLoader(factory=lambda: release.wait(5)).start()
+    target = tmp_path / "hello.py"
+    target.write_text("print('hi')\n")
+    monkeypatch.chdir(tmp_path)
+
+    assistant = AICodeAssistant(model_loader=loader)
+    start = time.perf_counter()
+    assistant.process_command(f"load {target}")
+    assert time.perf_counter() - start < 1.0
+    assert assistant.file_manager.file_content == "print('hi')\n"
+    assert not loader.ready
+    release.set()
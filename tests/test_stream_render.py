@@ -0,0 +1,83 @@
+import io
+from rich.console import Console
+from stream_render import CodeFenceTracker, StreamingCodePanel, StreamingTextPanel, print_settled
+from utils import extract_pure_code
+
+# Generous so slow CI machines pass; quadratic rendering blows through it
+RENDER_CPU_PER_TOKEN_BUDGET = 0.001
+
+def feed_in_pieces(target, text, size=3):
+    for i in range(0, len(text), size):
+        target.feed(text[i:i + size])
+
+def test_tracker_extracts_first_fenced_block():
+    """Test that prose around the fence is dropped, even when deltas split the fence"""
+    tracker = CodeFenceTracker()
+    feed_in_pieces(tracker, "Sure, here it is:\n```python\nx = 1\nprint(x)\n```\nHope that helps!\n")
+    assert tracker.lines == ["x = 1", "print(x)"]
+    assert tracker.state == CodeFenceTracker.AFTER
+    assert tracker.generation == 1
+
+def test_tracker_matches_extract_pure_code_without_fence():
+    """Test that unfenced answers use the same heuristic as extract_pure_code"""
+    response = "Here is the code\ndef f():\n    return 1\n\nprint(f())\n"
+    tracker = CodeFenceTracker()
+    feed_in_pieces(tracker, response)
+    assert "\n".join(tracker.lines).strip() == extract_pure_code(response)
+
+def test_panel_hides_partial_fence():
+    """Test that a half-streamed opening fence is not shown as code"""
+    panel = StreamingCodePanel("t", "yellow")
+    panel.feed("``")
+    assert panel.text() == ""
+    panel.feed("`python\nx = 1")
+    assert panel.text() == "x = 1"
+
+def test_settled_lines_are_released_once():
+    """Test that settled() hands out each line once, holding prose until a fence decides what is code"""
+    panel = StreamingCodePanel("t", "yellow")
+    feed_in_pieces(panel, "Sure:\nx = 1\n")
+    assert panel.settled() is None
+    feed_in_pieces(panel, "```python\n" + "".join(f"v{i} = {i}\n" for i in range(20)) + "tail = 1")
+    first = panel.settled().plain
+    assert "Sure" not in first and "   1 v0 = 0" in first and "tail" not in first
+    assert panel.settled() is None
+    rest = panel.settled(final=True).plain
+    assert rest.endswith("tail = 1") and first.count("\n") + rest.count("\n") + 2 == 21
+
+    text = StreamingTextPanel("t", "blue")
+    feed_in_pieces(text, "line one\n\nline tw")
+    assert text.settled().plain == "line one\n" and text.settled() is None
+    assert text.settled(final=True).plain == "line tw"
+
+def test_chat_streams_above_the_prompt(monkeypatch):
+    """Test that a chat reply is printed as it streams and its render time is recorded"""
+    import main
+    from ai_handler import AIHandler, ModelLoader
+    from stub_model import StubLlama
+    output = io.StringIO()
+    monkeypatch.setattr(main, "console", Console(file=output, width=100))
+    monkeypatch.setenv("RETRIEVAL", "0")
+    handler = AIHandler(llm=StubLlama(reply="first line\nsecond line"), cache=None)
+    assistant = main.AICodeAssistant(model_loader=ModelLoader(factory=lambda: handler).start())
+    assistant.prefiller.enabled = False
+    assistant.process_command("hello")
+    assert assistant.jobs.wait(5)
+    assert "first line\nsecond line" in output.getvalue()
+    assert handler.telemetry.records[-1]["render_ms"] > 0
+
+def test_render_cpu_per_token_is_bounded():
+    """Test that streaming a long file keeps render work per token small"""
+    code = "".join(f"def function_{i}(value):\n    return value * {i}\n\n" for i in range(600))
+    panel = StreamingCodePanel("t", "yellow")
+    console = Console(file=io.StringIO(), width=100)
+    panel.feed("```python\n")
+    for i in range(0, len(code), 4):
+        panel.feed(code[i:i + 4])
+        # consume() prints a few times a second; at ~40 tokens/sec that is a frame every 10 tokens
+        if i % 40 == 0:
+            print_settled(console, panel)
+    print_settled(console, panel, final=True)
+    assert panel.text() == code[:-1] and console.file.getvalue().count("\n") == code.count("\n")
+    assert panel.frames < panel.tokens / 5
+    assert panel.cpu_per_token() < RENDER_CPU_PER_TOKEN_BUDGET
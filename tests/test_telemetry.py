@@ -0,0 +1,47 @@
+import json
+from ai_handler import AIHandler
+from response_cache import ResponseCache
+from stub_model import StubLlama
+from telemetry import Telemetry, percentile
+
+def test_percentile_nearest_rank():
+    """Test p50/p95 over a small sample"""
+    values = list(range(1, 21))
+    assert percentile(values, 0.5) == 10
+    assert percentile(values, 0.95) == 19
+    assert percentile([7], 0.95) == 7
+    assert percentile([], 0.5) is None
+
+def test_ring_buffer_keeps_latest_requests():
+    """Test that only the most recent records are kept in memory"""
+    telemetry = Telemetry(capacity=3)
+    for total in range(5):
+        telemetry.record({"total_ms": total})
+    assert [record["total_ms"] for record in telemetry.records] == [2, 3, 4]
+    assert telemetry.records[-1]["id"] == 5
+
+def test_handler_records_each_request(tmp_path):
+    """Test that streamed requests are measured and written to the JSONL trace"""
+    trace = tmp_path / "trace.jsonl"
+    handler = AIHandler(llm=StubLlama(reply="one two three four", decode_seconds_per_token=0.001), cache=ResponseCache(str(tmp_path / "cache.sqlite3")))
+    handler.telemetry = Telemetry(trace_path=str(trace))
+
+    handler.chat("hello")
+    handler.chat("hello")
+    handler.telemetry.annotate(render_ms=1.5)
+
+    first, second = handler.telemetry.records
+    assert first["prompt_tokens"] > 0 and first["completion_tokens"] == 7
+    assert first["ttft_ms"] is not None and first["prompt_eval_ms"] == first["ttft_ms"]
+    assert first["decode_tokens_per_sec"] > 0
+    assert first["finish_reason"] == "stop" and not first["cached"]
+    assert second["cached"] and second["render_ms"] == 1.5
+
+    summary = handler.telemetry.summary()
+    assert summary["requests"] == 2 and summary["cache_hits"] == 1
+    assert summary["metrics"]["total_ms"]["count"] == 1
+    assert summary["metrics"]["render_ms"]["count"] == 1
+
+    lines = [json.loads(line) for line in trace.read_text().splitlines()]
+    assert [line["id"] for line in lines] == [1, 2, 2]
+    assert lines[-1] == {"id": 2, "render_ms": 1.5}
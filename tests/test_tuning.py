@@ -0,0 +1,67 @@
+import time
+import tuning
+from tuning import parse_cpuinfo, thread_candidates, runtime_params, save_profile, tune
+
+CPUINFO = "".join(
+    f"processor\t: {cpu}\nphysical id\t: {cpu // 8}\ncore id\t\t: {cpu % 4}\n\n" for cpu in range(16)
+)
+
+class FakeLlama:
+    """Evaluation gets faster with threads up to 8 and with batches up to 256, on a simulated clock"""
+    def __init__(self):
+        self.n_threads = self.n_threads_batch = 1
+        self.n_batch = 512
+        self.now = 0.0
+
+    def perf_counter(self):
+        return self.now
+
+    def strftime(self, format):
+        return time.strftime(format)
+
+    def reset(self):
+        pass
+
+    def eval(self, tokens):
+        threads = min(self.n_threads, 8)
+        batch = min(self.n_batch, 256) if len(tokens) > 1 else 1
+        self.now += len(tokens) * 0.01 / (threads * (1 + batch / 256))
+
+def test_parse_cpuinfo_counts_physical_cores():
+    """Test that hyperthreads sharing a core are counted once"""
+    assert parse_cpuinfo(CPUINFO) == 8
+    assert parse_cpuinfo("processor : 0\n") is None
+
+def test_thread_candidates():
+    """Test that candidates span a share of the cores up to every available CPU"""
+    assert thread_candidates({"logical": 64, "physical": 32, "available": 64}) == [8, 16, 24, 32, 64]
+    assert thread_candidates({"logical": 1, "physical": 1, "available": 1}) == [1]
+
+def test_tune_picks_fastest_settings(monkeypatch):
+    """Test that the sweep settles on the thread count and batch size where gains stop"""
+    llm = FakeLlama()
+    monkeypatch.setattr(tuning, "time", llm)
+    profile, measurements = tune(llm, list(range(128)), [2, 4, 8, 16], batch_sizes=(128, 256, 512), decode_tokens=8)
+    assert profile["n_threads"] == 8
+    assert profile["n_threads_batch"] == 8
+    assert profile["n_batch"] == 256
+    assert len(measurements) == 11
+
+def test_env_overrides_profile(tmp_path, monkeypatch):
+    """Test that a saved profile is used and env vars still win"""
+    model = tmp_path / "model.gguf"
+    model.write_bytes(b"gguf")
+    profiles = tmp_path / "tuning.json"
+    for name in tuning.ENV_VARS.values():
+        monkeypatch.delenv(name, raising=False)
+    assert runtime_params(str(model), str(profiles))["n_threads"] == 4
+
+    save_profile(str(model), {"n_threads": 24, "n_threads_batch": 32, "n_batch": 1024, "use_mlock": True}, str(profiles))
+    params = runtime_params(str(model), str(profiles))
+    assert params["n_threads"] == 24 and params["n_threads_batch"] == 32 and params["n_batch"] == 1024
+    assert params["use_mlock"] is True and params["n_gpu_layers"] == 30
+
+    monkeypatch.setenv("N_THREADS", "6")
+    monkeypatch.setenv("USE_MLOCK", "0")
+    params = runtime_params(str(model), str(profiles))
+    assert params["n_threads"] == 6 and params["use_mlock"] is False and params["n_batch"] == 1024
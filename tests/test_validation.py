@@ -0,0 +1,66 @@
+import shlex
+import sys
+from concurrent.futures import Future
+from validation import Validator, syntax_error, validated_edit
+
+# Fails (printing the offending file) when the checked file still contains TODO
+NO_TODO = (
+    f"{shlex.quote(sys.executable)} -c "
+    "\"import sys; sys.exit(sys.argv[1] + ': TODO left' if 'TODO' in open(sys.argv[1]).read() else 0)\" {file}"
+)
+
+class SyncValidator(Validator):
+    """Checks synchronously, so tests do not depend on how fast the worker threads are"""
+    def submit(self, code, path=None):
+        future = Future()
+        future.set_result(self.check(code, path))
+        return future
+
+def scripted(*replies):
+    """generate() that returns the replies in order and records its calls"""
+    calls = []
+
+    def generate(instruction, code, attempt):
+        calls.append((instruction, code, attempt))
+        return replies[len(calls) - 1]
+    return generate, calls
+
+def test_syntax_error_parses_and_compiles():
+    """Test that both parser errors and compile-time errors are reported with their line"""
+    assert syntax_error("def f(:\n    pass\n").startswith("line 1")
+    assert "outside function" in syntax_error("x = 1\nreturn x\n")
+    assert syntax_error("def f():\n    return 1\n") is None
+
+def test_commands_run_on_a_copy_of_the_candidate(tmp_path):
+    """Test that check commands see the candidate under the edited file's name and report that name"""
+    validator = Validator([NO_TODO])
+    path = str(tmp_path / "app.py")
+    failures = validator.check("x = 1  # TODO\n", path)
+    assert list(failures) == [NO_TODO] and failures[NO_TODO] == f"{path}: TODO left"
+    assert validator.check("x = 1\n", path) == {}
+    assert Validator().check("x = 1\n", "notes.txt") == {} and Validator().check("x = (", "notes.txt") == {}
+
+def test_failed_edit_is_repaired_with_the_error():
+    """Test that a broken edit triggers a repair prompt carrying the error and the broken code"""
+    generate, calls = scripted("def f(:\n    pass\n", "def f():\n    pass\n")
+    updated, failures = validated_edit(generate, "add f", "x = 1\n", Validator())
+    assert updated == "def f():\n    pass\n" and failures == {}
+    instruction, code, attempt = calls[1]
+    assert attempt is None and "syntax" in instruction and "add f" in instruction and code == "def f(:\n    pass\n"
+
+def test_gives_up_after_retries():
+    """Test that an edit still failing after the retries is returned with its failures"""
+    generate, calls = scripted("x = (", "x = (", "x = (")
+    updated, failures = validated_edit(generate, "edit", "x = 1\n", Validator(), retries=2)
+    assert list(failures) == ["syntax"] and len(calls) == 3
+
+def test_first_passing_candidate_wins(tmp_path):
+    """Test that candidates stop at the first one that passes, and checks failing before the edit are ignored"""
+    generate, calls = scripted("x = (", "x = 2  # TODO\n", "x = 3\n")
+    updated, failures = validated_edit(generate, "edit", "x = 1\n", SyncValidator(), candidates=3)
+    assert updated == "x = 2  # TODO\n" and failures == {}
+    assert [attempt for _, _, attempt in calls] == [0, 1]
+
+    generate, calls = scripted("x = 2  # TODO\n")
+    updated, failures = validated_edit(generate, "edit", "x = 1  # TODO\n", Validator([NO_TODO]), str(tmp_path / "a.py"))
+    assert updated == "x = 2  # TODO\n" and failures == {}
@@ -0,0 +1,62 @@
+import random
+from ai_handler import AIHandler, ModelLoader
+from stub_model import StubLlama
+from versions import VersionHistory, line_delta, apply_delta
+
+def edited(text, seed):
+    """text with a few lines replaced (or new ones inserted) somewhere"""
+    rng = random.Random(seed)
+    lines = text.splitlines(True)
+    start = rng.randrange(len(lines))
+    lines[start:start + rng.randint(0, 3)] = [f"edit {seed}\n"] * rng.randint(1, 3)
+    return "".join(lines)
+
+def test_delta_is_reversible():
+    """Test that a delta rebuilds the new lines from the old ones and back"""
+    old = "a\nb\nc\nd\n".splitlines(True)
+    new = "a\nB\nc\nd\ne".splitlines(True)
+    delta = line_delta(old, new)
+    assert apply_delta(old, delta) == new and apply_delta(new, delta, reverse=True) == old
+    assert line_delta(old, old) == []
+
+def test_every_version_is_rebuilt_after_eviction():
+    """Test random access, undo/redo and dropping the oldest versions under a small memory cap"""
+    text = "".join(f"value_{i} = {i}\n" for i in range(2000))
+    texts = [text]
+    history = VersionHistory(text, max_bytes=len(text) * 3, checkpoint_every=4)
+    for seed in range(30):
+        texts.append(edited(texts[-1], seed))
+        history.commit(texts[-1], f"edit {seed}")
+    assert history.size <= len(text) * 3 and history.base > 0 and history.latest == 30
+    assert all(history.get(number) == texts[number] for number in range(history.base, 31))
+
+    assert history.undo() == texts[29] and history.undo() == texts[28] and history.redo() == texts[29]
+    history.commit("new\n", "replace everything")
+    assert history.latest == 30 and history.get(29) == texts[29] and history.redo() is None
+
+def test_undo_and_redo_an_edit_job(tmp_path, monkeypatch):
+    """Test that an applied edit can be undone, redone and diffed against the loaded text"""
+    from main import AICodeAssistant
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.delenv("EDIT_CHECKS", raising=False)
+    (tmp_path / "a.py").write_text("x = 1\n")
+
+    def load():
+        handler = AIHandler(llm=StubLlama(reply="```python\nx = 2\n```"), cache=None)
+        handler.edit_format = "full"
+        return handler
+
+    assistant = AICodeAssistant(model_loader=ModelLoader(factory=load).start())
+    assistant.prefiller.enabled = False
+    assistant.process_command("load a.py")
+    assistant.process_command("edit set x to 2")
+    assert assistant.jobs.wait(10) and assistant.file_manager.file_content == "x = 2\n"
+
+    history = assistant.file_manager.history()
+    assert [version.label for _, version in history.entries()] == ["loaded", "set x to 2"]
+    assert "-x = 1" in history.diff(0) and "+x = 2" in history.diff(0)
+    assistant.process_command("undo")
+    assert assistant.file_manager.file_content == "x = 1\n"
+    assistant.process_command("redo")
+    assert assistant.file_manager.file_content == "x = 2\n"
+    assert not assistant.file_manager.redo()